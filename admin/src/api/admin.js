@@ -61,6 +61,24 @@ export function getDeviceStats() {
   })
 }
 
+// 获取设备地图聚合（params: zoom, min_lat, min_lng, max_lat, max_lng）
+export function getDeviceMapClusters(params) {
+  return request({
+    url: '/device/map-clusters',
+    method: 'get',
+    params
+  })
+}
+
+// 收运路线规划（params: vehicles, depot_lat, depot_lng, threshold）
+export function getDeviceRoutePlan(params) {
+  return request({
+    url: '/device/route-plan',
+    method: 'get',
+    params
+  })
+}
+
 // 更新设备
 export function updateDevice(id, data) {
   return request({
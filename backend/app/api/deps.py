@@ -11,6 +11,7 @@ from typing import Optional
 from app.db.database import get_db
 from app.config import settings
 from app.models.user import User
+from app.services.principal_cache import principal_cache
 
 # Bearer Token认证
 security = HTTPBearer(auto_error=False)
@@ -27,30 +28,37 @@ async def get_current_user(
             detail="未登录"
         )
     
-    try:
-        # 解析Token
-        payload = jwt.decode(
-            credentials.credentials,
-            settings.JWT_SECRET_KEY,
-            algorithms=[settings.JWT_ALGORITHM]
-        )
-        user_id: str = payload.get("sub")
-        if not user_id:
+    user_id = principal_cache.get_token_subject(credentials.credentials)
+    if user_id is None:
+        try:
+            # 解析Token
+            payload = jwt.decode(
+                credentials.credentials,
+                settings.JWT_SECRET_KEY,
+                algorithms=[settings.JWT_ALGORITHM]
+            )
+            user_id = payload.get("sub")
+            if not user_id:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="无效的Token"
+                )
+        except JWTError:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="无效的Token"
+                detail="Token已过期或无效"
             )
-    except JWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token已过期或无效"
-        )
+        principal_cache.set_token_subject(credentials.credentials, user_id, payload.get("exp"))
     
-    # 查询用户
-    result = await db.execute(
-        select(User).where(User.user_id == user_id)
-    )
-    user = result.scalar_one_or_none()
+    # 查询用户（优先使用缓存快照）
+    user = principal_cache.get_user(user_id, db)
+    if user is None:
+        result = await db.execute(
+            select(User).where(User.user_id == user_id)
+        )
+        user = result.scalar_one_or_none()
+        if user:
+            principal_cache.set_user(user)
     
     if not user:
         raise HTTPException(
@@ -75,20 +83,28 @@ async def get_current_user_optional(
     if not credentials:
         return None
     
-    try:
-        payload = jwt.decode(
-            credentials.credentials,
-            settings.JWT_SECRET_KEY,
-            algorithms=[settings.JWT_ALGORITHM]
-        )
-        user_id: str = payload.get("sub")
-        if not user_id:
+    user_id = principal_cache.get_token_subject(credentials.credentials)
+    if user_id is None:
+        try:
+            payload = jwt.decode(
+                credentials.credentials,
+                settings.JWT_SECRET_KEY,
+                algorithms=[settings.JWT_ALGORITHM]
+            )
+            user_id = payload.get("sub")
+            if not user_id:
+                return None
+        except JWTError:
             return None
-    except JWTError:
-        return None
+        principal_cache.set_token_subject(credentials.credentials, user_id, payload.get("exp"))
     
-    result = await db.execute(
-        select(User).where(User.user_id == user_id, User.status == 1)
-    )
-    return result.scalar_one_or_none()
+    user = principal_cache.get_user(user_id, db)
+    if user is None:
+        result = await db.execute(
+            select(User).where(User.user_id == user_id)
+        )
+        user = result.scalar_one_or_none()
+        if user:
+            principal_cache.set_user(user)
+    return user if user and user.status == 1 else None
 
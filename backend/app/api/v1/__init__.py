@@ -13,6 +13,8 @@ from app.api.v1.admin import router as admin_router
 from app.api.v1.admin_device import router as admin_device_router
 from app.api.v1.admin_order import router as admin_order_router
 from app.api.v1.admin_user import router as admin_user_router
+from app.api.v1.admin_export import router as admin_export_router
+from app.api.v1.admin_system import router as admin_system_router
 
 router = APIRouter()
 
@@ -26,4 +28,6 @@ router.include_router(admin_router, prefix="/admin", tags=["管理后台"])
 router.include_router(admin_device_router, prefix="/admin", tags=["管理后台-设备"])
 router.include_router(admin_order_router, prefix="/admin", tags=["管理后台-订单"])
 router.include_router(admin_user_router, prefix="/admin", tags=["管理后台-用户"])
+router.include_router(admin_export_router, prefix="/admin", tags=["管理后台-导出"])
+router.include_router(admin_system_router, prefix="/admin", tags=["管理后台-系统"])
 
@@ -5,16 +5,13 @@ from datetime import datetime, timedelta
 from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_, or_
+from sqlalchemy import select
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from passlib.context import CryptContext
 from jose import JWTError, jwt
 
 from app.db.database import get_db
 from app.models.admin import Admin
 from app.models.user import User
-from app.models.order import DeliveryOrder
-from app.models.device import Device
 from app.models.withdraw import WithdrawRecord
 from app.schemas.common import ResponseModel, PaginatedResponse
 from app.schemas.admin import (
@@ -24,21 +21,23 @@ from app.schemas.admin import (
     DashboardStatsResponse
 )
 from app.config import settings
+from app.services.dashboard_service import dashboard_service, PERIODS
+from app.services.password_service import password_hasher, PasswordBusyError
+from app.services.principal_cache import principal_cache
 from loguru import logger
 
 router = APIRouter()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """验证密码"""
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """验证密码（在线程池中执行，不阻塞事件循环）"""
+    return await password_hasher.verify(plain_password, hashed_password)
 
 
-def get_password_hash(password: str) -> str:
-    """生成密码哈希"""
-    return pwd_context.hash(password)
+async def get_password_hash(password: str) -> str:
+    """生成密码哈希（在线程池中执行，不阻塞事件循环）"""
+    return await password_hasher.hash(password)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -60,16 +59,24 @@ async def get_current_admin(
     """获取当前管理员"""
     token = credentials.credentials
     
-    try:
-        payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
+    username = principal_cache.get_token_subject(token)
+    if username is None:
+        try:
+            payload = jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
+            username = payload.get("sub")
+            if username is None:
+                raise HTTPException(status_code=401, detail="无效的认证令牌")
+        except JWTError:
             raise HTTPException(status_code=401, detail="无效的认证令牌")
-    except JWTError:
-        raise HTTPException(status_code=401, detail="无效的认证令牌")
+        principal_cache.set_token_subject(token, username, payload.get("exp"))
     
-    result = await db.execute(select(Admin).where(Admin.username == username))
-    admin = result.scalar_one_or_none()
+    # 优先使用缓存快照，管理后台每个页面会并发调用多个接口
+    admin = principal_cache.get_admin(username, db)
+    if admin is None:
+        result = await db.execute(select(Admin).where(Admin.username == username))
+        admin = result.scalar_one_or_none()
+        if admin:
+            principal_cache.set_admin(admin)
     
     if admin is None or admin.status != 1:
         raise HTTPException(status_code=401, detail="管理员不存在或已被禁用")
@@ -94,7 +101,12 @@ async def admin_login(
         raise HTTPException(status_code=400, detail="账号已被禁用")
     
     # 验证密码
-    if not verify_password(request.password, admin.password_hash):
+    try:
+        password_ok = await verify_password(request.password, admin.password_hash)
+    except PasswordBusyError:
+        logger.warning(f"登录请求过多，拒绝校验: username={request.username}")
+        raise HTTPException(status_code=429, detail="登录请求过多，请稍后重试")
+    if not password_ok:
         raise HTTPException(status_code=400, detail="用户名或密码错误")
     
     # 更新最后登录时间
@@ -148,165 +160,19 @@ async def get_admin_profile(
 @router.get("/dashboard/stats", response_model=ResponseModel)
 async def get_dashboard_stats(
     period: str = Query("today", description="统计周期: today/7days/30days"),
-    db: AsyncSession = Depends(get_db),
     current_admin: Admin = Depends(get_current_admin)
 ):
-    """获取工作台统计数据"""
+    """
+    获取工作台统计数据
+
+    today 统计今日（与昨日对比，图表为近7天）；7days/30days 统计近7/30天（与前一个同长周期对比）。
+    数据来自共享快照，每 DASHBOARD_CACHE_TTL_SECONDS 秒刷新一次。
+    """
+    if period not in PERIODS:
+        raise HTTPException(status_code=400, detail=f"不支持的统计周期: {period}")
+
     try:
-        now = datetime.now()
-        
-        # 今日开始时间（用于计算今日数据）
-        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        # 昨日开始时间（用于计算趋势）
-        yesterday_start = today_start - timedelta(days=1)
-        
-        # 今日订单数
-        today_orders_result = await db.execute(
-            select(func.count(DeliveryOrder.id)).where(
-                DeliveryOrder.created_at >= today_start
-            )
-        )
-        today_orders = today_orders_result.scalar() or 0
-        
-        # 今日重量
-        today_weight_result = await db.execute(
-            select(func.sum(DeliveryOrder.weight)).where(
-                DeliveryOrder.created_at >= today_start
-            )
-        )
-        today_weight = float(today_weight_result.scalar() or 0)
-        
-        # 今日金额
-        today_amount_result = await db.execute(
-            select(func.sum(DeliveryOrder.amount)).where(
-                DeliveryOrder.created_at >= today_start
-            )
-        )
-        today_amount = float(today_amount_result.scalar() or 0)
-        
-        # 活跃用户（今日有订单的用户）
-        active_users_result = await db.execute(
-            select(func.count(func.distinct(DeliveryOrder.user_id))).where(
-                DeliveryOrder.created_at >= today_start
-            )
-        )
-        active_users = active_users_result.scalar() or 0
-        
-        # 计算趋势（与昨日对比）
-        yesterday_orders_result = await db.execute(
-            select(func.count(DeliveryOrder.id)).where(
-                and_(
-                    DeliveryOrder.created_at >= yesterday_start,
-                    DeliveryOrder.created_at < today_start
-                )
-            )
-        )
-        yesterday_orders = yesterday_orders_result.scalar() or 0
-        
-        orders_trend = ((today_orders - yesterday_orders) / yesterday_orders * 100) if yesterday_orders > 0 else 0
-        
-        # 图表数据（7天）
-        chart_dates = []
-        chart_values = []
-        for i in range(6, -1, -1):
-            date = (now - timedelta(days=i)).replace(hour=0, minute=0, second=0, microsecond=0)
-            next_date = date + timedelta(days=1)
-            chart_dates.append(date.strftime('%m-%d'))
-            
-            day_orders_result = await db.execute(
-                select(func.count(DeliveryOrder.id)).where(
-                    and_(
-                        DeliveryOrder.created_at >= date,
-                        DeliveryOrder.created_at < next_date
-                    )
-                )
-            )
-            chart_values.append(day_orders_result.scalar() or 0)
-        
-        # 告警信息
-        alerts = []
-        alert_id = 0
-        
-        # 离线设备告警
-        offline_threshold = now - timedelta(hours=24)
-        offline_devices_result = await db.execute(
-            select(func.count(Device.id)).where(
-                or_(
-                    Device.status == "offline",
-                    Device.last_heartbeat == None,
-                    Device.last_heartbeat < offline_threshold
-                )
-            )
-        )
-        offline_count = offline_devices_result.scalar() or 0
-        if offline_count > 0:
-            alert_id += 1
-            alerts.append({
-                "id": alert_id,
-                "level": "警告",
-                "message": f"有{offline_count}台设备离线",
-                "time": now.strftime('%H:%M')
-            })
-        
-        # 烟感告警
-        smoke_alert_result = await db.execute(
-            select(func.count(Device.id)).where(Device.smoke_sensor_status == 1)
-        )
-        smoke_alert_count = smoke_alert_result.scalar() or 0
-        if smoke_alert_count > 0:
-            alert_id += 1
-            alerts.append({
-                "id": alert_id,
-                "level": "紧急",
-                "message": f"有{smoke_alert_count}台设备烟感告警，请立即处理！",
-                "time": now.strftime('%H:%M')
-            })
-        
-        # 低电量告警
-        low_battery_result = await db.execute(
-            select(func.count(Device.id)).where(
-                and_(Device.battery_level != None, Device.battery_level < 20)
-            )
-        )
-        low_battery_count = low_battery_result.scalar() or 0
-        if low_battery_count > 0:
-            alert_id += 1
-            alerts.append({
-                "id": alert_id,
-                "level": "警告",
-                "message": f"有{low_battery_count}台设备电量低于20%",
-                "time": now.strftime('%H:%M')
-            })
-        
-        # 仓体满载告警
-        full_bin_result = await db.execute(
-            select(func.count(Device.id)).where(Device.recycle_bin_full == 1)
-        )
-        full_bin_count = full_bin_result.scalar() or 0
-        if full_bin_count > 0:
-            alert_id += 1
-            alerts.append({
-                "id": alert_id,
-                "level": "提示",
-                "message": f"有{full_bin_count}台设备仓体已满，请及时清运",
-                "time": now.strftime('%H:%M')
-            })
-        
-        return ResponseModel(data=DashboardStatsResponse(
-            today_orders=today_orders,
-            today_weight=round(today_weight, 2),
-            today_amount=round(today_amount, 2),
-            active_users=active_users,
-            orders_trend=round(orders_trend, 1),
-            weight_trend=0.0,  # TODO: 计算重量趋势
-            amount_trend=0.0,   # TODO: 计算金额趋势
-            users_trend=0.0,    # TODO: 计算用户趋势
-            chart_data={
-                "dates": chart_dates,
-                "values": chart_values
-            },
-            alerts=alerts
-        ))
+        return ResponseModel(data=DashboardStatsResponse(**await dashboard_service.get_stats(period)))
     except Exception as e:
         logger.error(f"获取统计数据失败: {e}", exc_info=True)
         # 返回空数据，避免前端报错
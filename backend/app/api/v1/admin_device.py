@@ -1,22 +1,58 @@
 """
 管理后台 - 设备管理API
 """
-from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, Query, HTTPException
+import time
+from datetime import date, datetime, timedelta
+from typing import Optional
+from fastapi import APIRouter, Depends, Query, HTTPException, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, and_, desc
 from loguru import logger
-from app.db.database import get_db
+from app.db.database import get_db, get_read_db
 from app.models.device import Device
-from app.models.order import DeliveryOrder
-from app.models.device_camera import DeviceCameraImage
+from app.models.device_camera import DeviceCameraImage, DeviceCameraImageVariant, ImageVariant
 from app.models.admin import Admin
 from app.schemas.common import ResponseModel, PaginatedResponse
 from app.api.v1.admin import get_current_admin
+from app.services.admin_lookup import Lookup, add_id_lookup, paginate
 from app.services.device_service import connection_manager
+from app.services.device_clusters import device_cluster_index
+from app.services.fleet_state import fleet_state
+from app.services.camera_image_service import (
+    sign_image_url,
+    verify_image_signature,
+    image_etag,
+    decode_image,
+    parse_range,
+)
+from app.services.order_stats_service import device_totals, device_daily
+from app.services.route_planner import route_planner
 
 router = APIRouter()
 
+# 摄像头图片元数据列（列表接口不读取 image_data）
+CAMERA_META_COLUMNS = (
+    DeviceCameraImage.id,
+    DeviceCameraImage.batch_id,
+    DeviceCameraImage.camera_type,
+    DeviceCameraImage.image_index,
+    DeviceCameraImage.captured_at,
+)
+
+
+# 图片地址支持的衍生图类型
+IMAGE_VARIANTS = {variant.value for variant in ImageVariant}
+
+
+def _camera_image_meta(img) -> dict:
+    """图片元数据 + 签名地址（thumb_url 用于列表，url 用于查看大图）"""
+    return {
+        "id": img.id,
+        "image_index": img.image_index,
+        "thumb_url": sign_image_url(img.id, ImageVariant.THUMBNAIL.value),
+        "url": sign_image_url(img.id, ImageVariant.ARCHIVE.value),
+    }
+
 
 @router.get("/device/list", response_model=ResponseModel)
 async def get_device_list(
@@ -24,32 +60,24 @@ async def get_device_list(
     page_size: int = Query(20, ge=1, le=100),
     device_id: str = Query(None),
     status: str = Query(None),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_admin: Admin = Depends(get_current_admin)
 ):
     """获取设备列表（含协议上报数据）"""
     try:
-        query = select(Device)
-        
-        # 筛选条件
-        conditions = []
+        # 筛选条件（设备ID按唯一索引精确/前缀查找，*值* 为有界模糊查找）
+        lookup = Lookup()
         if device_id:
-            conditions.append(Device.device_id.like(f"%{device_id}%"))
+            await add_id_lookup(db, lookup, Device.device_id, device_id)
         if status:
-            conditions.append(Device.status == status)
+            lookup.where(Device.status == status)
         
-        if conditions:
-            query = query.where(and_(*conditions))
+        result = await paginate(db, Device, lookup, Device.created_at.desc(), page, page_size)
+        devices = result["rows"]
+        total = result["total"]
         
-        # 查询总数
-        count_query = select(func.count()).select_from(query.subquery())
-        total = (await db.execute(count_query)).scalar()
-        
-        # 分页查询
-        query = query.order_by(Device.created_at.desc())
-        query = query.offset((page - 1) * page_size).limit(page_size)
-        result = await db.execute(query)
-        devices = result.scalars().all()
+        # 订单统计：一次读取本页所有设备的汇总
+        totals = await device_totals(db, [device.device_id for device in devices])
         
         # 转换为字典，包含协议新增字段
         items = []
@@ -59,16 +87,7 @@ async def get_device_list(
             if device.last_heartbeat:
                 is_online = (datetime.now() - device.last_heartbeat).total_seconds() < 86400
             
-            # 查询该设备的订单统计
-            order_stats = await db.execute(
-                select(
-                    func.count(DeliveryOrder.id),
-                    func.coalesce(func.sum(DeliveryOrder.weight), 0)
-                ).where(DeliveryOrder.device_id == device.device_id)
-            )
-            stats_row = order_stats.one()
-            total_orders = stats_row[0] or 0
-            total_weight = float(stats_row[1] or 0)
+            total_orders, total_weight, _ = totals.get(device.device_id, (0, 0.0, 0.0))
             
             items.append({
                 "device_id": device.device_id,
@@ -100,7 +119,9 @@ async def get_device_list(
             total=total,
             page=page,
             page_size=page_size,
-            pages=(total + page_size - 1) // page_size if total > 0 else 0
+            pages=(total + page_size - 1) // page_size if total > 0 else 0,
+            total_exact=result["total_exact"],
+            truncated=result["truncated"]
         ))
     except Exception as e:
         logger.error(f"获取设备列表失败: {e}", exc_info=True)
@@ -110,7 +131,7 @@ async def get_device_list(
 @router.get("/device/detail/{device_id}", response_model=ResponseModel)
 async def get_device_detail(
     device_id: str,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_admin: Admin = Depends(get_current_admin)
 ):
     """获取设备详情（含全部协议字段）"""
@@ -126,44 +147,20 @@ async def get_device_detail(
         if device.last_heartbeat:
             is_online = (datetime.now() - device.last_heartbeat).total_seconds() < 86400
         
-        # 订单统计
-        order_stats = await db.execute(
-            select(
-                func.count(DeliveryOrder.id),
-                func.coalesce(func.sum(DeliveryOrder.weight), 0),
-                func.coalesce(func.sum(DeliveryOrder.amount), 0)
-            ).where(DeliveryOrder.device_id == device.device_id)
-        )
-        stats_row = order_stats.one()
-        
-        # 今日订单统计
-        today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        today_stats = await db.execute(
-            select(
-                func.count(DeliveryOrder.id),
-                func.coalesce(func.sum(DeliveryOrder.weight), 0)
-            ).where(and_(
-                DeliveryOrder.device_id == device.device_id,
-                DeliveryOrder.created_at >= today_start
-            ))
-        )
-        today_row = today_stats.one()
+        # 订单统计（读取按日汇总）
+        stats_row = (await device_totals(db, [device.device_id])).get(device.device_id, (0, 0.0, 0.0))
         
-        # 最近7天每日订单数（用于图表）
+        # 今日订单统计和最近7天每日订单数（用于图表）
+        today = date.today()
+        week_start = today - timedelta(days=6)
+        daily = await device_daily(db, device.device_id, week_start, today)
+        today_row = daily.get(today, (0, 0.0, 0.0))
         daily_orders = []
-        for i in range(6, -1, -1):
-            date = (datetime.now() - timedelta(days=i)).replace(hour=0, minute=0, second=0, microsecond=0)
-            next_date = date + timedelta(days=1)
-            day_result = await db.execute(
-                select(func.count(DeliveryOrder.id)).where(and_(
-                    DeliveryOrder.device_id == device.device_id,
-                    DeliveryOrder.created_at >= date,
-                    DeliveryOrder.created_at < next_date
-                ))
-            )
+        for i in range(7):
+            day = week_start + timedelta(days=i)
             daily_orders.append({
-                "date": date.strftime("%m-%d"),
-                "count": day_result.scalar() or 0
+                "date": day.strftime("%m-%d"),
+                "count": daily.get(day, (0, 0.0, 0.0))[0]
             })
         
         # 最新一次摄像头图片（按batch_id分组，取最新）
@@ -179,24 +176,21 @@ async def get_device_detail(
             latest_batch_id = latest_batch_result.scalar()
             
             if latest_batch_id:
-                # 获取该batch的所有图片
+                # 获取该batch的图片元数据（不读取图片数据，图片通过签名地址单独加载）
                 batch_images_result = await db.execute(
-                    select(DeviceCameraImage)
+                    select(*CAMERA_META_COLUMNS)
                     .where(and_(
                         DeviceCameraImage.device_id == device.device_id,
                         DeviceCameraImage.batch_id == latest_batch_id
                     ))
                     .order_by(DeviceCameraImage.camera_type, DeviceCameraImage.image_index)
                 )
-                batch_images = batch_images_result.scalars().all()
                 
-                for img in batch_images:
+                for img in batch_images_result.all():
                     camera_key = f"camera_{img.camera_type}"
                     if camera_key in latest_camera_images:
                         latest_camera_images[camera_key].append({
-                            "id": img.id,
-                            "image_data": img.image_data,
-                            "image_index": img.image_index,
+                            **_camera_image_meta(img),
                             "captured_at": img.captured_at.strftime("%Y-%m-%d %H:%M:%S") if img.captured_at else None,
                         })
         except Exception as cam_err:
@@ -267,58 +261,21 @@ async def get_device_detail(
 
 @router.get("/device/stats", response_model=ResponseModel)
 async def get_device_stats(
-    db: AsyncSession = Depends(get_db),
     current_admin: Admin = Depends(get_current_admin)
 ):
-    """获取设备统计概览（用于仪表盘）"""
+    """获取设备统计概览（用于仪表盘），读取进程内设备状态聚合"""
     try:
-        # 总设备数
-        total_result = await db.execute(select(func.count(Device.id)))
-        total = total_result.scalar() or 0
-        
+        await fleet_state.ensure_ready()
+        counts = fleet_state.counts()
+        total = counts["total"]
         # 在线设备数（24小时内有心跳）
-        online_threshold = datetime.now() - timedelta(hours=24)
-        online_result = await db.execute(
-            select(func.count(Device.id)).where(
-                and_(
-                    Device.status == "online",
-                    Device.last_heartbeat >= online_threshold
-                )
-            )
-        )
-        online = online_result.scalar() or 0
-        
+        online = counts["online"]
         # 离线设备数
         offline = total - online
-        
-        # 告警设备（烟感告警）
-        smoke_alert_result = await db.execute(
-            select(func.count(Device.id)).where(Device.smoke_sensor_status == 1)
-        )
-        smoke_alert = smoke_alert_result.scalar() or 0
-        
-        # 满载设备
-        full_result = await db.execute(
-            select(func.count(Device.id)).where(Device.recycle_bin_full == 1)
-        )
-        full_count = full_result.scalar() or 0
-        
-        # 使用中设备
-        using_result = await db.execute(
-            select(func.count(Device.id)).where(Device.is_using == 1)
-        )
-        using_count = using_result.scalar() or 0
-        
-        # 低电量设备（电量<20%）
-        low_battery_result = await db.execute(
-            select(func.count(Device.id)).where(
-                and_(
-                    Device.battery_level != None,
-                    Device.battery_level < 20
-                )
-            )
-        )
-        low_battery = low_battery_result.scalar() or 0
+        smoke_alert = counts["smoke_alert"]
+        full_count = counts["full"]
+        using_count = counts["using"]
+        low_battery = counts["low_battery"]
         
         # 实时连接统计
         conn_summary = connection_manager.get_online_summary()
@@ -340,6 +297,46 @@ async def get_device_stats(
         raise HTTPException(status_code=500, detail=f"获取设备统计失败: {str(e)}")
 
 
+@router.get("/device/map-clusters", response_model=ResponseModel)
+async def get_device_map_clusters(
+    zoom: int = Query(..., ge=0, le=22, description="地图缩放级别"),
+    min_lat: float = Query(..., ge=-90, le=90, description="视口最小纬度"),
+    min_lng: float = Query(..., ge=-180, le=180, description="视口最小经度"),
+    max_lat: float = Query(..., ge=-90, le=90, description="视口最大纬度"),
+    max_lng: float = Query(..., ge=-180, le=180, description="视口最大经度"),
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """设备地图聚合：按缩放级别返回视口内的设备聚合（含告警/满箱/离线数），设备较少时返回设备点"""
+    if min_lat > max_lat or min_lng > max_lng:
+        raise HTTPException(status_code=400, detail="视口范围无效")
+    try:
+        return ResponseModel(data=await device_cluster_index.query(zoom, (min_lat, min_lng, max_lat, max_lng)))
+    except Exception as e:
+        logger.error(f"获取设备地图聚合失败: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"获取设备地图聚合失败: {str(e)}")
+
+
+@router.get("/device/route-plan", response_model=ResponseModel)
+async def get_device_route_plan(
+    vehicles: int = Query(1, ge=1, le=50, description="车辆数"),
+    depot_lat: Optional[float] = Query(None, ge=-90, le=90, description="车场纬度"),
+    depot_lng: Optional[float] = Query(None, ge=-180, le=180, description="车场经度"),
+    threshold: Optional[int] = Query(None, ge=0, le=100, description="容量阈值(%)，默认取配置"),
+    forecast_hours: Optional[float] = Query(None, ge=0, le=720, description="预计此时长内满仓的设备也安排清运，默认取配置"),
+    db: AsyncSession = Depends(get_read_db),
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """收运路线规划：选出仓满、容量达到阈值或预计即将满仓的设备，按车辆数规划访问顺序"""
+    depot = (depot_lat, depot_lng) if depot_lat is not None and depot_lng is not None else None
+    try:
+        return ResponseModel(data=await route_planner.plan(
+            db, vehicles, depot=depot, threshold=threshold, forecast_hours=forecast_hours
+        ))
+    except Exception as e:
+        logger.error(f"收运路线规划失败: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"收运路线规划失败: {str(e)}")
+
+
 @router.post("/device/query-status", response_model=ResponseModel)
 async def admin_query_device_status(
     device_id: str = Query(..., description="设备ID"),
@@ -408,13 +405,14 @@ async def get_device_camera_images(
     page: int = Query(1, ge=1),
     page_size: int = Query(10, ge=1, le=50),
     camera_type: int = Query(None, description="摄像头类型: 1-内部, 2-用户"),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_admin: Admin = Depends(get_current_admin)
 ):
     """
     获取设备摄像头图片历史记录
     
-    按上报批次分组返回，每个批次包含所有摄像头的图片。
+    按上报批次分组返回，每个批次包含所有摄像头的图片元数据和签名地址（url），
+    图片内容通过 GET /admin/camera-images/{image_id} 单独加载。
     """
     try:
         # 查询不重复的batch_id（按时间倒序）
@@ -436,23 +434,27 @@ async def get_device_camera_images(
         )
         batch_ids = [row[0] for row in batch_ids_result.all()]
         
-        # 获取这些batch的所有图片
-        batches = []
-        for bid in batch_ids:
-            conditions = [
-                DeviceCameraImage.device_id == device_id,
-                DeviceCameraImage.batch_id == bid
-            ]
-            if camera_type is not None:
-                conditions.append(DeviceCameraImage.camera_type == camera_type)
-            
+        # 一次查询取出这些batch的所有图片元数据（不读取图片数据）
+        conditions = [
+            DeviceCameraImage.device_id == device_id,
+            DeviceCameraImage.batch_id.in_(batch_ids)
+        ]
+        if camera_type is not None:
+            conditions.append(DeviceCameraImage.camera_type == camera_type)
+        images_by_batch = {}
+        if batch_ids:
             images_result = await db.execute(
-                select(DeviceCameraImage)
+                select(*CAMERA_META_COLUMNS)
                 .where(and_(*conditions))
                 .order_by(DeviceCameraImage.camera_type, DeviceCameraImage.image_index)
             )
-            images = images_result.scalars().all()
-            
+            for img in images_result.all():
+                images_by_batch.setdefault(img.batch_id, []).append(img)
+        
+        # 按batch_id分页顺序组装
+        batches = []
+        for bid in batch_ids:
+            images = images_by_batch.get(bid)
             if images:
                 batch_data = {
                     "batch_id": bid,
@@ -463,11 +465,7 @@ async def get_device_camera_images(
                 for img in images:
                     camera_key = f"camera_{img.camera_type}"
                     if camera_key in batch_data:
-                        batch_data[camera_key].append({
-                            "id": img.id,
-                            "image_data": img.image_data,
-                            "image_index": img.image_index,
-                        })
+                        batch_data[camera_key].append(_camera_image_meta(img))
                 batches.append(batch_data)
         
         return ResponseModel(data={
@@ -480,3 +478,77 @@ async def get_device_camera_images(
     except Exception as e:
         logger.error(f"获取设备摄像头图片失败: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"获取设备摄像头图片失败: {str(e)}")
+
+
+@router.get("/camera-images/{image_id}")
+async def get_camera_image(
+    image_id: int,
+    request: Request,
+    exp: int = Query(..., description="签名过期时间戳"),
+    sig: str = Query(..., description="签名"),
+    variant: Optional[str] = Query(None, description="衍生图: thumb-缩略图, archive-存档图，不传为原图"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    获取摄像头图片内容（签名地址，供 <img src> 直接加载）
+    
+    支持 If-None-Match（304）和单段 Range（206），图片不可变，按签名有效期缓存。
+    衍生图尚未生成时返回原图，并要求浏览器下次重新验证，生成后即切换为衍生图。
+    """
+    if variant is not None and variant not in IMAGE_VARIANTS:
+        raise HTTPException(status_code=400, detail="不支持的图片类型")
+    if not verify_image_signature(image_id, exp, sig, variant):
+        raise HTTPException(status_code=403, detail="图片地址无效或已过期")
+    
+    if_none_match = request.headers.get("if-none-match")
+    headers = {
+        "ETag": image_etag(image_id, variant),
+        "Cache-Control": f"private, max-age={max(exp - int(time.time()), 0)}, immutable",
+        "Accept-Ranges": "bytes",
+    }
+    if if_none_match == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    
+    content = media_type = None
+    if variant is not None:
+        variant_row = (await db.execute(
+            select(DeviceCameraImageVariant.data, DeviceCameraImageVariant.media_type).where(
+                DeviceCameraImageVariant.image_id == image_id,
+                DeviceCameraImageVariant.variant == variant
+            )
+        )).one_or_none()
+        if variant_row is not None:
+            content, media_type = variant_row
+        else:
+            # 衍生图未生成（或存档图不比原图小）：返回原图，不作为不可变资源缓存
+            headers["ETag"] = image_etag(image_id)
+            headers["Cache-Control"] = "private, no-cache"
+            if if_none_match == headers["ETag"]:
+                return Response(status_code=304, headers=headers)
+    
+    if content is None:
+        result = await db.execute(
+            select(DeviceCameraImage.image_data).where(DeviceCameraImage.id == image_id)
+        )
+        image_data = result.scalar()
+        if image_data is None:
+            raise HTTPException(status_code=404, detail="图片不存在")
+        if not image_data:
+            # 保留策略已归档：原图已删除，只保留衍生图
+            raise HTTPException(status_code=410, detail="原图已归档，仅保留压缩图")
+        try:
+            content, media_type = decode_image(image_data)
+        except ValueError as e:
+            logger.warning(f"摄像头图片 {image_id} 数据损坏: {e}")
+            raise HTTPException(status_code=422, detail="图片数据损坏")
+    
+    size = len(content)
+    try:
+        byte_range = parse_range(request.headers.get("range"), size)
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    if byte_range is None:
+        return Response(content=content, media_type=media_type, headers=headers)
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return Response(content=content[start:end + 1], status_code=206, media_type=media_type, headers=headers)
@@ -0,0 +1,86 @@
+"""
+管理后台 - 数据导出API
+
+流式返回 CSV / JSONL，每行首列为主键 id；导出中断后以最后收到的 id 作为 after 参数重新请求即可续传。
+"""
+from datetime import date
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+
+from app.models.admin import Admin
+from app.api.v1.admin import get_current_admin
+from app.services.export_service import export_service, ExportBusyError, FORMATS
+
+router = APIRouter()
+
+
+def _export_response(
+    dataset: str,
+    fmt: str,
+    start: Optional[date],
+    end: Optional[date],
+    after: int,
+    filters: Dict[str, Any],
+) -> StreamingResponse:
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"不支持的导出格式: {fmt}")
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="开始日期不能晚于结束日期")
+    try:
+        slot = export_service.reserve()
+    except ExportBusyError:
+        raise HTTPException(status_code=429, detail="导出任务过多，请稍后重试")
+
+    period = f"_{start or ''}_{end or ''}" if start or end else ""
+    filename = f"{dataset}{period}{f'_after{after}' if after else ''}.{fmt}"
+    return StreamingResponse(
+        export_service.stream(dataset, fmt, start=start, end=end, after=after, filters=filters, slot=slot),
+        media_type=FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        # 客户端在开始读取前断开时生成器不会启动，响应结束后兜底归还名额
+        background=BackgroundTask(slot.release),
+    )
+
+
+@router.get("/export/orders")
+async def export_orders(
+    format: str = Query("csv", description="csv / jsonl"),
+    start: Optional[date] = Query(None, description="开始日期（含）"),
+    end: Optional[date] = Query(None, description="结束日期（含）"),
+    device_id: Optional[str] = Query(None),
+    status: Optional[int] = Query(None, description="订单状态: 0-待领取, 1-已领取, 2-已过期, 3-异常"),
+    after: int = Query(0, ge=0, description="续传：只导出 id 大于此值的记录"),
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """导出订单"""
+    return _export_response("orders", format, start, end, after, {"device_id": device_id, "status": status})
+
+
+@router.get("/export/wallet-records")
+async def export_wallet_records(
+    format: str = Query("csv", description="csv / jsonl"),
+    start: Optional[date] = Query(None, description="开始日期（含）"),
+    end: Optional[date] = Query(None, description="结束日期（含）"),
+    user_id: Optional[str] = Query(None),
+    type: Optional[str] = Query(None, description="交易类型: income / withdraw / refund"),
+    after: int = Query(0, ge=0, description="续传：只导出 id 大于此值的记录"),
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """导出钱包交易记录"""
+    return _export_response("wallet_records", format, start, end, after, {"user_id": user_id, "type": type})
+
+
+@router.get("/export/users")
+async def export_users(
+    format: str = Query("csv", description="csv / jsonl"),
+    start: Optional[date] = Query(None, description="注册开始日期（含）"),
+    end: Optional[date] = Query(None, description="注册结束日期（含）"),
+    status: Optional[int] = Query(None, description="状态: 0-禁用, 1-正常"),
+    after: int = Query(0, ge=0, description="续传：只导出 id 大于此值的记录"),
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """导出用户"""
+    return _export_response("users", format, start, end, after, {"status": status})
@@ -3,13 +3,13 @@
 """
 from fastapi import APIRouter, Depends, Query, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_
 from loguru import logger
-from app.db.database import get_db
+from app.db.database import get_read_db
 from app.models.order import DeliveryOrder
 from app.models.admin import Admin
 from app.schemas.common import ResponseModel, PaginatedResponse
 from app.api.v1.admin import get_current_admin
+from app.services.admin_lookup import Lookup, add_id_lookup, paginate
 
 router = APIRouter()
 
@@ -20,32 +20,21 @@ async def get_order_list(
     page_size: int = Query(20, ge=1, le=100),
     order_id: str = Query(None),
     status: str = Query(None),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_admin: Admin = Depends(get_current_admin)
 ):
     """获取订单列表"""
     try:
-        query = select(DeliveryOrder)
-        
-        # 筛选条件
-        conditions = []
+        # 筛选条件（订单号按唯一索引精确/前缀查找，*值* 为有界模糊查找）
+        lookup = Lookup()
         if order_id:
-            conditions.append(DeliveryOrder.order_id.like(f"%{order_id}%"))
+            await add_id_lookup(db, lookup, DeliveryOrder.order_id, order_id)
         if status:
-            conditions.append(DeliveryOrder.status == status)
-        
-        if conditions:
-            query = query.where(and_(*conditions))
-        
-        # 查询总数
-        count_query = select(func.count()).select_from(query.subquery())
-        total = (await db.execute(count_query)).scalar()
+            lookup.where(DeliveryOrder.status == status)
         
-        # 分页查询
-        query = query.order_by(DeliveryOrder.created_at.desc())
-        query = query.offset((page - 1) * page_size).limit(page_size)
-        result = await db.execute(query)
-        orders = result.scalars().all()
+        result = await paginate(db, DeliveryOrder, lookup, DeliveryOrder.created_at.desc(), page, page_size)
+        orders = result["rows"]
+        total = result["total"]
         
         # 转换为字典
         items = []
@@ -65,7 +54,9 @@ async def get_order_list(
             total=total,
             page=page,
             page_size=page_size,
-            pages=(total + page_size - 1) // page_size if total > 0 else 0
+            pages=(total + page_size - 1) // page_size if total > 0 else 0,
+            total_exact=result["total_exact"],
+            truncated=result["truncated"]
         ))
     except Exception as e:
         logger.error(f"获取订单列表失败: {e}", exc_info=True)
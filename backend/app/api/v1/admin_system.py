@@ -0,0 +1,78 @@
+"""
+管理后台 - 系统运行指标API
+"""
+from fastapi import APIRouter, Depends, Query
+
+from app.models.admin import Admin
+from app.schemas.common import ResponseModel
+from app.api.v1.admin import get_current_admin
+from app.db.database import replica_router
+from app.db.pool import pool_monitor
+from app.services.camera_retention import camera_retention_job
+from app.services.dashboard_service import dashboard_service
+from app.services.device_clusters import device_cluster_index
+from app.services.device_geo_index import device_geo_index
+from app.services.device_search import device_search_index
+from app.services.export_service import export_service
+from app.services.fill_forecast import fill_forecast_job
+from app.services.fleet_state import fleet_state
+from app.services.image_variant_service import image_variant_worker
+from app.services.password_service import password_hasher
+from app.services.principal_cache import principal_cache
+from app.services.route_planner import route_planner
+from app.services.wechat_pay import wechat_pay_service
+from app.services.wechat_pay_certs import platform_cert_store
+from app.services.withdraw_service import withdraw_worker
+from app.services.withdraw_reconciler import withdraw_reconciler
+
+router = APIRouter()
+
+
+@router.get("/system/metrics", response_model=ResponseModel)
+async def get_system_metrics(
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """
+    获取当前进程的后台任务运行指标
+
+    多进程部署时每个进程的指标独立，请求落到哪个进程就返回哪个进程的数据。
+    """
+    return ResponseModel(data={
+        "wechat_pay": {
+            "available": wechat_pay_service.is_available(),
+            "circuit_state": wechat_pay_service.circuit_breaker.state,
+            "platform_certs": platform_cert_store.stats(),
+        },
+        "withdraw_worker": withdraw_worker.stats(),
+        "withdraw_reconciler": withdraw_reconciler.stats(),
+        "db_pool": pool_monitor.stats(),
+        "db_replicas": replica_router.stats(),
+        "principal_cache": principal_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "dashboard_cache": dashboard_service.stats(),
+        "fleet_state": fleet_state.stats(),
+        "device_search": device_search_index.stats(),
+        "device_geo": device_geo_index.stats(),
+        "device_clusters": device_cluster_index.stats(),
+        "route_planner": route_planner.stats(),
+        "fill_forecast": fill_forecast_job.stats(),
+        "export": export_service.stats(),
+        "image_variant_worker": image_variant_worker.stats(),
+        "camera_retention": camera_retention_job.stats(),
+    })
+
+
+@router.get("/system/fleet-state/verify", response_model=ResponseModel)
+async def verify_fleet_state(
+    resync: bool = Query(False, description="不一致时是否立即从数据库校正"),
+    current_admin: Admin = Depends(get_current_admin)
+):
+    """
+    比对当前进程的设备状态聚合与数据库
+
+    返回各条件下数据库有而聚合缺失（missing）、聚合多出（extra）的设备ID，一致时为空。
+    """
+    mismatches = await fleet_state.verify()
+    if mismatches and resync:
+        await fleet_state.resync()
+    return ResponseModel(data={"consistent": not mismatches, "mismatches": mismatches})
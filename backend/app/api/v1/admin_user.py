@@ -3,13 +3,14 @@
 """
 from fastapi import APIRouter, Depends, Query, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, and_
+from sqlalchemy import select
 from loguru import logger
-from app.db.database import get_db
+from app.db.database import get_db, get_read_db
 from app.models.user import User
 from app.models.admin import Admin
 from app.schemas.common import ResponseModel, PaginatedResponse
 from app.api.v1.admin import get_current_admin
+from app.services.admin_lookup import Lookup, add_id_lookup, add_phone_lookup, paginate
 
 router = APIRouter()
 
@@ -20,32 +21,21 @@ async def get_user_list(
     page_size: int = Query(20, ge=1, le=100),
     user_id: str = Query(None),
     phone: str = Query(None),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_admin: Admin = Depends(get_current_admin)
 ):
     """获取用户列表"""
     try:
-        query = select(User)
-        
-        # 筛选条件
-        conditions = []
+        # 筛选条件（用户ID按唯一索引精确/前缀查找，手机号默认按尾号查找）
+        lookup = Lookup()
         if user_id:
-            conditions.append(User.user_id.like(f"%{user_id}%"))
+            await add_id_lookup(db, lookup, User.user_id, user_id)
         if phone:
-            conditions.append(User.phone.like(f"%{phone}%"))
-        
-        if conditions:
-            query = query.where(and_(*conditions))
-        
-        # 查询总数
-        count_query = select(func.count()).select_from(query.subquery())
-        total = (await db.execute(count_query)).scalar()
+            add_phone_lookup(lookup, User.phone, User.phone_reversed, phone)
         
-        # 分页查询
-        query = query.order_by(User.created_at.desc())
-        query = query.offset((page - 1) * page_size).limit(page_size)
-        result = await db.execute(query)
-        users = result.scalars().all()
+        result = await paginate(db, User, lookup, User.created_at.desc(), page, page_size)
+        users = result["rows"]
+        total = result["total"]
         
         # 转换为字典
         items = []
@@ -66,7 +56,9 @@ async def get_user_list(
             total=total,
             page=page,
             page_size=page_size,
-            pages=(total + page_size - 1) // page_size if total > 0 else 0
+            pages=(total + page_size - 1) // page_size if total > 0 else 0,
+            total_exact=result["total_exact"],
+            truncated=result["truncated"]
         ))
     except Exception as e:
         logger.error(f"获取用户列表失败: {e}", exc_info=True)
@@ -1,79 +1,57 @@
 """
 设备API
 """
+from typing import Optional
+
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
-import math
 
-from app.db.database import get_db
+from app.db.database import get_read_db
 from app.models.device import Device
 from app.schemas.common import ResponseModel
 from app.schemas.device import DeviceListItem, DeviceDetailResponse
+from app.services.device_geo_index import device_geo_index
+from app.services.device_search import device_search_index
 
 router = APIRouter()
 
 
-def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> int:
-    """计算两点之间的距离(米)"""
-    R = 6371000  # 地球半径(米)
-    
-    lat1_rad = math.radians(lat1)
-    lat2_rad = math.radians(lat2)
-    delta_lat = math.radians(lat2 - lat1)
-    delta_lon = math.radians(lon2 - lon1)
-    
-    a = math.sin(delta_lat / 2) ** 2 + \
-        math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lon / 2) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    
-    return int(R * c)
-
-
 @router.get("/nearby", response_model=ResponseModel)
 async def get_nearby_devices(
     longitude: float = Query(..., description="经度"),
     latitude: float = Query(..., description="纬度"),
-    radius: int = Query(5000, description="搜索半径(米)"),
-    db: AsyncSession = Depends(get_db)
+    radius: int = Query(5000, ge=1, le=100000, description="搜索半径(米)"),
+    limit: Optional[int] = Query(None, ge=1, le=200, description="只返回最近的 N 台"),
+    exclude: Optional[str] = Query(None, description="排除的设备状态，逗号分隔: offline,full,smoke_alert,using"),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """获取附近设备"""
-    # 查询所有设备
+    """获取附近设备（按距离排序）"""
+    hits = await device_geo_index.nearby(
+        latitude, longitude, radius,
+        limit=limit,
+        exclude=[name.strip() for name in exclude.split(",")] if exclude else ()
+    )
+    if not hits:
+        return ResponseModel(data=[])
+
     result = await db.execute(
-        select(Device).where(
-            Device.latitude.isnot(None),
-            Device.longitude.isnot(None)
-        )
+        select(Device).where(Device.device_id.in_([device_id for device_id, _ in hits]))
     )
-    devices = result.scalars().all()
-    
-    # 计算距离并筛选
-    nearby = []
-    for device in devices:
-        distance = calculate_distance(
-            latitude, longitude,
-            device.latitude, device.longitude
-        )
-        if distance <= radius:
-            nearby.append({
-                "device": device,
-                "distance": distance
-            })
-    
-    # 按距离排序
-    nearby.sort(key=lambda x: x["distance"])
+    devices = {d.device_id: d for d in result.scalars().all()}
     
     items = [
         DeviceListItem(
-            device_id=item["device"].device_id,
-            name=item["device"].name,
-            address=item["device"].address,
-            latitude=item["device"].latitude,
-            longitude=item["device"].longitude,
-            status=item["device"].status,
-            distance=item["distance"]
+            device_id=d.device_id,
+            name=d.name,
+            address=d.address,
+            latitude=d.latitude,
+            longitude=d.longitude,
+            status=d.status,
+            distance=distance
         )
-        for item in nearby
+        for d, distance in ((devices.get(device_id), distance) for device_id, distance in hits)
+        if d is not None
     ]
     
     return ResponseModel(data=items)
@@ -82,7 +60,7 @@ async def get_nearby_devices(
 @router.get("/{device_id}/info", response_model=ResponseModel)
 async def get_device_info(
     device_id: str,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """获取设备详情"""
     result = await db.execute(
@@ -108,16 +86,20 @@ async def get_device_info(
 @router.get("/search", response_model=ResponseModel)
 async def search_devices(
     keyword: str = Query(..., min_length=1, description="搜索关键词"),
-    db: AsyncSession = Depends(get_db)
+    longitude: Optional[float] = Query(None, description="经度（传入位置时附近的设备排在前面）"),
+    latitude: Optional[float] = Query(None, description="纬度"),
+    limit: int = Query(20, ge=1, le=50, description="返回数量"),
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """搜索设备"""
+    """搜索设备（按相关度排序，传入位置时兼顾距离）"""
+    hits = await device_search_index.search(keyword, limit, latitude=latitude, longitude=longitude)
+    if not hits:
+        return ResponseModel(data=[])
+
     result = await db.execute(
-        select(Device).where(
-            (Device.name.contains(keyword)) |
-            (Device.address.contains(keyword))
-        ).limit(20)
+        select(Device).where(Device.device_id.in_([device_id for device_id, _, _ in hits]))
     )
-    devices = result.scalars().all()
+    devices = {d.device_id: d for d in result.scalars().all()}
     
     items = [
         DeviceListItem(
@@ -127,10 +109,10 @@ async def search_devices(
             latitude=d.latitude,
             longitude=d.longitude,
             status=d.status,
-            distance=None
+            distance=distance
         )
-        for d in devices
+        for d, distance in ((devices.get(device_id), distance) for device_id, _, distance in hits)
+        if d is not None
     ]
     
     return ResponseModel(data=items)
-
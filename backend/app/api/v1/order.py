@@ -9,9 +9,8 @@ import json
 import base64
 import hmac
 import hashlib
-import uuid
 
-from app.db.database import get_db
+from app.db.database import get_db, get_read_db
 from app.config import settings
 from app.models.user import User
 from app.models.device import Device
@@ -27,18 +26,21 @@ from app.schemas.order import (
     OrderStatsResponse
 )
 from app.api.deps import get_current_user
+from app.services.ledger_service import LedgerService
+from app.services.order_stats_service import record_order_created, record_order_claimed
+from app.utils.id_generator import generate_id
 
 router = APIRouter()
 
 
 def generate_order_id() -> str:
-    """生成订单ID"""
-    return f"ORD{datetime.now().strftime('%Y%m%d%H%M%S')}{uuid.uuid4().hex[:6].upper()}"
+    """生成订单ID（时间有序，16位）"""
+    return generate_id("ORD")
 
 
 def generate_record_id() -> str:
-    """生成记录ID"""
-    return f"REC{uuid.uuid4().hex[:12].upper()}"
+    """生成记录ID（时间有序，16位）"""
+    return generate_id("REC")
 
 
 def verify_signature(data: dict, signature: str, device_secret: str) -> bool:
@@ -146,6 +148,8 @@ async def scan_qrcode(
             qrcode_expire_time=datetime.fromtimestamp(qr_data['e'])
         )
         db.add(order)
+        # 设备/全局日汇总与订单同一事务
+        await record_order_created(db, order)
         await db.commit()
         await db.refresh(order)
     
@@ -176,9 +180,9 @@ async def claim_order(
     current_user: User = Depends(get_current_user)
 ):
     """领取订单金额"""
-    # 查询订单
+    # 查询订单（加锁，防止同一订单被并发重复领取）
     result = await db.execute(
-        select(DeliveryOrder).where(DeliveryOrder.order_id == order_id)
+        select(DeliveryOrder).where(DeliveryOrder.order_id == order_id).with_for_update()
     )
     order = result.scalar_one_or_none()
     
@@ -197,11 +201,18 @@ async def claim_order(
         await db.commit()
         raise HTTPException(status_code=400, detail={"code": 10004, "message": "订单已过期"})
     
+    # 锁定用户行并刷新余额，避免并发入账基于旧值计算
+    ledger = LedgerService(db)
+    await ledger.lock_user(current_user.user_id)
+    
     # 更新订单状态
     order.user_id = current_user.user_id
     order.status = 1
     order.claim_time = datetime.now()
     
+    # 账本入账
+    await ledger.record_income(current_user.user_id, order.amount, order.order_id)
+    
     # 更新用户余额
     balance_before = current_user.balance
     current_user.balance += order.amount
@@ -222,6 +233,7 @@ async def claim_order(
         remark=f"回收收入-{order.device_name}"
     )
     db.add(wallet_record)
+    await record_order_claimed(db, order)
     
     await db.commit()
     
@@ -240,7 +252,7 @@ async def get_order_list(
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
     status: int = Query(None),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
     """获取订单列表"""
@@ -299,7 +311,7 @@ async def get_order_stats(
 @router.get("/{order_id}/detail", response_model=ResponseModel)
 async def get_order_detail(
     order_id: str,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
     """获取订单详情"""
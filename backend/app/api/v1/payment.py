@@ -1,14 +1,24 @@
 """
 支付相关API - 微信支付回调等
 """
+import json
+
 from fastapi import APIRouter, Request, HTTPException, Depends
+from fastapi.responses import JSONResponse
 from loguru import logger
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from app.db.database import get_db
-from app.models.withdraw import WithdrawRecord, WithdrawStatus
+from app.models.withdraw import WithdrawRecord
 from app.schemas.common import ResponseModel
+from app.services.wechat_pay_certs import platform_cert_store, NotifyVerifyError
+from app.services.withdraw_reconciler import request_reconcile
+from app.services.withdraw_service import (
+    detail_filter,
+    settle_withdraw_success,
+    settle_withdraw_failure,
+)
 
 router = APIRouter(prefix="/payment", tags=["支付"])
 
@@ -21,81 +31,64 @@ async def wechat_transfer_notify(
     """
     微信转账回调通知
     注意：实际使用时需要在微信商户平台配置回调URL
+
+    验签和解密只使用内存中的平台证书（platform_cert_store），不发起外部请求。
+    重复回调由结算时的条件 UPDATE 保证幂等。
     """
+    body = await request.body()
+    headers = request.headers
+    serial = headers.get("Wechatpay-Serial")
+
+    # 验证签名，确保请求来自微信
     try:
-        # 获取请求头
-        headers = dict(request.headers)
-        signature = headers.get("Wechatpay-Signature")
-        timestamp = headers.get("Wechatpay-Timestamp")
-        nonce = headers.get("Wechatpay-Nonce")
-        serial = headers.get("Wechatpay-Serial")
-        
-        # 获取请求体
-        body = await request.body()
-        
-        logger.info(f"收到微信转账回调: signature={signature}, timestamp={timestamp}")
-        logger.info(f"回调数据: {body.decode('utf-8')}")
-        
-        # TODO: 验证签名
-        # 这里需要验证微信回调的签名，确保请求来自微信
-        
-        # 解析回调数据
-        import json
-        data = json.loads(body.decode('utf-8'))
-        
-        # 根据回调类型处理
-        event_type = data.get("event_type")
-        resource = data.get("resource", {})
-        
-        if event_type == "TRANSFER.SUCCESS":
-            # 转账成功
-            batch_id = resource.get("batch_id")
-            out_batch_no = resource.get("out_batch_no")
-            
-            # 查找提现记录
-            result = await db.execute(
-                select(WithdrawRecord).where(
-                    WithdrawRecord.withdraw_id == out_batch_no
-                )
-            )
-            withdraw_record = result.scalar_one_or_none()
-            
-            if withdraw_record:
-                withdraw_record.status = WithdrawStatus.SUCCESS.value
-                await db.commit()
-                logger.info(f"提现成功更新: withdraw_id={out_batch_no}")
-            else:
-                logger.warning(f"未找到提现记录: withdraw_id={out_batch_no}")
-        
-        elif event_type == "TRANSFER.FAILED":
-            # 转账失败
-            batch_id = resource.get("batch_id")
-            out_batch_no = resource.get("out_batch_no")
-            fail_reason = resource.get("fail_reason", "未知错误")
-            
-            # 查找提现记录
+        await platform_cert_store.verify(
+            serial=serial,
+            signature=headers.get("Wechatpay-Signature"),
+            timestamp=headers.get("Wechatpay-Timestamp"),
+            nonce=headers.get("Wechatpay-Nonce"),
+            body=body
+        )
+        data = json.loads(body)
+        resource = platform_cert_store.decrypt_resource(data.get("resource", {}))
+    except (NotifyVerifyError, ValueError) as e:
+        logger.warning(f"微信转账回调验签失败: serial={serial}, error={e}")
+        return JSONResponse(status_code=401, content={"code": "FAIL", "message": str(e)})
+
+    event_type = data.get("event_type")
+    out_batch_no = resource.get("out_batch_no")
+    out_detail_no = resource.get("out_detail_no")
+    logger.info(f"收到微信转账回调: id={data.get('id')}, event_type={event_type}, out_batch_no={out_batch_no}")
+
+    try:
+        if event_type in ("TRANSFER.SUCCESS", "TRANSFER.FAILED") and out_detail_no:
+            # 明细级通知，直接结算（已是终态时结算内的条件 UPDATE 不命中，不重复处理）
             result = await db.execute(
-                select(WithdrawRecord).where(
-                    WithdrawRecord.withdraw_id == out_batch_no
-                )
+                select(WithdrawRecord).where(detail_filter(out_batch_no, out_detail_no))
             )
             withdraw_record = result.scalar_one_or_none()
-            
-            if withdraw_record:
-                withdraw_record.status = WithdrawStatus.FAILED.value
-                withdraw_record.error_message = fail_reason
-                # TODO: 解冻金额并退款
-                await db.commit()
-                logger.info(f"提现失败更新: withdraw_id={out_batch_no}, reason={fail_reason}")
+            if withdraw_record is None:
+                logger.warning(f"未找到提现记录: out_batch_no={out_batch_no}, out_detail_no={out_detail_no}")
+            elif event_type == "TRANSFER.SUCCESS":
+                await settle_withdraw_success(db, withdraw_record)
             else:
-                logger.warning(f"未找到提现记录: withdraw_id={out_batch_no}")
-        
+                await settle_withdraw_failure(db, withdraw_record, resource.get("fail_reason", "未知错误"))
+            await db.commit()
+
+        elif out_batch_no:
+            # 批次级通知（MCHTRANSFER.BATCH.FINISHED 等）：不在回调内查询微信，
+            # 标记批次由对账任务下一轮查询明细并逐笔回写；批次已全部完结时（重复通知）不做任何事
+            marked = await request_reconcile(db, out_batch_no)
+            await db.commit()
+            if marked:
+                logger.info(f"批次已标记待对账: out_batch_no={out_batch_no}, 笔数={marked}")
+
         # 返回成功响应
         return {"code": "SUCCESS", "message": "成功"}
-        
+
     except Exception as e:
         logger.error(f"处理微信转账回调异常: {e}")
-        return {"code": "FAIL", "message": str(e)}
+        # 返回非 2xx，微信会按策略重新通知
+        return JSONResponse(status_code=500, content={"code": "FAIL", "message": str(e)})
 
 
 @router.get("/withdraw/{withdraw_id}")
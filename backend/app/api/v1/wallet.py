@@ -1,7 +1,6 @@
 """
 钱包API
 """
-import uuid
 from datetime import datetime
 from fastapi import APIRouter, Depends, Query, HTTPException
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -20,6 +19,9 @@ from app.schemas.user import (
 )
 from app.api.deps import get_current_user
 from app.services.wechat_pay import wechat_pay_service
+from app.services.ledger_service import LedgerService
+from app.services.withdraw_service import withdraw_worker
+from app.utils.id_generator import generate_id
 
 router = APIRouter()
 
@@ -87,7 +89,17 @@ async def withdraw(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """申请提现到微信零钱"""
+    """
+    申请提现到微信零钱
+    
+    只冻结金额并创建提现任务，立即返回 processing；
+    转账由后台 worker 执行，可通过 /payment/withdraw/{withdraw_id} 查询结果。
+    """
+    ledger = LedgerService(db)
+    
+    # 锁定用户行并刷新余额，避免并发提现重复使用同一笔可用余额
+    await ledger.lock_user(current_user.user_id)
+    
     # 检查金额
     if request.amount <= 0:
         raise HTTPException(
@@ -131,20 +143,21 @@ async def withdraw(
         )
     
     # 生成提现单号
-    withdraw_id = f"WD{datetime.now().strftime('%Y%m%d%H%M%S')}{uuid.uuid4().hex[:8].upper()}"
+    withdraw_id = generate_id("WD")
     
     try:
-        # 1. 创建提现记录
+        # 1. 创建提现记录（PENDING，由后台 worker 发起转账）
         withdraw_record = WithdrawRecord(
             withdraw_id=withdraw_id,
             user_id=current_user.user_id,
             amount=request.amount,
             channel=request.channel,
             status=WithdrawStatus.PENDING.value,
-            wechat_openid=current_user.openid
+            wechat_openid=current_user.openid,
+            attempts=0,
+            next_attempt_at=datetime.now()
         )
         db.add(withdraw_record)
-        await db.flush()  # 获取ID
         
         # 2. 冻结金额
         balance_before = current_user.balance
@@ -152,9 +165,8 @@ async def withdraw(
         balance_after = current_user.balance
         
         # 3. 创建钱包冻结记录
-        freeze_record_id = f"FR{uuid.uuid4().hex[:28].upper()}"
         wallet_record = WalletRecord(
-            record_id=freeze_record_id,
+            record_id=generate_id("FR"),
             user_id=current_user.user_id,
             type="freeze",  # 冻结类型
             amount=-request.amount,
@@ -163,80 +175,9 @@ async def withdraw(
             remark=f"提现冻结-{withdraw_id}"
         )
         db.add(wallet_record)
+        await ledger.record_freeze(current_user.user_id, request.amount, withdraw_id)
         
         await db.commit()
-        
-        # 4. 调用微信转账接口
-        try:
-            transfer_result = await wechat_pay_service.transfer_to_balance(
-                openid=current_user.openid,
-                amount=request.amount,
-                description="旧衣回收收益提现",
-                withdraw_id=withdraw_id
-            )
-            
-            # 5. 更新提现记录状态（转账成功）
-            withdraw_record.status = WithdrawStatus.SUCCESS.value
-            withdraw_record.wechat_batch_id = transfer_result.get("batch_id")
-            withdraw_record.completed_at = datetime.now()
-            
-            # 6. 扣除余额（转账成功，实际扣除）
-            balance_before = current_user.balance
-            current_user.balance = balance_before - request.amount
-            current_user.frozen_balance = (current_user.frozen_balance or 0) - request.amount
-            balance_after = current_user.balance
-            
-            # 7. 创建钱包支出记录
-            withdraw_record_id = f"WD{uuid.uuid4().hex[:28].upper()}"
-            wallet_withdraw = WalletRecord(
-                record_id=withdraw_record_id,
-                user_id=current_user.user_id,
-                type="withdraw",
-                amount=-request.amount,
-                balance_before=balance_before,
-                balance_after=balance_after,
-                remark=f"提现-{withdraw_id}"
-            )
-            db.add(wallet_withdraw)
-            
-            await db.commit()
-            
-            logger.info(f"提现成功: withdraw_id={withdraw_id}, amount={request.amount}, user={current_user.user_id}")
-            
-            return ResponseModel(
-                message="提现申请已提交，资金将即时到账",
-                data={
-                    "withdraw_id": withdraw_id,
-                    "amount": request.amount,
-                    "channel": request.channel,
-                    "status": "processing",
-                    "batch_id": transfer_result.get("batch_id")
-                }
-            )
-            
-        except Exception as e:
-            # 转账失败，回滚冻结金额
-            logger.error(f"微信转账失败: {e}")
-            
-            # 回滚冻结
-            current_user.frozen_balance = (current_user.frozen_balance or 0) - request.amount
-            
-            # 更新提现记录
-            withdraw_record.status = WithdrawStatus.FAILED.value
-            withdraw_record.error_message = str(e)
-            
-            # 删除冻结记录
-            await db.delete(wallet_record)
-            
-            await db.commit()
-            
-            raise HTTPException(
-                status_code=500,
-                detail={"code": 20007, "message": f"提现失败: {str(e)}"}
-            )
-    
-    except HTTPException:
-        raise
     except Exception as e:
         await db.rollback()
         logger.error(f"提现处理异常: {e}")
@@ -244,4 +185,17 @@ async def withdraw(
             status_code=500,
             detail={"code": 20008, "message": "提现处理失败，请稍后重试"}
         )
-
+    
+    # 4. 唤醒转账 worker，转账结果通过回调/对账异步更新
+    withdraw_worker.notify()
+    logger.info(f"提现申请已受理: withdraw_id={withdraw_id}, amount={request.amount}, user={current_user.user_id}")
+    
+    return ResponseModel(
+        message="提现申请已提交，资金将在处理完成后到账",
+        data={
+            "withdraw_id": withdraw_id,
+            "amount": request.amount,
+            "channel": request.channel,
+            "status": "processing"
+        }
+    )
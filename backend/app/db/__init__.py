@@ -1,2 +1,2 @@
-from app.db.database import get_db, init_db, close_db
+from app.db.database import get_db, get_read_db, read_session, init_db, close_db
 
@@ -1,19 +1,53 @@
 """
 数据库连接管理
+
+    get_db         读写会话：请求结束时提交，异常时回滚，始终使用主库
+    get_read_db    只读会话：autocommit 读取、不提交，有可用从库（DATABASE_REPLICA_URLS）时路由到从库
+    read_session   只读会话的上下文管理器，供后台统计等不经过请求依赖的代码使用；
+                   snapshot=True 时在一个只读一致性快照事务内执行多条查询
 """
+from contextlib import asynccontextmanager
+from sqlalchemy import event, text
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy.orm import declarative_base
-from typing import AsyncGenerator
+from sqlalchemy.orm import declarative_base, Session
+from typing import AsyncGenerator, Optional
+from fastapi.requests import HTTPConnection
 
 from app.config import settings
+from app.db.pool import InstrumentedQueuePool, pool_monitor, pool_sizing
+from app.db.replicas import ReplicaRouter
+
+# 会话 info 键: 只读会话标记、本次会话是否写入过
+READ_ONLY_KEY = "read_only"
+_WROTE_KEY = "wrote"
+
+
+def _create_engine(url: str, name: str):
+    # 每个 worker 的连接数按 DATABASE_CONNECTION_BUDGET 分摊，见 app.db.pool
+    pool_size, max_overflow = pool_sizing()
+    created = create_async_engine(
+        url,
+        echo=settings.DEBUG,
+        poolclass=InstrumentedQueuePool,
+        pool_pre_ping=True,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=settings.DATABASE_POOL_TIMEOUT_SECONDS
+    )
+    pool_monitor.attach(name, created)
+    return created
+
 
 # 创建异步引擎
-engine = create_async_engine(
-    settings.DATABASE_URL,
-    echo=settings.DEBUG,
-    pool_pre_ping=True,
-    pool_size=10,
-    max_overflow=20
+engine = _create_engine(settings.DATABASE_URL, "primary")
+
+# 只读从库
+_replica_urls = [url.strip() for url in settings.DATABASE_REPLICA_URLS.split(",") if url.strip()]
+replica_router = ReplicaRouter(
+    engine,
+    [_create_engine(url, f"replica{index}") for index, url in enumerate(_replica_urls, 1)],
+    max_lag=settings.DATABASE_REPLICA_MAX_LAG_SECONDS,
+    check_interval=settings.DATABASE_REPLICA_CHECK_SECONDS,
 )
 
 # 创建会话工厂
@@ -25,31 +59,84 @@ AsyncSessionLocal = async_sessionmaker(
     autoflush=False
 )
 
+# 只读会话工厂（每次按路由结果绑定引擎）
+ReadSessionLocal = async_sessionmaker(
+    class_=AsyncSession,
+    expire_on_commit=False,
+    autoflush=False,
+    info={READ_ONLY_KEY: True}
+)
+
 # 声明基类
 Base = declarative_base()
 
 
+@event.listens_for(Session, "before_flush")
+def _reject_read_only_writes(session: Session, flush_context, instances) -> None:
+    if session.info.get(READ_ONLY_KEY) and (session.new or session.dirty or session.deleted):
+        raise RuntimeError("只读会话不能写入数据，请使用 get_db")
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_written(session: Session, flush_context) -> None:
+    session.info[_WROTE_KEY] = True
+
+
+def client_key(request: HTTPConnection) -> Optional[str]:
+    """读己之写按客户端区分：登录用户按 Authorization 头，未登录按 IP"""
+    return request.headers.get("authorization") or (request.client.host if request.client else None)
+
+
 async def init_db():
-    """初始化数据库"""
-    async with engine.begin() as conn:
-        # 创建所有表
-        await conn.run_sync(Base.metadata.create_all)
+    """
+    初始化数据库（执行待执行的迁移）
+
+    仅供部署脚本调用，服务启动时不执行 DDL，见 app.db.migrate。
+    """
+    from app.db.migrate import upgrade
+    await upgrade()
 
 
 async def close_db():
     """关闭数据库连接"""
+    await replica_router.stop()
+    await replica_router.dispose()
     await engine.dispose()
 
 
-async def get_db() -> AsyncGenerator[AsyncSession, None]:
+async def get_db(request: HTTPConnection) -> AsyncGenerator[AsyncSession, None]:
     """获取数据库会话"""
     async with AsyncSessionLocal() as session:
         try:
             yield session
             await session.commit()
+            if session.info.pop(_WROTE_KEY, False):
+                replica_router.record_write(client_key(request))
         except Exception:
             await session.rollback()
             raise
         finally:
             await session.close()
 
+
+@asynccontextmanager
+async def read_session(client: Optional[str] = None, snapshot: bool = False) -> AsyncGenerator[AsyncSession, None]:
+    """
+    只读会话
+
+    Args:
+        client: 客户端标识，用于读己之写（见 app.db.replicas）
+        snapshot: 在 READ ONLY 一致性快照事务内执行（多条查询需要看到同一时刻的数据时使用）
+    """
+    bind = replica_router.choose(client, autocommit=not snapshot)
+    async with ReadSessionLocal(bind=bind) as session:
+        if snapshot:
+            await session.execute(text("START TRANSACTION READ ONLY, WITH CONSISTENT SNAPSHOT"))
+        # 退出时 close() 回滚（结束快照事务），不提交
+        yield session
+
+
+async def get_read_db(request: HTTPConnection) -> AsyncGenerator[AsyncSession, None]:
+    """获取只读数据库会话（不提交，可能读从库）"""
+    async with read_session(client_key(request)) as session:
+        yield session
@@ -5,15 +5,18 @@ import asyncio
 import uuid
 from sqlalchemy import text
 
-from app.db.database import engine, Base, AsyncSessionLocal
+from app.db.database import engine, AsyncSessionLocal
+from app.db.migrate import upgrade
 from app.models import User, Device, DeliveryOrder, WalletRecord, WithdrawRecord
 
 
 async def create_tables():
-    """创建数据库表"""
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-    print("✅ 数据库表创建成功")
+    """创建数据库表（执行全部待执行迁移）"""
+    executed = await upgrade()
+    if executed:
+        print(f"✅ 数据库迁移完成: {', '.join(executed)}")
+    else:
+        print("ℹ️  数据库结构已是最新")
 
 
 async def create_test_data():
@@ -0,0 +1,40 @@
+"""
+后台任务单进程执行锁（MySQL GET_LOCK）
+
+多进程部署时，对账、图片清理等后台任务每个进程都会启动，用命名锁保证同一时间只有一个进程在执行。
+GET_LOCK 与连接绑定，任务执行期间必须一直持有加锁的那条连接，因此锁连接不从业务连接池借出：
+使用独立的 NullPool 引擎，每次加锁新建一条连接、释放锁后关闭。任务执行再久（包括等待微信接口）
+也不会占用请求可用的连接池；代价是持有锁的进程额外占用一条数据库连接。
+非 MySQL 数据库（本地开发）不加锁，直接执行。
+"""
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.config import settings
+
+# 锁专用引擎（不经过连接池）
+lock_engine = create_async_engine(settings.DATABASE_URL, poolclass=NullPool, pool_pre_ping=True)
+
+
+@asynccontextmanager
+async def job_lock(name: str) -> AsyncGenerator[bool, None]:
+    """
+    尝试获取命名锁（不等待），退出时释放
+
+    Yields:
+        是否获得了锁，未获得说明其他进程正在执行
+    """
+    if lock_engine.dialect.name != "mysql":
+        yield True
+        return
+    async with lock_engine.connect() as conn:
+        locked = await conn.scalar(text("SELECT GET_LOCK(:name, 0)"), {"name": name})
+        try:
+            yield locked == 1
+        finally:
+            if locked == 1:
+                await conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": name})
@@ -0,0 +1,180 @@
+"""
+数据库迁移管理
+
+迁移脚本位于 app/db/migrations/ 目录，文件名格式为 vNNNN_描述.py，每个脚本包含：
+- REVISION: 版本号（如 "0001"），按字典序依次执行
+- DESCRIPTION: 迁移说明
+- upgrade(conn): 同步函数，接收 SQLAlchemy Connection 执行 DDL
+
+已执行的版本记录在 schema_migrations 表中。迁移只在部署阶段执行一次：
+
+    python -m app.db.migrate            # 执行全部待执行迁移
+    python -m app.db.migrate status     # 查看迁移状态
+
+服务启动时不再执行任何 DDL。
+"""
+import asyncio
+import importlib
+import pkgutil
+import sys
+from types import ModuleType
+from typing import List
+
+from sqlalchemy import (
+    Column, DateTime, Index, MetaData, String, Table, inspect, select, text
+)
+from sqlalchemy.engine import Connection
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.sql import func
+
+from app.db.database import engine
+
+MIGRATION_LOCK_NAME = "clothing_recycle_schema_migrations"
+MIGRATION_LOCK_TIMEOUT = 60
+
+# 迁移版本表（独立于业务 Base，避免被业务模型 create_all 误建）
+_version_metadata = MetaData()
+schema_migrations = Table(
+    "schema_migrations",
+    _version_metadata,
+    Column("version_num", String(32), primary_key=True, comment="迁移版本号"),
+    Column("description", String(255), nullable=True, comment="迁移说明"),
+    Column("applied_at", DateTime, server_default=func.now(), comment="执行时间"),
+)
+
+
+# ============================================================
+# 迁移脚本中使用的幂等 DDL 工具函数
+# ============================================================
+
+def create_table_if_missing(conn: Connection, table: Table) -> bool:
+    """表不存在时创建（连同表上定义的索引）"""
+    if inspect(conn).has_table(table.name):
+        return False
+    table.create(conn)
+    return True
+
+
+def add_column_if_missing(conn: Connection, table_name: str, column: Column) -> bool:
+    """列不存在时追加列（column 通常取自模型，如 User.__table__.c.phone_reversed）"""
+    existing = {c["name"] for c in inspect(conn).get_columns(table_name)}
+    if column.name in existing:
+        return False
+    column_ddl = CreateColumn(column).compile(dialect=conn.dialect)
+    conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_ddl}"))
+    return True
+
+
+def create_index_if_missing(conn: Connection, index: Index) -> bool:
+    """索引不存在时创建"""
+    table_name = index.table.name
+    existing = {i["name"] for i in inspect(conn).get_indexes(table_name)}
+    if index.name in existing:
+        return False
+    index.create(conn)
+    return True
+
+
+# ============================================================
+# 迁移执行
+# ============================================================
+
+def load_migrations() -> List[ModuleType]:
+    """加载全部迁移脚本（按版本号排序）"""
+    from app.db import migrations as package
+
+    modules = []
+    for info in pkgutil.iter_modules(package.__path__):
+        if not info.name.startswith("v"):
+            continue
+        module = importlib.import_module(f"{package.__name__}.{info.name}")
+        modules.append(module)
+
+    modules.sort(key=lambda m: m.REVISION)
+    revisions = [m.REVISION for m in modules]
+    if len(revisions) != len(set(revisions)):
+        raise RuntimeError(f"迁移版本号重复: {revisions}")
+    return modules
+
+
+def _applied_revisions(conn: Connection) -> set:
+    _version_metadata.create_all(conn, checkfirst=True)
+    rows = conn.execute(select(schema_migrations.c.version_num)).all()
+    return {row[0] for row in rows}
+
+
+def _upgrade(conn: Connection) -> List[str]:
+    """在单个连接上依次执行待执行的迁移"""
+    is_mysql = conn.dialect.name == "mysql"
+    if is_mysql:
+        # 多实例同时部署时，只允许一个进程执行迁移
+        locked = conn.execute(
+            text("SELECT GET_LOCK(:name, :timeout)"),
+            {"name": MIGRATION_LOCK_NAME, "timeout": MIGRATION_LOCK_TIMEOUT}
+        ).scalar()
+        if locked != 1:
+            raise RuntimeError("获取迁移锁超时，可能有其他进程正在执行迁移")
+
+    try:
+        applied = _applied_revisions(conn)
+        conn.commit()
+        executed = []
+        for module in load_migrations():
+            if module.REVISION in applied:
+                continue
+            print(f"⏳ 执行迁移 {module.REVISION}: {module.DESCRIPTION}")
+            module.upgrade(conn)
+            conn.execute(schema_migrations.insert().values(
+                version_num=module.REVISION,
+                description=module.DESCRIPTION
+            ))
+            conn.commit()
+            executed.append(module.REVISION)
+        return executed
+    finally:
+        if is_mysql:
+            conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": MIGRATION_LOCK_NAME})
+
+
+def _pending(conn: Connection) -> List[ModuleType]:
+    applied = _applied_revisions(conn)
+    conn.commit()
+    return [m for m in load_migrations() if m.REVISION not in applied]
+
+
+async def upgrade() -> List[str]:
+    """执行全部待执行迁移，返回本次执行的版本号"""
+    async with engine.connect() as conn:
+        return await conn.run_sync(_upgrade)
+
+
+async def pending_migrations() -> List[ModuleType]:
+    """返回尚未执行的迁移"""
+    async with engine.connect() as conn:
+        return await conn.run_sync(_pending)
+
+
+async def main(argv: List[str]):
+    command = argv[0] if argv else "upgrade"
+    try:
+        if command == "upgrade":
+            executed = await upgrade()
+            if executed:
+                print(f"✅ 已执行迁移: {', '.join(executed)}")
+            else:
+                print("ℹ️  数据库结构已是最新")
+        elif command == "status":
+            pending = await pending_migrations()
+            if not pending:
+                print("✅ 没有待执行的迁移")
+            for module in pending:
+                print(f"   待执行 {module.REVISION}: {module.DESCRIPTION}")
+        else:
+            print(f"未知命令: {command}（可用: upgrade / status）")
+            sys.exit(2)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1:]))
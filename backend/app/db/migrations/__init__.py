@@ -0,0 +1 @@
+# 数据库迁移脚本（由 app.db.migrate 按 REVISION 顺序执行）
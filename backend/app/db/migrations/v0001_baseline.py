@@ -0,0 +1,27 @@
+"""
+基线迁移：创建初始业务表
+
+对已通过 Base.metadata.create_all 建表的旧库，表已存在时直接跳过。
+"""
+from sqlalchemy.engine import Connection
+
+from app.db.database import Base
+import app.models  # noqa: F401  注册全部模型
+
+REVISION = "0001"
+DESCRIPTION = "基线表结构"
+
+BASELINE_TABLES = [
+    "users",
+    "devices",
+    "delivery_orders",
+    "wallet_records",
+    "withdraw_records",
+    "admins",
+    "device_camera_images",
+]
+
+
+def upgrade(conn: Connection):
+    tables = [Base.metadata.tables[name] for name in BASELINE_TABLES]
+    Base.metadata.create_all(conn, tables=tables, checkfirst=True)
@@ -0,0 +1,30 @@
+"""
+热点查询复合索引
+
+- delivery_orders(user_id, created_at): 用户订单列表（按时间倒序分页）
+- delivery_orders(device_id, created_at): 设备订单统计、每日订单图表
+- wallet_records(user_id, created_at): 钱包交易记录分页
+- device_camera_images(device_id, batch_id, created_at): 摄像头图片按批次分组
+"""
+from sqlalchemy.engine import Connection
+
+from app.db.migrate import create_index_if_missing
+from app.models.order import DeliveryOrder
+from app.models.wallet import WalletRecord
+from app.models.device_camera import DeviceCameraImage
+
+REVISION = "0002"
+DESCRIPTION = "热点查询复合索引"
+
+INDEXES = [
+    (DeliveryOrder, "ix_delivery_orders_user_created"),
+    (DeliveryOrder, "ix_delivery_orders_device_created"),
+    (WalletRecord, "ix_wallet_records_user_created"),
+    (DeviceCameraImage, "ix_device_camera_images_device_batch_created"),
+]
+
+
+def upgrade(conn: Connection):
+    for model, index_name in INDEXES:
+        index = next(i for i in model.__table__.indexes if i.name == index_name)
+        create_index_if_missing(conn, index)
@@ -0,0 +1,38 @@
+"""
+钱包账本表，并为已有用户写入期初余额分录
+
+期初分录: 平台期初科目 → 用户可用/冻结，使账本余额与上线前的 User.balance 一致。
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.db.migrate import create_table_if_missing
+from app.models.ledger import LedgerEntry, LedgerBalanceSnapshot
+
+REVISION = "0003"
+DESCRIPTION = "钱包复式账本与余额快照"
+
+OPENING_LEGS = [
+    # (科目, 金额表达式)
+    ("user_available", "ROUND((balance - COALESCE(frozen_balance, 0)) * 100)"),
+    ("platform_opening", "-ROUND((balance - COALESCE(frozen_balance, 0)) * 100)"),
+    ("user_frozen", "ROUND(COALESCE(frozen_balance, 0) * 100)"),
+    ("platform_opening", "-ROUND(COALESCE(frozen_balance, 0) * 100)"),
+]
+
+
+def upgrade(conn: Connection):
+    create_table_if_missing(conn, LedgerEntry.__table__)
+    create_table_if_missing(conn, LedgerBalanceSnapshot.__table__)
+
+    has_entries = conn.execute(text("SELECT 1 FROM wallet_ledger_entries LIMIT 1")).first()
+    if has_entries:
+        return
+
+    for account, amount_expr in OPENING_LEGS:
+        conn.execute(text(
+            "INSERT INTO wallet_ledger_entries "
+            "(txn_id, txn_type, user_id, account, amount_cents, ref_id) "
+            f"SELECT CONCAT('OPEN', user_id), 'opening', user_id, '{account}', {amount_expr}, NULL "
+            f"FROM users WHERE {amount_expr} <> 0"
+        ))
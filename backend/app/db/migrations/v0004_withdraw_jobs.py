@@ -0,0 +1,25 @@
+"""
+提现记录增加任务调度字段，作为后台转账任务表
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.db.migrate import add_column_if_missing, create_index_if_missing
+from app.models.withdraw import WithdrawRecord
+
+REVISION = "0004"
+DESCRIPTION = "提现异步转账任务字段"
+
+
+def upgrade(conn: Connection):
+    table = WithdrawRecord.__table__
+    add_column_if_missing(conn, "withdraw_records", table.c.attempts)
+    add_column_if_missing(conn, "withdraw_records", table.c.next_attempt_at)
+    index = next(i for i in table.indexes if i.name == "ix_withdraw_records_status_next_attempt")
+    create_index_if_missing(conn, index)
+
+    # 遗留的待处理记录交给 worker 接管（同一 out_batch_no 重复提交在微信侧幂等）
+    conn.execute(text(
+        "UPDATE withdraw_records SET next_attempt_at = created_at "
+        "WHERE status = 'pending' AND next_attempt_at IS NULL"
+    ))
@@ -0,0 +1,24 @@
+"""
+提现记录增加商户批次单号，支持多条提现合并为一个转账批次
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.db.migrate import add_column_if_missing, create_index_if_missing
+from app.models.withdraw import WithdrawRecord
+
+REVISION = "0005"
+DESCRIPTION = "提现批量转账批次单号"
+
+
+def upgrade(conn: Connection):
+    table = WithdrawRecord.__table__
+    add_column_if_missing(conn, "withdraw_records", table.c.out_batch_no)
+    index = next(i for i in table.indexes if i.name == "ix_withdraw_records_out_batch_no")
+    create_index_if_missing(conn, index)
+
+    # 历史记录都是单笔批次：商户批次单号即提现ID（明细单号为 提现ID + "D001"）。
+    # 待处理记录可能已经提交过，一并回填，重试时沿用原批次单号，微信侧幂等
+    conn.execute(text(
+        "UPDATE withdraw_records SET out_batch_no = withdraw_id WHERE out_batch_no IS NULL"
+    ))
@@ -0,0 +1,15 @@
+"""
+提现记录增加 (status, updated_at) 索引，供对账任务扫描滞留记录
+"""
+from sqlalchemy.engine import Connection
+
+from app.db.migrate import create_index_if_missing
+from app.models.withdraw import WithdrawRecord
+
+REVISION = "0006"
+DESCRIPTION = "提现对账扫描索引"
+
+
+def upgrade(conn: Connection):
+    index = next(i for i in WithdrawRecord.__table__.indexes if i.name == "ix_withdraw_records_status_updated")
+    create_index_if_missing(conn, index)
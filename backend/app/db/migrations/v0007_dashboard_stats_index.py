@@ -0,0 +1,17 @@
+"""
+订单表增加工作台统计覆盖索引 (created_at, user_id, weight, amount)
+
+工作台按日聚合订单数、重量、金额和活跃用户，只需扫描索引中的时间范围。
+"""
+from sqlalchemy.engine import Connection
+
+from app.db.migrate import create_index_if_missing
+from app.models.order import DeliveryOrder
+
+REVISION = "0007"
+DESCRIPTION = "工作台统计覆盖索引"
+
+
+def upgrade(conn: Connection):
+    index = next(i for i in DeliveryOrder.__table__.indexes if i.name == "ix_delivery_orders_created_stats")
+    create_index_if_missing(conn, index)
@@ -0,0 +1,17 @@
+"""
+订单按日汇总表（设备+日、全局+日）
+
+只建表，历史数据用 python scripts/backfill_order_stats.py 分块回填。
+"""
+from sqlalchemy.engine import Connection
+
+from app.db.migrate import create_table_if_missing
+from app.models.order_stats import OrderDailyDeviceStat, OrderDailyStat
+
+REVISION = "0008"
+DESCRIPTION = "订单按日汇总表"
+
+
+def upgrade(conn: Connection):
+    create_table_if_missing(conn, OrderDailyDeviceStat.__table__)
+    create_table_if_missing(conn, OrderDailyStat.__table__)
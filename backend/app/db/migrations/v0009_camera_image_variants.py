@@ -0,0 +1,21 @@
+"""
+摄像头图片衍生图（缩略图、存档图）及处理队列字段
+
+历史图片的 variant_status 由列默认值置为 pending，worker 会逐步补齐衍生图。
+"""
+from sqlalchemy.engine import Connection
+
+from app.db.migrate import add_column_if_missing, create_index_if_missing, create_table_if_missing
+from app.models.device_camera import DeviceCameraImage, DeviceCameraImageVariant
+
+REVISION = "0009"
+DESCRIPTION = "摄像头图片衍生图"
+
+
+def upgrade(conn: Connection):
+    table = DeviceCameraImage.__table__
+    for name in ("variant_status", "variant_attempts", "variant_next_attempt_at"):
+        add_column_if_missing(conn, "device_camera_images", table.c[name])
+    index = next(i for i in table.indexes if i.name == "ix_device_camera_images_variant_status_next")
+    create_index_if_missing(conn, index)
+    create_table_if_missing(conn, DeviceCameraImageVariant.__table__)
@@ -0,0 +1,27 @@
+"""
+摄像头图片保留策略：告警批次标记、归档时间及扫描索引
+
+历史图片上报时的烟感状态没有记录，保守起见，当前处于烟感告警的设备的历史图片全部标记为告警批次。
+"""
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from app.db.migrate import add_column_if_missing, create_index_if_missing
+from app.models.device_camera import DeviceCameraImage
+
+REVISION = "0010"
+DESCRIPTION = "摄像头图片保留策略"
+
+
+def upgrade(conn: Connection):
+    table = DeviceCameraImage.__table__
+    added = add_column_if_missing(conn, "device_camera_images", table.c.is_alarm)
+    add_column_if_missing(conn, "device_camera_images", table.c.compacted_at)
+    index = next(i for i in table.indexes if i.name == "ix_device_camera_images_retention")
+    create_index_if_missing(conn, index)
+
+    if added:
+        conn.execute(text(
+            "UPDATE device_camera_images SET is_alarm = 1 "
+            "WHERE device_id IN (SELECT device_id FROM devices WHERE smoke_sensor_status = 1)"
+        ))
@@ -0,0 +1,19 @@
+"""
+设备表增加 FULLTEXT(name, address) WITH PARSER ngram 索引
+
+供 DEVICE_SEARCH_BACKEND=fulltext 使用；默认的进程内索引不依赖此索引。
+"""
+from sqlalchemy.engine import Connection
+
+from app.db.migrate import create_index_if_missing
+from app.models.device import Device
+
+REVISION = "0011"
+DESCRIPTION = "设备搜索全文索引"
+
+
+def upgrade(conn: Connection):
+    if conn.dialect.name != "mysql":
+        return
+    index = next(i for i in Device.__table__.indexes if i.name == "ft_devices_name_address")
+    create_index_if_missing(conn, index)
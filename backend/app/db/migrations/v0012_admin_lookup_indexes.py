@@ -0,0 +1,21 @@
+"""
+用户表增加逆序手机号生成列及手机号索引
+
+phone_reversed = REVERSE(phone) 为 STORED 生成列，由数据库维护；
+后台按尾号查找转为 phone_reversed 的前缀查找，可以走索引。
+"""
+from sqlalchemy.engine import Connection
+
+from app.db.migrate import add_column_if_missing, create_index_if_missing
+from app.models.user import User
+
+REVISION = "0012"
+DESCRIPTION = "后台列表查询索引"
+
+
+def upgrade(conn: Connection):
+    table = User.__table__
+    add_column_if_missing(conn, "users", table.c.phone_reversed)
+    for index in table.indexes:
+        if index.name in ("ix_users_phone", "ix_users_phone_reversed"):
+            create_index_if_missing(conn, index)
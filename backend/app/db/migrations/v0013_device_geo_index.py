@@ -0,0 +1,17 @@
+"""
+设备表增加 (latitude, longitude) 索引
+
+附近设备按外接矩形预筛选（DEVICE_GEO_BACKEND=sql）时使用。
+"""
+from sqlalchemy.engine import Connection
+
+from app.db.migrate import create_index_if_missing
+from app.models.device import Device
+
+REVISION = "0013"
+DESCRIPTION = "设备经纬度索引"
+
+
+def upgrade(conn: Connection):
+    index = next(i for i in Device.__table__.indexes if i.name == "ix_devices_lat_lng")
+    create_index_if_missing(conn, index)
@@ -0,0 +1,16 @@
+"""
+设备满仓预测表
+
+只建表，数据由 fill_forecast 任务（或 python scripts/fill_forecast.py）生成。
+"""
+from sqlalchemy.engine import Connection
+
+from app.db.migrate import create_table_if_missing
+from app.models.fill_forecast import DeviceFillForecast
+
+REVISION = "0014"
+DESCRIPTION = "设备满仓预测表"
+
+
+def upgrade(conn: Connection):
+    create_table_if_missing(conn, DeviceFillForecast.__table__)
@@ -0,0 +1,212 @@
+"""
+数据库连接池大小与运行指标
+
+大小：配置 DATABASE_CONNECTION_BUDGET（所有 worker 合计的连接上限）后，按 worker 数
+（DATABASE_WORKERS，未配置时读取 uvicorn/gunicorn 的 WEB_CONCURRENCY）均分，每个 worker 一半
+常驻连接、一半溢出连接；未配置预算时使用 DATABASE_POOL_SIZE / DATABASE_MAX_OVERFLOW。
+每个从库单独建池，大小与主库相同。后台任务的单进程锁使用池外的独立连接（app.db.locks），
+预算需要为持有锁的进程预留这几条连接。
+
+指标（每个引擎一份，/admin/system/metrics 的 db_pool）：
+    checked_out / overflow / idle   当前借出、溢出、空闲连接数，以及借出峰值
+    wait                            取连接的等待时间直方图（连接池耗尽时等待变长，超时前就能看到）
+    endpoints                       按接口统计连接占用时长（借出到归还），后台任务记为 background
+"""
+import os
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from loguru import logger
+
+from app.config import settings
+
+# 等待时间直方图的桶上限(ms)
+WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+# 慢等待日志的最小间隔(秒)
+_SLOW_WAIT_LOG_INTERVAL = 60.0
+
+# 当前请求的 ASGI scope（路由匹配后 scope["route"] 为 FastAPI 路由）
+_request_scope: ContextVar[Optional[dict]] = ContextVar("db_pool_request_scope", default=None)
+
+
+def pool_sizing() -> Tuple[int, int]:
+    """每个 worker 的 (pool_size, max_overflow)"""
+    budget = settings.DATABASE_CONNECTION_BUDGET
+    if budget <= 0:
+        return settings.DATABASE_POOL_SIZE, settings.DATABASE_MAX_OVERFLOW
+    workers = settings.DATABASE_WORKERS or int(os.environ.get("WEB_CONCURRENCY") or 1)
+    per_worker = max(2, budget // max(workers, 1))
+    pool_size = max(1, per_worker // 2)
+    return pool_size, per_worker - pool_size
+
+
+def current_endpoint() -> str:
+    """当前连接归属的接口，如 "GET /api/v1/device/nearby" """
+    scope = _request_scope.get()
+    if scope is None:
+        return "background"
+    route = scope.get("route")
+    path = getattr(route, "path", None) or "unmatched"
+    return f"{scope.get('method', 'WS')} {path}"
+
+
+class PoolEndpointMiddleware:
+    """记录当前请求的 scope，供连接借出时归属到接口（纯 ASGI 中间件，不影响流式响应）"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        token = _request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_scope.reset(token)
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """记录取连接等待时间的连接池"""
+
+    metrics: Optional["PoolMetrics"] = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            if self.metrics is not None:
+                self.metrics.timeouts += 1
+            raise
+        finally:
+            if self.metrics is not None:
+                self.metrics.record_wait(time.perf_counter() - started)
+
+    def recreate(self):
+        # engine.dispose() 会重建连接池，沿用同一份指标
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+class PoolMetrics:
+    """一个引擎的连接池指标"""
+
+    def __init__(self, name: str, engine: AsyncEngine, slow_wait_ms: float):
+        self.name = name
+        self.engine = engine
+        self.slow_wait_ms = slow_wait_ms
+        self.checkouts = 0
+        self.timeouts = 0
+        self.peak_checked_out = 0
+        self.wait_buckets: List[int] = [0] * (len(WAIT_BUCKETS_MS) + 1)
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+        self.slow_waits = 0
+        self._last_slow_log = 0.0
+        # 接口 → [次数, 总占用 ms, 最长占用 ms]
+        self.endpoints: Dict[str, List[float]] = {}
+
+        pool = engine.sync_engine.pool
+        if isinstance(pool, InstrumentedQueuePool):
+            pool.metrics = self
+        event.listen(engine.sync_engine, "checkout", self._on_checkout)
+        event.listen(engine.sync_engine, "checkin", self._on_checkin)
+
+    def record_wait(self, seconds: float) -> None:
+        waited = seconds * 1000
+        index = next((i for i, bound in enumerate(WAIT_BUCKETS_MS) if waited <= bound), len(WAIT_BUCKETS_MS))
+        self.wait_buckets[index] += 1
+        self.wait_total_ms += waited
+        self.wait_max_ms = max(self.wait_max_ms, waited)
+        if waited >= self.slow_wait_ms:
+            self.slow_waits += 1
+            now = time.monotonic()
+            if now - self._last_slow_log >= _SLOW_WAIT_LOG_INTERVAL:
+                self._last_slow_log = now
+                pool = self.engine.sync_engine.pool
+                logger.warning(
+                    f"数据库连接池等待 {waited:.0f}ms ({self.name}: 借出 {pool.checkedout()}, "
+                    f"溢出 {pool.overflow()}, 接口 {current_endpoint()})"
+                )
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy) -> None:
+        connection_record.info["checkout_at"] = time.perf_counter()
+        connection_record.info["endpoint"] = current_endpoint()
+        self.checkouts += 1
+        self.peak_checked_out = max(self.peak_checked_out, self.engine.sync_engine.pool.checkedout())
+
+    def _on_checkin(self, dbapi_connection, connection_record) -> None:
+        started = connection_record.info.pop("checkout_at", None)
+        endpoint = connection_record.info.pop("endpoint", "background")
+        if started is None:
+            return
+        held = (time.perf_counter() - started) * 1000
+        item = self.endpoints.get(endpoint)
+        if item is None:
+            item = self.endpoints[endpoint] = [0, 0.0, 0.0]
+        item[0] += 1
+        item[1] += held
+        item[2] = max(item[2], held)
+
+    def stats(self, top: int = 20) -> dict:
+        pool = self.engine.sync_engine.pool
+        waits = sum(self.wait_buckets)
+        labels = [f"le_{bound}ms" for bound in WAIT_BUCKETS_MS] + [f"gt_{WAIT_BUCKETS_MS[-1]}ms"]
+        busiest = sorted(self.endpoints.items(), key=lambda entry: entry[1][1], reverse=True)[:top]
+        return {
+            "pool_size": pool.size(),
+            "max_overflow": getattr(pool, "_max_overflow", None),
+            "checked_out": pool.checkedout(),
+            "overflow": max(pool.overflow(), 0),
+            "idle": pool.checkedin(),
+            "peak_checked_out": self.peak_checked_out,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait": {
+                "count": waits,
+                "avg_ms": round(self.wait_total_ms / waits, 2) if waits else None,
+                "max_ms": round(self.wait_max_ms, 1),
+                "slow": self.slow_waits,
+                "histogram": dict(zip(labels, self.wait_buckets)),
+            },
+            "endpoints": {
+                endpoint: {
+                    "checkouts": int(count),
+                    "avg_ms": round(total / count, 2),
+                    "max_ms": round(longest, 1),
+                    "total_ms": round(total, 1),
+                }
+                for endpoint, (count, total, longest) in busiest
+            },
+        }
+
+
+class PoolMonitor:
+    """所有引擎的连接池指标"""
+
+    def __init__(self):
+        self._pools: Dict[str, PoolMetrics] = {}
+
+    def attach(self, name: str, engine: AsyncEngine) -> None:
+        self._pools[name] = PoolMetrics(name, engine, settings.DATABASE_POOL_SLOW_WAIT_MS)
+
+    def stats(self) -> dict:
+        pool_size, max_overflow = pool_sizing()
+        return {
+            "budget": settings.DATABASE_CONNECTION_BUDGET or None,
+            "per_worker": {"pool_size": pool_size, "max_overflow": max_overflow},
+            "pools": {name: metrics.stats() for name, metrics in self._pools.items()},
+        }
+
+
+# 全局实例
+pool_monitor = PoolMonitor()
@@ -0,0 +1,176 @@
+"""
+只读从库路由
+
+配置 DATABASE_REPLICA_URLS 后，只读会话（get_read_db / read_session）在健康的从库之间轮询，
+没有可用从库时回到主库：
+
+    健康检查  每 DATABASE_REPLICA_CHECK_SECONDS 对每个从库执行 SHOW REPLICA STATUS，
+              连接失败、复制中断（Seconds_Behind_Source 为 NULL）或延迟超过
+              DATABASE_REPLICA_MAX_LAG_SECONDS 的从库暂停使用，恢复后自动加入
+    读己之写  get_db 提交了写入的客户端（按 Authorization 头，未登录按 IP）记录写入时间；
+              该客户端之后的只读请求只路由到 "距写入的时间 > 从库延迟 + 1 秒 + 距上次检查的时间" 的从库，
+              否则读主库，保证能读到自己刚写入的数据。写入时间只记录在当前进程，
+              多进程部署时落到其他进程的请求不受保护，对一致性要求高的接口应继续使用 get_db
+"""
+import asyncio
+import itertools
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from loguru import logger
+
+
+class ReplicaNode:
+    """一个从库及其健康状态"""
+
+    def __init__(self, engine: AsyncEngine):
+        self.engine = engine
+        # 只读会话默认 autocommit：每条语句一个快照，不需要提交
+        self.autocommit_engine = engine.execution_options(isolation_level="AUTOCOMMIT")
+        self.name = engine.url.render_as_string(hide_password=True)
+        self.healthy = False
+        self.lag: Optional[float] = None
+        self.checked_at = 0.0
+        self.error: Optional[str] = None
+        self.reads = 0
+        self.failures = 0
+
+    def stats(self) -> dict:
+        return {
+            "url": self.name,
+            "healthy": self.healthy,
+            "lag_seconds": self.lag,
+            "error": self.error,
+            "reads": self.reads,
+            "failures": self.failures,
+        }
+
+
+class ReplicaRouter:
+    """主从读写路由"""
+
+    def __init__(
+        self,
+        primary: AsyncEngine,
+        replicas: List[AsyncEngine],
+        max_lag: float,
+        check_interval: float,
+    ):
+        self.primary = primary
+        self.primary_autocommit = primary.execution_options(isolation_level="AUTOCOMMIT")
+        self.nodes = [ReplicaNode(replica) for replica in replicas]
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        # 客户端 → 最近一次写入提交时间（monotonic）
+        self._writes: Dict[str, float] = {}
+        self._counter = itertools.count()
+        self._task: Optional[asyncio.Task] = None
+        self.metrics = {"replica_reads": 0, "primary_reads": 0, "read_your_writes": 0}
+
+    async def start(self) -> None:
+        if self.nodes and self._task is None:
+            await self.check()
+            self._task = asyncio.create_task(self._run())
+            logger.info(
+                f"只读从库路由已启动 (从库: {len(self.nodes)} 个, 最大延迟: {self.max_lag}秒, "
+                f"检查间隔: {self.check_interval}秒)"
+            )
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def dispose(self) -> None:
+        for node in self.nodes:
+            await node.engine.dispose()
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None,
+            "replicas": [node.stats() for node in self.nodes],
+            "tracked_writers": len(self._writes),
+            **self.metrics,
+        }
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                await self.check()
+            except Exception as e:
+                logger.error(f"从库健康检查异常: {e}", exc_info=True)
+
+    # ---------- 健康检查 ----------
+
+    async def check(self) -> None:
+        """检查所有从库，并清理已不影响路由的写入记录"""
+        await asyncio.gather(*(self._check_node(node) for node in self.nodes))
+        horizon = time.monotonic() - self.max_lag - self.check_interval - 1.0
+        for key in [key for key, written_at in self._writes.items() if written_at < horizon]:
+            self._writes.pop(key, None)
+
+    async def _check_node(self, node: ReplicaNode) -> None:
+        was_healthy = node.healthy
+        try:
+            node.lag = await asyncio.wait_for(self._replica_lag(node.engine), timeout=self.check_interval)
+            if node.lag is None:
+                node.healthy, node.error = False, "复制未运行"
+            elif node.lag > self.max_lag:
+                node.healthy, node.error = False, f"延迟 {node.lag:.0f} 秒"
+            else:
+                node.healthy, node.error = True, None
+        except Exception as e:
+            node.healthy, node.lag, node.error = False, None, str(e) or type(e).__name__
+        node.checked_at = time.monotonic()
+        if not node.healthy:
+            node.failures += 1
+        if was_healthy != node.healthy:
+            if node.healthy:
+                logger.info(f"从库已恢复: {node.name}")
+            else:
+                logger.warning(f"从库暂停使用: {node.name} ({node.error})")
+
+    @staticmethod
+    async def _replica_lag(engine: AsyncEngine) -> Optional[float]:
+        """从库延迟(秒)，复制中断时为 None，未配置复制（指向主库）时为 0"""
+        async with engine.connect() as conn:
+            row = (await conn.execute(text("SHOW REPLICA STATUS"))).mappings().first()
+        if row is None:
+            return 0.0
+        lag = row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+        return None if lag is None else float(lag)
+
+    # ---------- 路由 ----------
+
+    def record_write(self, client: Optional[str]) -> None:
+        """记录客户端提交了写入"""
+        if client and self.nodes:
+            self._writes[client] = time.monotonic()
+
+    def choose(self, client: Optional[str] = None, autocommit: bool = True) -> AsyncEngine:
+        """选择只读会话使用的引擎"""
+        candidates = [node for node in self.nodes if node.healthy]
+        if candidates and client:
+            written_at = self._writes.get(client)
+            if written_at is not None:
+                now = time.monotonic()
+                elapsed = now - written_at
+                # 检查之后延迟最多增长 (now - checked_at)
+                fresh = [node for node in candidates if elapsed > node.lag + 1.0 + (now - node.checked_at)]
+                if len(fresh) < len(candidates):
+                    self.metrics["read_your_writes"] += 1
+                candidates = fresh
+        if not candidates:
+            self.metrics["primary_reads"] += 1
+            return self.primary_autocommit if autocommit else self.primary
+        node = candidates[next(self._counter) % len(candidates)]
+        node.reads += 1
+        self.metrics["replica_reads"] += 1
+        return node.autocommit_engine if autocommit else node.engine
@@ -9,17 +9,59 @@ from contextlib import asynccontextmanager
 
 from app.config import settings
 from app.api.v1 import router as api_router
-from app.db.database import init_db, close_db
+from app.db.database import close_db, replica_router
+from app.db.pool import PoolEndpointMiddleware
+from app.services.camera_retention import camera_retention_job
+from app.services.device_clusters import device_cluster_index
+from app.services.device_geo_index import device_geo_index
+from app.services.device_search import device_search_index
+from app.services.fill_forecast import fill_forecast_job
+from app.services.fleet_state import fleet_state
+from app.services.image_variant_service import image_variant_worker
+from app.services.password_service import password_hasher
+from app.services.wechat_pay import wechat_pay_service
+from app.services.wechat_pay_certs import platform_cert_store
+from app.services.withdraw_service import withdraw_worker
+from app.services.withdraw_reconciler import withdraw_reconciler
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """应用生命周期管理"""
-    # 启动时
-    await init_db()
+    # 启动时（表结构由部署阶段的 python -m app.db.migrate 维护，启动时不执行 DDL）
+    await replica_router.start()
+    await fleet_state.start()
+    await device_search_index.start()
+    await device_geo_index.start()
+    await device_cluster_index.start()
+    if settings.IMAGE_VARIANT_WORKER_ENABLED:
+        await image_variant_worker.start()
+    if settings.CAMERA_RETENTION_ENABLED:
+        await camera_retention_job.start()
+    if settings.FILL_FORECAST_ENABLED:
+        await fill_forecast_job.start()
+    if wechat_pay_service.is_available():
+        # 平台证书常驻内存并后台刷新，回调验签不再临时下载证书
+        await platform_cert_store.start()
+        if settings.WITHDRAW_WORKER_ENABLED:
+            await withdraw_worker.start()
+        if settings.WITHDRAW_RECONCILE_ENABLED:
+            await withdraw_reconciler.start()
     print(f"🚀 {settings.APP_NAME} 后端服务已启动")
     yield
     # 关闭时
+    await withdraw_reconciler.stop()
+    await withdraw_worker.stop()
+    await platform_cert_store.stop()
+    await fleet_state.stop()
+    await device_search_index.stop()
+    await device_geo_index.stop()
+    await device_cluster_index.stop()
+    await image_variant_worker.stop()
+    await camera_retention_job.stop()
+    await fill_forecast_job.stop()
+    await wechat_pay_service.close()
+    password_hasher.shutdown()
     await close_db()
     print("👋 服务已关闭")
 
@@ -43,6 +85,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 数据库连接池指标按接口统计连接占用时长
+app.add_middleware(PoolEndpointMiddleware)
+
 # 注册路由
 app.include_router(api_router, prefix="/api/v1")
 
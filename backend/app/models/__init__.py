@@ -4,4 +4,7 @@ from app.models.order import DeliveryOrder
 from app.models.wallet import WalletRecord
 from app.models.withdraw import WithdrawRecord, WithdrawStatus
 from app.models.admin import Admin
-
+from app.models.device_camera import DeviceCameraImage, DeviceCameraImageVariant
+from app.models.ledger import LedgerEntry, LedgerBalanceSnapshot
+from app.models.order_stats import OrderDailyDeviceStat, OrderDailyStat
+from app.models.fill_forecast import DeviceFillForecast
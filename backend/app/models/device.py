@@ -1,7 +1,7 @@
 """
 设备模型 - 按照《4G设备-后台通信协议》扩展
 """
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Text, Index
 from sqlalchemy.sql import func
 from app.db.database import Base
 
@@ -9,6 +9,12 @@ from app.db.database import Base
 class Device(Base):
     """设备表"""
     __tablename__ = "devices"
+    __table_args__ = (
+        # 设备搜索（DEVICE_SEARCH_BACKEND=fulltext）: MATCH(name, address) AGAINST(...)，ngram 分词支持中文
+        Index("ft_devices_name_address", "name", "address", mysql_prefix="FULLTEXT", mysql_with_parser="ngram"),
+        # 附近设备外接矩形预筛选（DEVICE_GEO_BACKEND=sql）: WHERE latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?
+        Index("ix_devices_lat_lng", "latitude", "longitude"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     device_id = Column(String(32), unique=True, nullable=False, index=True, comment="设备ID，如DEV_202601300001")
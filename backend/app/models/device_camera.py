@@ -4,15 +4,43 @@
 存储设备上报的摄像头图片数据。
 - camera_1: 回收箱内部摄像头（拍摄回收物品）
 - camera_2: 外部摄像头（拍摄用户）
+
+原图上报后由图片处理 worker 异步生成衍生图（缩略图、重新压缩的存档图），
+存放在 device_camera_image_variants。
 """
-from sqlalchemy import Column, Integer, String, DateTime, Text
+import enum
+
+from sqlalchemy import Column, Integer, String, DateTime, Text, Index, LargeBinary
+from sqlalchemy.dialects.mysql import MEDIUMBLOB
 from sqlalchemy.sql import func
 from app.db.database import Base
 
 
+class ImageVariantStatus(enum.Enum):
+    """衍生图处理状态"""
+    PENDING = "pending"  # 待处理（含等待重试）
+    PROCESSING = "processing"  # 处理中（next_attempt_at 为租约到期时间）
+    DONE = "done"  # 已生成
+    FAILED = "failed"  # 重试次数用尽
+
+
+class ImageVariant(enum.Enum):
+    """衍生图类型"""
+    THUMBNAIL = "thumb"  # 列表缩略图
+    ARCHIVE = "archive"  # 重新压缩的存档图（查看大图时使用）
+
+
 class DeviceCameraImage(Base):
     """设备摄像头图片表"""
     __tablename__ = "device_camera_images"
+    __table_args__ = (
+        # 按批次分组的图片历史: WHERE device_id=? GROUP BY batch_id ORDER BY MAX(created_at)
+        Index("ix_device_camera_images_device_batch_created", "device_id", "batch_id", "created_at"),
+        # 图片处理 worker 领取任务: WHERE variant_status='pending' AND variant_next_attempt_at <= now
+        Index("ix_device_camera_images_variant_status_next", "variant_status", "variant_next_attempt_at"),
+        # 保留策略扫描过期图片: WHERE camera_type=? AND is_alarm=0 AND compacted_at IS NULL AND created_at < ?
+        Index("ix_device_camera_images_retention", "camera_type", "is_alarm", "compacted_at", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     device_id = Column(String(32), nullable=False, index=True, comment="设备ID")
@@ -29,6 +57,35 @@ class DeviceCameraImage(Base):
     # 上报批次ID（同一次状态上报的所有图片共享一个batch_id）
     batch_id = Column(String(64), nullable=True, index=True, comment="上报批次ID")
     
+    # 上报时烟感告警的批次，保留策略不清理
+    is_alarm = Column(Integer, nullable=False, default=0, server_default="0", comment="告警批次: 0-否, 1-是(永久保留)")
+    
+    # 保留策略归档：原图已删除，只保留衍生图
+    compacted_at = Column(DateTime, nullable=True, comment="归档时间，非空表示原图已按保留策略处理")
+    
+    # 衍生图处理
+    variant_status = Column(
+        String(16), nullable=False,
+        default=ImageVariantStatus.PENDING.value, server_default=ImageVariantStatus.PENDING.value,
+        comment="衍生图状态: pending/processing/done/failed"
+    )
+    variant_attempts = Column(Integer, nullable=False, default=0, server_default="0", comment="衍生图处理次数")
+    variant_next_attempt_at = Column(DateTime, nullable=True, comment="下次可处理时间（处理中为租约到期时间）")
+    
     # 时间
     captured_at = Column(DateTime, server_default=func.now(), comment="拍摄时间")
     created_at = Column(DateTime, server_default=func.now(), comment="创建时间")
+
+
+class DeviceCameraImageVariant(Base):
+    """摄像头图片衍生图表（缩略图、存档图），每张原图每种类型一行"""
+    __tablename__ = "device_camera_image_variants"
+
+    image_id = Column(Integer, primary_key=True, comment="原图ID(device_camera_images.id)")
+    variant = Column(String(16), primary_key=True, comment="类型: thumb/archive")
+    media_type = Column(String(32), nullable=False, comment="Content-Type")
+    width = Column(Integer, nullable=False, comment="宽度(px)")
+    height = Column(Integer, nullable=False, comment="高度(px)")
+    size = Column(Integer, nullable=False, comment="字节数")
+    data = Column(LargeBinary().with_variant(MEDIUMBLOB(), "mysql"), nullable=False, comment="图片数据")
+    created_at = Column(DateTime, server_default=func.now(), comment="创建时间")
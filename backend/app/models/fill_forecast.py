@@ -0,0 +1,26 @@
+"""
+设备满仓预测模型
+
+由 fill_forecast 任务按设备每日投递重量批量回归后整表刷新，工作台和收运路线规划读取。
+"""
+from sqlalchemy import Column, Integer, String, Float, DateTime, Index
+from app.db.database import Base
+
+
+class DeviceFillForecast(Base):
+    """设备满仓预测表"""
+    __tablename__ = "device_fill_forecasts"
+    __table_args__ = (
+        # 即将满仓的设备: WHERE expected_full_at <= ?
+        Index("ix_device_fill_forecasts_expected_full", "expected_full_at"),
+    )
+
+    device_id = Column(String(32), primary_key=True, comment="设备ID")
+    fill_rate = Column(Float, nullable=False, default=0.0, comment="预计当前投递速度(kg/天)")
+    trend = Column(Float, nullable=False, default=0.0, comment="投递速度日变化(kg/天²)")
+    capacity_kg = Column(Float, nullable=False, comment="估算仓体容量(kg)")
+    remaining_kg = Column(Float, nullable=False, comment="估算剩余容量(kg)")
+    days_to_full = Column(Float, nullable=True, comment="预计满仓天数，0 表示已满，NULL 表示预测期内不会满")
+    expected_full_at = Column(DateTime, nullable=True, comment="预计满仓时间")
+    history_days = Column(Integer, nullable=False, default=0, comment="回归窗口内有投递的天数")
+    computed_at = Column(DateTime, nullable=False, comment="预测时间")
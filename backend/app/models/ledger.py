@@ -0,0 +1,48 @@
+"""
+钱包账本模型 - 复式记账（整数分）
+
+每笔资金变动是一笔交易（txn_id），由若干分录组成，同一交易的分录金额之和为0。
+用户账户分为可用(user_available)和冻结(user_frozen)两个科目：
+    User.balance        = 可用 + 冻结
+    User.frozen_balance = 冻结
+平台侧科目作为对手方，记录资金来源（回收收入）和去向（提现出款）。
+
+分录只追加不修改。余额快照定期记录某用户截至某条分录的余额，
+重建余额只需 快照 + 快照之后的分录。
+"""
+from sqlalchemy import Column, BigInteger, Integer, String, DateTime, Index
+from sqlalchemy.sql import func
+from app.db.database import Base
+
+
+class LedgerEntry(Base):
+    """账本分录表（只追加）"""
+    __tablename__ = "wallet_ledger_entries"
+    __table_args__ = (
+        # 余额重建: WHERE user_id=? AND id > 快照位置
+        Index("ix_wallet_ledger_entries_user_id_id", "user_id", "id"),
+    )
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    txn_id = Column(String(32), nullable=False, index=True, comment="交易ID(同一交易的分录共享)")
+    txn_type = Column(String(20), nullable=False, comment="交易类型: opening/income/freeze/unfreeze/withdraw")
+    user_id = Column(String(32), nullable=False, comment="用户ID")
+    account = Column(String(32), nullable=False, comment="科目: user_available/user_frozen/platform_*")
+    amount_cents = Column(BigInteger, nullable=False, comment="金额(分)，正数增加科目余额")
+    ref_id = Column(String(32), nullable=True, comment="关联业务单号(订单ID/提现ID)")
+    created_at = Column(DateTime, server_default=func.now(), comment="创建时间")
+
+
+class LedgerBalanceSnapshot(Base):
+    """用户余额快照表"""
+    __tablename__ = "wallet_balance_snapshots"
+    __table_args__ = (
+        Index("ix_wallet_balance_snapshots_user_entry", "user_id", "last_entry_id"),
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(String(32), nullable=False, comment="用户ID")
+    available_cents = Column(BigInteger, nullable=False, default=0, comment="可用余额(分)")
+    frozen_cents = Column(BigInteger, nullable=False, default=0, comment="冻结余额(分)")
+    last_entry_id = Column(BigInteger, nullable=False, comment="快照包含的最后一条分录ID")
+    created_at = Column(DateTime, server_default=func.now(), comment="创建时间")
@@ -1,7 +1,7 @@
 """
 订单模型
 """
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey, Index
 from sqlalchemy.sql import func
 from app.db.database import Base
 
@@ -9,6 +9,14 @@ from app.db.database import Base
 class DeliveryOrder(Base):
     """投递订单表"""
     __tablename__ = "delivery_orders"
+    __table_args__ = (
+        # 用户订单列表: WHERE user_id=? ORDER BY created_at DESC
+        Index("ix_delivery_orders_user_created", "user_id", "created_at"),
+        # 设备订单统计/每日图表: WHERE device_id=? AND created_at >= ?
+        Index("ix_delivery_orders_device_created", "device_id", "created_at"),
+        # 工作台按日聚合: WHERE created_at >= ? GROUP BY DATE(created_at)（覆盖索引，不回表）
+        Index("ix_delivery_orders_created_stats", "created_at", "user_id", "weight", "amount"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     order_id = Column(String(32), unique=True, nullable=False, index=True, comment="订单ID")
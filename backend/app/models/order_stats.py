@@ -0,0 +1,41 @@
+"""
+订单统计汇总模型
+
+按 设备+日 和 全局+日 预先汇总订单数、重量、金额，订单创建和领取时在同一事务内增量更新，
+管理后台的列表和图表直接读取汇总行，不再扫描 delivery_orders。
+日期按订单创建时间（created_at）归属，与原先按 created_at 统计的口径一致。
+"""
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Index
+from sqlalchemy.sql import func
+from app.db.database import Base
+
+
+class OrderDailyDeviceStat(Base):
+    """设备每日订单汇总表"""
+    __tablename__ = "order_daily_device_stats"
+    __table_args__ = (
+        # 全局按日查询各设备: WHERE stat_date BETWEEN ? AND ?
+        Index("ix_order_daily_device_stats_date", "stat_date"),
+    )
+
+    device_id = Column(String(32), primary_key=True, comment="设备ID")
+    stat_date = Column(Date, primary_key=True, comment="日期(订单创建日)")
+    order_count = Column(Integer, nullable=False, default=0, server_default="0", comment="订单数")
+    total_weight = Column(Float, nullable=False, default=0.0, server_default="0", comment="重量(kg)")
+    total_amount = Column(Float, nullable=False, default=0.0, server_default="0", comment="金额(元)")
+    claimed_count = Column(Integer, nullable=False, default=0, server_default="0", comment="已领取订单数")
+    claimed_amount = Column(Float, nullable=False, default=0.0, server_default="0", comment="已领取金额(元)")
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), comment="更新时间")
+
+
+class OrderDailyStat(Base):
+    """全局每日订单汇总表"""
+    __tablename__ = "order_daily_stats"
+
+    stat_date = Column(Date, primary_key=True, comment="日期(订单创建日)")
+    order_count = Column(Integer, nullable=False, default=0, server_default="0", comment="订单数")
+    total_weight = Column(Float, nullable=False, default=0.0, server_default="0", comment="重量(kg)")
+    total_amount = Column(Float, nullable=False, default=0.0, server_default="0", comment="金额(元)")
+    claimed_count = Column(Integer, nullable=False, default=0, server_default="0", comment="已领取订单数")
+    claimed_amount = Column(Float, nullable=False, default=0.0, server_default="0", comment="已领取金额(元)")
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), comment="更新时间")
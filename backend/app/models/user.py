@@ -1,7 +1,7 @@
 """
 用户模型
 """
-from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, Computed, Index
 from sqlalchemy.sql import func
 from app.db.database import Base
 
@@ -9,6 +9,12 @@ from app.db.database import Base
 class User(Base):
     """用户表"""
     __tablename__ = "users"
+    __table_args__ = (
+        # 后台按手机号精确/前缀查找: WHERE phone LIKE '138%'
+        Index("ix_users_phone", "phone"),
+        # 后台按手机尾号查找: WHERE phone_reversed LIKE '逆序尾号%'
+        Index("ix_users_phone_reversed", "phone_reversed"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(String(32), unique=True, nullable=False, index=True, comment="用户ID")
@@ -17,6 +23,9 @@ class User(Base):
     nickname = Column(String(64), nullable=True, comment="昵称")
     avatar_url = Column(String(500), nullable=True, comment="头像URL")
     phone = Column(String(20), nullable=True, comment="手机号")
+    phone_reversed = Column(
+        String(20), Computed("REVERSE(phone)", persisted=True), comment="逆序手机号（生成列，用于尾号查找）"
+    )
     
     # 实名认证
     real_name = Column(String(32), nullable=True, comment="真实姓名")
@@ -1,7 +1,7 @@
 """
 钱包记录模型
 """
-from sqlalchemy import Column, Integer, String, Float, DateTime
+from sqlalchemy import Column, Integer, String, Float, DateTime, Index
 from sqlalchemy.sql import func
 from app.db.database import Base
 
@@ -9,6 +9,10 @@ from app.db.database import Base
 class WalletRecord(Base):
     """钱包交易记录表"""
     __tablename__ = "wallet_records"
+    __table_args__ = (
+        # 交易记录分页: WHERE user_id=? ORDER BY created_at DESC
+        Index("ix_wallet_records_user_created", "user_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     record_id = Column(String(32), unique=True, nullable=False, index=True, comment="记录ID")
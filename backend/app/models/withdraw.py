@@ -1,7 +1,7 @@
 """
 提现记录模型
 """
-from sqlalchemy import Column, Integer, String, Float, DateTime, Enum
+from sqlalchemy import Column, Integer, String, Float, DateTime, Enum, Index
 from sqlalchemy.sql import func
 from app.db.database import Base
 import enum
@@ -17,8 +17,23 @@ class WithdrawStatus(enum.Enum):
 
 
 class WithdrawRecord(Base):
-    """提现记录表"""
+    """
+    提现记录表
+
+    同时作为转账任务表：后台 worker 按 (status, next_attempt_at) 领取
+    PENDING 记录发起转账，状态流转 PENDING → PROCESSING → SUCCESS/FAILED。
+    多条提现合并为一个微信转账批次（out_batch_no 相同），
+    每条提现是批次中的一条明细，商户明细单号即 withdraw_id。
+    只有微信明确拒绝或确认查无此批次时才置为 FAILED 并解冻；提交结果不明的记录
+    保持 PROCESSING，由对账任务确认（见 app.services.withdraw_service.transfer_outcome）。
+    """
     __tablename__ = "withdraw_records"
+    __table_args__ = (
+        # worker 领取任务: WHERE status='pending' AND next_attempt_at <= now
+        Index("ix_withdraw_records_status_next_attempt", "status", "next_attempt_at"),
+        # 对账任务扫描滞留记录: WHERE status IN ('pending','processing') AND updated_at < ?
+        Index("ix_withdraw_records_status_updated", "status", "updated_at"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     withdraw_id = Column(String(32), unique=True, nullable=False, index=True, comment="提现ID")
@@ -34,10 +49,15 @@ class WithdrawRecord(Base):
     status = Column(String(20), nullable=False, default=WithdrawStatus.PENDING.value, comment="提现状态")
     
     # 微信转账信息
+    out_batch_no = Column(String(32), nullable=True, index=True, comment="商户批次单号")
     wechat_batch_id = Column(String(64), nullable=True, comment="微信批次单号")
     wechat_detail_id = Column(String(64), nullable=True, comment="微信明细单号")
     wechat_openid = Column(String(64), nullable=True, comment="微信OpenID")
     
+    # 任务调度
+    attempts = Column(Integer, nullable=False, default=0, server_default="0", comment="转账尝试次数")
+    next_attempt_at = Column(DateTime, nullable=True, comment="下次可执行时间")
+    
     # 错误信息
     error_code = Column(String(32), nullable=True, comment="错误代码")
     error_message = Column(String(255), nullable=True, comment="错误信息")
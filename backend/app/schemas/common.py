@@ -25,4 +25,6 @@ class PaginatedResponse(BaseModel):
     page: int
     page_size: int
     pages: int
+    total_exact: bool = True  # False 表示总数超过统计上限，total 为下限
+    truncated: bool = False  # True 表示模糊查询只扫描了最近的记录或超出时间预算
 
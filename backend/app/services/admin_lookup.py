@@ -0,0 +1,176 @@
+"""
+管理后台列表查询
+
+订单、用户、设备列表原来按 LIKE '%值%' 筛选再 COUNT(*) 子查询统计总数，大表上两条都是全表扫描。
+这里按输入判断查询方式，尽量走索引：
+
+    值       ID：先按唯一索引精确查找，没有再按前缀（LIKE '值%'，索引范围扫描）
+             手机号：11 位按精确查找，否则按尾号（phone_reversed 前缀，索引范围扫描）
+    值*      前缀
+    *值      后缀（手机号走 phone_reversed，ID 走有界扫描）
+    *值*     包含（有界扫描）
+
+有界扫描只扫描最近 ADMIN_LOOKUP_SCAN_ROWS 行（主键范围），MySQL 上以 MAX_EXECUTION_TIME
+限制在 ADMIN_LOOKUP_TIME_BUDGET_MS 内，超时返回空结果并标记 truncated。
+总数最多统计到 ADMIN_LOOKUP_COUNT_CAP 条，超过时 total_exact=False。
+"""
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import select, func, and_
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession
+from loguru import logger
+
+from app.config import settings
+from app.db.database import engine
+
+# MySQL: 3024 超过 MAX_EXECUTION_TIME, 1317 查询被中断
+_TIMEOUT_ERRORS = (3024, 1317)
+
+
+class Lookup:
+    """一个列表的筛选条件"""
+
+    def __init__(self):
+        self.conditions: List[Any] = []
+        self.bounded = False
+        self.modes: List[str] = []
+
+    def where(self, condition, mode: Optional[str] = None, bounded: bool = False) -> "Lookup":
+        self.conditions.append(condition)
+        if mode:
+            self.modes.append(mode)
+        self.bounded = self.bounded or bounded
+        return self
+
+
+def parse_lookup(value: str, default: str = "prefix") -> Tuple[str, str]:
+    """
+    按 * 位置解析查询方式
+
+    Returns:
+        (查询方式, 去掉 * 的值)
+    """
+    value = value.strip()
+    starts, ends = value.startswith("*"), value.endswith("*")
+    term = value.strip("*")
+    if starts and ends:
+        return "contains", term
+    if starts:
+        return "suffix", term
+    if ends:
+        return "prefix", term
+    return default, term
+
+
+def escape_like(term: str) -> str:
+    """转义 LIKE 通配符"""
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+async def add_id_lookup(db: AsyncSession, lookup: Lookup, column, value: str) -> Lookup:
+    """
+    唯一ID列的查询条件
+
+    不带 * 时先精确查找（唯一索引点查），不存在再按前缀查找。
+    """
+    mode, term = parse_lookup(value, default="exact")
+    if not term:
+        return lookup
+    if mode == "exact":
+        found = (await db.execute(select(column).where(column == term).limit(1))).first()
+        if found:
+            return lookup.where(column == term, "exact")
+        mode = "prefix"
+    if mode == "prefix":
+        return lookup.where(column.like(f"{escape_like(term)}%", escape="\\"), "prefix")
+    if mode == "suffix":
+        return lookup.where(column.like(f"%{escape_like(term)}", escape="\\"), "suffix", bounded=True)
+    return lookup.where(column.like(f"%{escape_like(term)}%", escape="\\"), "contains", bounded=True)
+
+
+def add_phone_lookup(lookup: Lookup, column, reversed_column, value: str) -> Lookup:
+    """
+    手机号查询条件
+
+    不带 * 时 11 位按精确查找，否则按尾号查找；尾号通过 phone_reversed 列的前缀走索引。
+    """
+    mode, term = parse_lookup(value, default="suffix")
+    if not term:
+        return lookup
+    if mode == "suffix" and "*" not in value and len(term) >= 11:
+        mode = "exact"
+    if mode == "exact":
+        return lookup.where(column == term, "exact")
+    if mode == "prefix":
+        return lookup.where(column.like(f"{escape_like(term)}%", escape="\\"), "prefix")
+    if mode == "suffix":
+        return lookup.where(reversed_column.like(f"{escape_like(term[::-1])}%", escape="\\"), "suffix")
+    return lookup.where(column.like(f"%{escape_like(term)}%", escape="\\"), "contains", bounded=True)
+
+
+def _is_timeout(error: OperationalError) -> bool:
+    args = getattr(error.orig, "args", ())
+    return bool(args) and args[0] in _TIMEOUT_ERRORS
+
+
+async def paginate(
+    db: AsyncSession,
+    model,
+    lookup: Lookup,
+    order_by,
+    page: int,
+    page_size: int,
+) -> dict:
+    """
+    按筛选条件分页查询
+
+    Returns:
+        {"rows": 本页记录, "total": 总数, "total_exact": 总数是否精确, "truncated": 结果是否不完整}
+    """
+    conditions = list(lookup.conditions)
+    is_mysql = engine.dialect.name == "mysql"
+    truncated = False
+
+    if lookup.bounded:
+        # 只扫描最近的 ADMIN_LOOKUP_SCAN_ROWS 行
+        max_id = (await db.execute(select(func.max(model.id)))).scalar() or 0
+        floor = max_id - settings.ADMIN_LOOKUP_SCAN_ROWS
+        if floor > 0:
+            conditions.append(model.id > floor)
+            truncated = True
+
+    def bounded(query):
+        if lookup.bounded and is_mysql:
+            return query.prefix_with(f"/*+ MAX_EXECUTION_TIME({int(settings.ADMIN_LOOKUP_TIME_BUDGET_MS)}) */")
+        return query
+
+    where = and_(*conditions) if conditions else None
+    base = select(model.id)
+    if where is not None:
+        base = base.where(where)
+
+    cap = settings.ADMIN_LOOKUP_COUNT_CAP
+    try:
+        # 总数最多数到 cap + 1，避免大表全量 COUNT
+        total = (await db.execute(
+            bounded(select(func.count()).select_from(base.limit(cap + 1).subquery()))
+        )).scalar()
+        query = select(model)
+        if where is not None:
+            query = query.where(where)
+        query = bounded(query.order_by(order_by).offset((page - 1) * page_size).limit(page_size))
+        rows = (await db.execute(query)).scalars().all()
+    except OperationalError as e:
+        if not _is_timeout(e):
+            raise
+        logger.warning(f"后台列表查询超出时间预算: {model.__tablename__} {lookup.modes}")
+        return {"rows": [], "total": 0, "total_exact": False, "truncated": True}
+
+    total_exact = total <= cap
+    return {
+        "rows": rows,
+        "total": min(total, cap),
+        "total_exact": total_exact,
+        "truncated": truncated,
+    }
@@ -0,0 +1,110 @@
+"""
+摄像头图片服务
+
+图片以 Base64 存在 device_camera_images.image_data，列表接口只返回元数据和图片地址，
+浏览器通过 <img src> 单独加载每张图片。<img> 无法携带 Authorization 头，
+图片地址用 HMAC 签名代替登录校验：
+
+    /api/v1/admin/camera-images/{id}?exp=过期时间戳&sig=签名[&variant=thumb|archive]
+
+variant 指定衍生图（缩略图/存档图，由图片处理 worker 生成），尚未生成时返回原图。
+过期时间按 CAMERA_IMAGE_URL_TTL_SECONDS 对齐到时间窗口，同一窗口内同一张图片的地址不变，
+浏览器缓存可以命中；图片上报后不再修改，响应按不可变资源缓存。
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+import time
+from typing import Optional, Tuple
+
+from app.config import settings
+
+IMAGE_URL_PREFIX = "/api/v1/admin/camera-images"
+
+# 文件头 → Content-Type
+_MAGIC_TYPES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF8", "image/gif"),
+    (b"RIFF", "image/webp"),
+)
+
+
+def _signature(image_id: int, expires_at: int, variant: Optional[str]) -> str:
+    message = f"camera-image:{image_id}:{variant or ''}:{expires_at}".encode()
+    digest = hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:18]).decode()
+
+
+def sign_image_url(image_id: int, variant: Optional[str] = None, now: Optional[float] = None) -> str:
+    """生成图片签名地址，有效期在 TTL 到 2×TTL 之间"""
+    ttl = settings.CAMERA_IMAGE_URL_TTL_SECONDS
+    now = time.time() if now is None else now
+    expires_at = (int(now) // ttl + 2) * ttl
+    url = f"{IMAGE_URL_PREFIX}/{image_id}?exp={expires_at}&sig={_signature(image_id, expires_at, variant)}"
+    return f"{url}&variant={variant}" if variant else url
+
+
+def verify_image_signature(image_id: int, expires_at: int, sig: str, variant: Optional[str] = None) -> bool:
+    """校验图片地址签名及有效期"""
+    if expires_at < time.time():
+        return False
+    return hmac.compare_digest(_signature(image_id, expires_at, variant), sig)
+
+
+def image_etag(image_id: int, variant: Optional[str] = None) -> str:
+    """原图和衍生图生成后都不会变化，ETag 只取决于图片ID和类型"""
+    return f'"cam-{image_id}-{variant}"' if variant else f'"cam-{image_id}"'
+
+
+def decode_image(image_data: str) -> Tuple[bytes, str]:
+    """
+    Base64 图片数据解码为 (字节, Content-Type)
+
+    兼容带 data:image/xxx;base64, 前缀的数据，无法识别的类型按 PNG 返回（与管理后台原有处理一致）。
+
+    Raises:
+        ValueError: 不是有效的 Base64 数据
+    """
+    media_type = None
+    if image_data.startswith("data:"):
+        header, _, image_data = image_data.partition(",")
+        media_type = header[5:].split(";")[0] or None
+    try:
+        content = base64.b64decode(image_data)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"图片数据不是有效的Base64: {e}")
+    if media_type is None:
+        media_type = next((kind for magic, kind in _MAGIC_TYPES if content.startswith(magic)), "image/png")
+    return content, media_type
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    解析单段 Range 请求头，返回闭区间 (start, end)
+
+    没有 Range 或格式不支持（多段）时返回 None，按整个文件返回。
+
+    Raises:
+        ValueError: 范围不可满足（416）
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_text, _, end_text = header[6:].strip().partition("-")
+    try:
+        if start_text:
+            start = int(start_text)
+            end = int(end_text) if end_text else size - 1
+        else:
+            # bytes=-N：最后 N 个字节
+            length = int(end_text)
+            start, end = size - length, size - 1
+    except ValueError:
+        # 格式错误的 Range 按规范忽略
+        return None
+    if start < 0 and not start_text:
+        start = 0
+    if start < 0 or start >= size or start > end:
+        raise ValueError("范围不可满足")
+    return start, min(end, size - 1)
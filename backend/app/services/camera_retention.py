@@ -0,0 +1,282 @@
+"""
+摄像头图片保留策略任务
+
+device_camera_images 每次状态上报最多写入 6 张 Base64 图片，只增不减。本任务按摄像头类型
+的保留天数清理过期图片，上报时烟感告警的批次（is_alarm=1）永久保留：
+
+    delete   删除过期图片及其衍生图
+    archive  删除过期图片的原图数据，保留缩略图和存档图（后台仍可查看压缩后的图片）；
+             原图处理完衍生图之前不归档，存档图不比原图小时保留原图
+
+按 ix_device_camera_images_retention 索引每次取 CAMERA_RETENTION_CHUNK_SIZE 条，按主键删除/更新，
+每块一个短事务并暂停 CAMERA_RETENTION_CHUNK_SLEEP_SECONDS，只在 CAMERA_RETENTION_WINDOW 时段内执行，
+不会长时间锁表。多进程部署时通过 MySQL GET_LOCK 保证同一时间只有一个进程在执行，
+锁持有在连接池之外的独立连接上（见 app.db.locks），块间暂停时不占用连接池。
+
+回收字节数为删除的图片数据长度之和；InnoDB 释放的空间由后续写入复用，
+需要缩小表文件时在低峰期执行 OPTIMIZE TABLE。
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import select, update, delete, func, or_, and_
+from loguru import logger
+
+from app.config import settings
+from app.db.database import AsyncSessionLocal
+from app.db.locks import job_lock
+from app.models.device_camera import (
+    DeviceCameraImage,
+    DeviceCameraImageVariant,
+    ImageVariant,
+    ImageVariantStatus,
+)
+
+RETENTION_LOCK_NAME = "camera_retention"
+MODES = ("delete", "archive")
+
+
+def parse_window(window: str) -> Optional[Tuple[int, int]]:
+    """解析 "HH:MM-HH:MM" 时段为当天分钟数区间，留空返回 None（不限时段）"""
+    if not window:
+        return None
+    start_text, _, end_text = window.partition("-")
+
+    def minutes(value: str) -> int:
+        hour, _, minute = value.strip().partition(":")
+        return int(hour) * 60 + int(minute or 0)
+
+    return minutes(start_text), minutes(end_text)
+
+
+class CameraRetentionJob:
+    """摄像头图片保留策略任务"""
+
+    def __init__(
+        self,
+        ttl_days: Dict[int, int],
+        mode: str,
+        window: str,
+        interval: float,
+        chunk_size: int,
+        chunk_sleep: float,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"CAMERA_RETENTION_MODE 只能是 {MODES}")
+        self.ttl_days = ttl_days
+        self.mode = mode
+        self.window = parse_window(window)
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.chunk_sleep = chunk_sleep
+        self._task: Optional[asyncio.Task] = None
+        self.metrics = {
+            "runs": 0,
+            "last_run_at": None,
+            "last_duration_ms": None,
+            "last_result": None,
+            "images": 0,
+            "reclaimed_bytes": 0,
+        }
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(
+                f"摄像头图片保留策略已启动 (模式: {self.mode}, 保留天数: {self.ttl_days}, "
+                f"时段: {settings.CAMERA_RETENTION_WINDOW or '不限'})"
+            )
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {"running": self._task is not None, "mode": self.mode, "ttl_days": self.ttl_days, **self.metrics}
+
+    def in_window(self, now: Optional[datetime] = None) -> bool:
+        """当前是否在允许执行的时段内（支持跨零点，如 22:00-06:00）"""
+        if self.window is None:
+            return True
+        now = now or datetime.now()
+        current = now.hour * 60 + now.minute
+        start, end = self.window
+        return start <= current < end if start <= end else current >= start or current < end
+
+    async def _run(self) -> None:
+        while True:
+            if self.in_window():
+                try:
+                    await self.run_once()
+                except Exception as e:
+                    logger.error(f"摄像头图片保留策略执行异常: {e}", exc_info=True)
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self, dry_run: bool = False, respect_window: bool = True) -> Dict[str, dict]:
+        """
+        执行一轮清理
+
+        Args:
+            dry_run: 只统计不修改
+            respect_window: 超出执行时段时在当前块结束后停止
+
+        Returns:
+            {摄像头类型: {"images": 处理图片数, "reclaimed_bytes": 回收字节数}}
+        """
+        started = time.monotonic()
+        result: Dict[str, dict] = {}
+        async with job_lock(RETENTION_LOCK_NAME) as locked:
+            if not locked:
+                return {}
+            for camera_type, days in self.ttl_days.items():
+                if days <= 0:
+                    continue
+                cutoff = datetime.now() - timedelta(days=days)
+                result[f"camera_{camera_type}"] = await self.purge_camera_type(
+                    camera_type, cutoff, dry_run, respect_window
+                )
+
+        if not dry_run:
+            images = sum(item["images"] for item in result.values())
+            reclaimed = sum(item["reclaimed_bytes"] for item in result.values())
+            self.metrics["runs"] += 1
+            self.metrics["last_run_at"] = datetime.now().isoformat(timespec="seconds")
+            self.metrics["last_duration_ms"] = round((time.monotonic() - started) * 1000, 1)
+            self.metrics["last_result"] = result
+            self.metrics["images"] += images
+            self.metrics["reclaimed_bytes"] += reclaimed
+            if images:
+                logger.info(f"摄像头图片保留策略: 模式={self.mode}, 处理 {images} 张, 回收 {reclaimed / 1024 / 1024:.1f}MB")
+        return result
+
+    async def purge_camera_type(
+        self,
+        camera_type: int,
+        cutoff: datetime,
+        dry_run: bool = False,
+        respect_window: bool = True
+    ) -> dict:
+        """分块处理一种摄像头的过期图片"""
+        totals = {"images": 0, "reclaimed_bytes": 0}
+        last_created: Optional[datetime] = None
+        last_id = 0
+        while True:
+            if respect_window and not self.in_window():
+                logger.info("已超出摄像头图片保留策略执行时段，剩余部分下次继续")
+                break
+            conditions = [
+                DeviceCameraImage.camera_type == camera_type,
+                DeviceCameraImage.is_alarm == 0,
+                DeviceCameraImage.compacted_at == None,
+                DeviceCameraImage.created_at < cutoff,
+            ]
+            if self.mode == "archive":
+                # 衍生图处理完成（或已放弃）后才归档
+                conditions.append(DeviceCameraImage.variant_status.in_(
+                    (ImageVariantStatus.DONE.value, ImageVariantStatus.FAILED.value)
+                ))
+            if dry_run and last_created is not None:
+                # 只统计时不修改数据，按 (created_at, id) 继续往后扫描
+                conditions.append(or_(
+                    DeviceCameraImage.created_at > last_created,
+                    and_(DeviceCameraImage.created_at == last_created, DeviceCameraImage.id > last_id)
+                ))
+
+            async with AsyncSessionLocal() as db:
+                rows = (await db.execute(
+                    select(
+                        DeviceCameraImage.id,
+                        DeviceCameraImage.created_at,
+                        func.length(DeviceCameraImage.image_data)
+                    )
+                    .where(*conditions)
+                    .order_by(DeviceCameraImage.created_at, DeviceCameraImage.id)
+                    .limit(self.chunk_size)
+                )).all()
+                if not rows:
+                    break
+                last_created, last_id = rows[-1][1], rows[-1][0]
+
+                if self.mode == "delete":
+                    processed, reclaimed = await self._delete_chunk(db, rows, dry_run)
+                else:
+                    processed, reclaimed = await self._archive_chunk(db, rows, dry_run)
+                if not dry_run:
+                    await db.commit()
+
+            totals["images"] += processed
+            totals["reclaimed_bytes"] += reclaimed
+            if len(rows) < self.chunk_size:
+                break
+            if self.chunk_sleep:
+                await asyncio.sleep(self.chunk_sleep)
+        return totals
+
+    async def _delete_chunk(self, db, rows, dry_run: bool) -> Tuple[int, int]:
+        """
+        删除一块图片及其衍生图
+
+        Returns:
+            (处理图片数, 回收字节数)
+        """
+        ids = [row[0] for row in rows]
+        image_bytes = sum(int(row[2] or 0) for row in rows)
+        variant_bytes = (await db.execute(
+            select(func.coalesce(func.sum(DeviceCameraImageVariant.size), 0))
+            .where(DeviceCameraImageVariant.image_id.in_(ids))
+        )).scalar()
+        if not dry_run:
+            await db.execute(delete(DeviceCameraImageVariant).where(DeviceCameraImageVariant.image_id.in_(ids)))
+            # 再次排除告警批次，防止读取后被修改
+            await db.execute(
+                delete(DeviceCameraImage).where(DeviceCameraImage.id.in_(ids), DeviceCameraImage.is_alarm == 0)
+            )
+        return len(rows), image_bytes + int(variant_bytes)
+
+    async def _archive_chunk(self, db, rows, dry_run: bool) -> Tuple[int, int]:
+        """
+        归档一块图片：有存档图的删除原图数据；没有存档图的（存档图不比原图小或生成失败）保留原图
+
+        Returns:
+            (处理图片数, 回收字节数)
+        """
+        ids = [row[0] for row in rows]
+        archived = set((await db.execute(
+            select(DeviceCameraImageVariant.image_id).where(
+                DeviceCameraImageVariant.image_id.in_(ids),
+                DeviceCameraImageVariant.variant == ImageVariant.ARCHIVE.value
+            )
+        )).scalars().all())
+        reclaimed = sum(int(row[2] or 0) for row in rows if row[0] in archived)
+        if not dry_run:
+            now = datetime.now()
+            if archived:
+                await db.execute(
+                    update(DeviceCameraImage)
+                    .where(DeviceCameraImage.id.in_(archived), DeviceCameraImage.is_alarm == 0)
+                    .values(image_data="", compacted_at=now)
+                )
+            kept = [image_id for image_id in ids if image_id not in archived]
+            if kept:
+                await db.execute(
+                    update(DeviceCameraImage).where(DeviceCameraImage.id.in_(kept)).values(compacted_at=now)
+                )
+        return len(rows), reclaimed
+
+
+# 全局实例
+camera_retention_job = CameraRetentionJob(
+    ttl_days={1: settings.CAMERA_RETENTION_DAYS_INTERNAL, 2: settings.CAMERA_RETENTION_DAYS_USER},
+    mode=settings.CAMERA_RETENTION_MODE,
+    window=settings.CAMERA_RETENTION_WINDOW,
+    interval=settings.CAMERA_RETENTION_INTERVAL_SECONDS,
+    chunk_size=settings.CAMERA_RETENTION_CHUNK_SIZE,
+    chunk_sleep=settings.CAMERA_RETENTION_CHUNK_SLEEP_SECONDS,
+)
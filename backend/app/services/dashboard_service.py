@@ -0,0 +1,169 @@
+"""
+工作台统计服务
+
+统计数据与当前管理员无关，按统计周期生成快照，所有管理员共享；
+快照过期后由第一个请求刷新，并发请求等待同一次刷新（不会同时打到数据库）。
+查询使用只读会话，配置了 DATABASE_REPLICA_URLS 时读从库。
+
+每次刷新只执行三条查询：
+    1. 读取全局按日汇总（订单数、重量、金额），同时得到本期、上期和图表数据
+    2. 订单活跃用户数（本期、上期的条件去重计数）
+    3. 预计即将满仓的设备数（device_fill_forecasts，按 expected_full_at 索引计数）
+设备告警计数（离线、烟感、低电量、满仓）取自进程内设备状态聚合 fleet_state，不查询数据库。
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Tuple
+
+from sqlalchemy import select, func, case
+from loguru import logger
+
+from app.config import settings
+from app.db.database import read_session
+from app.models.order import DeliveryOrder
+from app.services.fill_forecast import devices_full_within
+from app.services.fleet_state import fleet_state
+from app.services.order_stats_service import global_daily
+
+# 统计周期: (本期天数, 图表天数)
+PERIODS: Dict[str, Tuple[int, int]] = {
+    "today": (1, 7),
+    "7days": (7, 7),
+    "30days": (30, 30),
+}
+
+
+def _trend(current: float, previous: float) -> float:
+    """环比变化百分比"""
+    return round((current - previous) / previous * 100, 1) if previous else 0.0
+
+
+class DashboardService:
+    """工作台统计快照缓存"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._snapshots: Dict[str, Tuple[float, dict]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.hits = 0
+        self.refreshes = 0
+
+    async def get_stats(self, period: str) -> dict:
+        """取统计快照，过期时刷新"""
+        cached = self._snapshots.get(period)
+        if cached and cached[0] > time.monotonic():
+            self.hits += 1
+            return cached[1]
+
+        lock = self._locks.setdefault(period, asyncio.Lock())
+        async with lock:
+            # 等锁期间其他请求可能已刷新
+            cached = self._snapshots.get(period)
+            if cached and cached[0] > time.monotonic():
+                self.hits += 1
+                return cached[1]
+            data = await self.compute(period)
+            self._snapshots[period] = (time.monotonic() + self.ttl, data)
+            self.refreshes += 1
+            return data
+
+    def stats(self) -> dict:
+        return {"ttl": self.ttl, "hits": self.hits, "refreshes": self.refreshes}
+
+    async def compute(self, period: str) -> dict:
+        """查询数据库生成统计数据"""
+        started = time.perf_counter()
+        days, chart_days = PERIODS[period]
+        now = datetime.now()
+        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        current_start = today_start - timedelta(days=days - 1)
+        previous_start = current_start - timedelta(days=days)
+        chart_start = today_start - timedelta(days=chart_days - 1)
+        range_start = min(previous_start, chart_start)
+
+        async with read_session() as db:
+            # 1. 订单按日汇总（读取 order_daily_stats）
+            by_day = await global_daily(db, range_start.date(), today_start.date())
+
+            # 2. 活跃用户（跨天去重，不能由按日结果相加得到）
+            users_row = (await db.execute(
+                select(
+                    func.count(func.distinct(case(
+                        (DeliveryOrder.created_at >= current_start, DeliveryOrder.user_id)
+                    ))),
+                    func.count(func.distinct(case(
+                        (DeliveryOrder.created_at < current_start, DeliveryOrder.user_id)
+                    )))
+                ).where(DeliveryOrder.created_at >= previous_start)
+            )).one()
+
+            # 3. 预计即将满仓（满仓预测任务的结果）
+            soon_full_count = await devices_full_within(db, settings.FILL_FORECAST_ALERT_HOURS)
+
+        # 4. 设备告警（进程内设备状态聚合，不查库）
+        await fleet_state.ensure_ready()
+        fleet = fleet_state.counts()
+
+        # 按日结果拆分为本期、上期和图表
+        def window_sum(start: datetime, end: datetime) -> Tuple[int, float, float]:
+            totals = [0, 0.0, 0.0]
+            for row_day, values in by_day.items():
+                if start.date() <= row_day < end.date():
+                    for i in range(3):
+                        totals[i] += values[i]
+            return totals[0], totals[1], totals[2]
+
+        tomorrow_start = today_start + timedelta(days=1)
+        orders, weight, amount = window_sum(current_start, tomorrow_start)
+        prev_orders, prev_weight, prev_amount = window_sum(previous_start, current_start)
+        active_users, prev_active_users = users_row
+
+        chart_dates = []
+        chart_values = []
+        for i in range(chart_days):
+            chart_day = (chart_start + timedelta(days=i)).date()
+            chart_dates.append(chart_day.strftime('%m-%d'))
+            chart_values.append(by_day.get(chart_day, (0, 0.0, 0.0))[0])
+
+        alerts = []
+        offline_count, smoke_alert_count, low_battery_count, full_bin_count = (
+            fleet["offline"], fleet["smoke_alert"], fleet["low_battery"], fleet["full"]
+        )
+        alert_defs = [
+            (offline_count, "警告", f"有{offline_count}台设备离线"),
+            (smoke_alert_count, "紧急", f"有{smoke_alert_count}台设备烟感告警，请立即处理！"),
+            (low_battery_count, "警告", f"有{low_battery_count}台设备电量低于20%"),
+            (full_bin_count, "提示", f"有{full_bin_count}台设备仓体已满，请及时清运"),
+            (soon_full_count, "提示",
+             f"有{soon_full_count}台设备预计{settings.FILL_FORECAST_ALERT_HOURS:g}小时内满仓，请安排清运"),
+        ]
+        for count, level, message in alert_defs:
+            if count > 0:
+                alerts.append({
+                    "id": len(alerts) + 1,
+                    "level": level,
+                    "message": message,
+                    "time": now.strftime('%H:%M')
+                })
+
+        logger.debug(f"工作台统计已刷新: period={period}, 耗时={(time.perf_counter() - started) * 1000:.1f}ms")
+        return {
+            "today_orders": orders,
+            "today_weight": round(weight, 2),
+            "today_amount": round(amount, 2),
+            "active_users": active_users,
+            "orders_trend": _trend(orders, prev_orders),
+            "weight_trend": _trend(weight, prev_weight),
+            "amount_trend": _trend(amount, prev_amount),
+            "users_trend": _trend(active_users, prev_active_users),
+            "chart_data": {
+                "dates": chart_dates,
+                "values": chart_values
+            },
+            "alerts": alerts,
+        }
+
+
+# 全局实例
+dashboard_service = DashboardService(ttl=settings.DASHBOARD_CACHE_TTL_SECONDS)
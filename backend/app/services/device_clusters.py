@@ -0,0 +1,271 @@
+"""
+设备地图聚合 - 管理后台设备地图
+
+全城视图原来需要按 100 条一页把设备列表全部拉下来再逐个画点。这里在进程内维护一棵按经纬度等分的
+四叉树（第 L 层网格边长 360/2^L 度），每层每个网格预先累计设备数、告警/满箱/离线数和坐标之和，
+查询时按地图缩放级别选层，只读取视口内的网格：
+
+    clusters  网格聚合：中心为网格内设备的平均坐标，附带各状态数量
+    points    视口内设备不多（≤ DEVICE_CLUSTER_POINT_LIMIT）或缩放到最细一层时直接返回设备点，
+              设备按最细一层网格登记
+
+坐标变化由会话提交事件增量更新，告警/满箱/离线变化订阅 fleet_state（含心跳到期转离线），
+后台任务每 DEVICE_CLUSTER_RESYNC_SECONDS 全量重建一次，覆盖其他进程的修改。
+"""
+import asyncio
+import math
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from loguru import logger
+
+from app.config import settings
+from app.db.database import AsyncSessionLocal
+from app.models.device import Device
+from app.services.device_moves import add_move_observer
+from app.services.fleet_state import fleet_state
+
+# 网格层级范围；地图缩放级别 z 对应第 z + ZOOM_OFFSET 层（每个聚合约 64px）
+MIN_LEVEL = 4
+MAX_LEVEL = 20
+ZOOM_OFFSET = 2
+
+# 聚合分项统计的 fleet_state 条件
+BREAKDOWN = ("smoke_alert", "full", "offline")
+
+# 网格累计值下标: 设备数, 告警, 满箱, 离线, 纬度和, 经度和
+_COUNT, _ALARM, _FULL, _OFFLINE, _LAT, _LNG = range(6)
+
+
+def level_for_zoom(zoom: int) -> int:
+    return min(max(zoom + ZOOM_OFFSET, MIN_LEVEL), MAX_LEVEL)
+
+
+def cell_of(level: int, latitude: float, longitude: float) -> Tuple[int, int]:
+    size = 360.0 / (1 << level)
+    return int(math.floor((latitude + 90.0) / size)), int(math.floor((longitude + 180.0) / size))
+
+
+class DeviceClusterIndex:
+    """设备地图聚合四叉树"""
+
+    def __init__(self, resync_interval: float, point_limit: int):
+        self.resync_interval = resync_interval
+        self.point_limit = point_limit
+        # device_id → (纬度, 经度, 分项条件)
+        self._devices: Dict[str, Tuple[float, float, Tuple[bool, ...]]] = {}
+        # 层级 → {网格: 累计值}
+        self._levels: Dict[int, Dict[Tuple[int, int], List[float]]] = {
+            level: {} for level in range(MIN_LEVEL, MAX_LEVEL + 1)
+        }
+        # 最细一层网格 → 设备
+        self._leaves: Dict[Tuple[int, int], Set[str]] = {}
+        self._replay: Optional[List[Tuple[str, Any]]] = None
+        self._ready = False
+        self._sync_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.metrics = {"queries": 0, "updates": 0, "resyncs": 0, "last_resync_ms": None}
+        fleet_state.add_observer(self._on_flags)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"设备地图聚合已启动 (校正间隔: {self.resync_interval}秒)")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.resync()
+            except Exception as e:
+                logger.error(f"设备地图聚合重建失败: {e}", exc_info=True)
+            await asyncio.sleep(self.resync_interval)
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None,
+            "ready": self._ready,
+            "devices": len(self._devices),
+            "cells": sum(len(cells) for cells in self._levels.values()),
+            **self.metrics,
+        }
+
+    # ---------- 维护 ----------
+
+    def _add(self, device_id: str, entry: Tuple[float, float, Tuple[bool, ...]], sign: int) -> None:
+        latitude, longitude, flags = entry
+        for level, cells in self._levels.items():
+            key = cell_of(level, latitude, longitude)
+            bucket = cells.get(key)
+            if bucket is None:
+                bucket = cells[key] = [0, 0, 0, 0, 0.0, 0.0]
+            bucket[_COUNT] += sign
+            bucket[_ALARM] += sign * flags[0]
+            bucket[_FULL] += sign * flags[1]
+            bucket[_OFFLINE] += sign * flags[2]
+            bucket[_LAT] += sign * latitude
+            bucket[_LNG] += sign * longitude
+            if bucket[_COUNT] <= 0:
+                del cells[key]
+        leaf = cell_of(MAX_LEVEL, latitude, longitude)
+        if sign > 0:
+            self._leaves.setdefault(leaf, set()).add(device_id)
+        else:
+            members = self._leaves.get(leaf)
+            if members is not None:
+                members.discard(device_id)
+                if not members:
+                    del self._leaves[leaf]
+
+    def _put(self, device_id: str, point: Optional[Tuple[float, float]] = None, flags: Optional[Set[str]] = None) -> None:
+        """更新一台设备的坐标或条件（未传的保持不变），point 为 None 且未传条件时移除"""
+        old = self._devices.pop(device_id, None)
+        if old is not None:
+            self._add(device_id, old, -1)
+        if flags is not None:
+            breakdown = tuple(name in flags for name in BREAKDOWN)
+            if old is None:
+                return
+            entry = (old[0], old[1], breakdown)
+        elif point is None:
+            return
+        else:
+            breakdown = old[2] if old is not None else tuple(
+                name in fleet_state.flags(device_id) for name in BREAKDOWN
+            )
+            entry = (point[0], point[1], breakdown)
+        self._devices[device_id] = entry
+        self._add(device_id, entry, 1)
+
+    def apply(self, device_id: str, point: Optional[Tuple[float, float]]) -> None:
+        """应用一台设备已提交的坐标，None 表示设备已删除或没有坐标"""
+        if self._replay is not None:
+            self._replay.append((device_id, point))
+        self._put(device_id, point)
+        self.metrics["updates"] += 1
+
+    def _on_flags(self, device_id: str, flags: Set[str]) -> None:
+        entry = self._devices.get(device_id)
+        if entry is not None and entry[2] != tuple(name in flags for name in BREAKDOWN):
+            self._put(device_id, flags=flags)
+            self.metrics["updates"] += 1
+
+    async def resync(self, if_not_ready: bool = False) -> None:
+        """从数据库全量重建"""
+        async with self._sync_lock:
+            if if_not_ready and self._ready:
+                return
+            started = time.perf_counter()
+            await fleet_state.ensure_ready()
+            self._replay = []
+            try:
+                async with AsyncSessionLocal() as db:
+                    rows = (await db.execute(
+                        select(Device.device_id, Device.latitude, Device.longitude).where(
+                            Device.latitude.isnot(None),
+                            Device.longitude.isnot(None)
+                        )
+                    )).all()
+                live = self._devices, self._levels, self._leaves
+                self._devices = {}
+                self._levels = {level: {} for level in self._levels}
+                self._leaves = {}
+                try:
+                    for device_id, latitude, longitude in rows:
+                        self._put(device_id, (latitude, longitude))
+                    # 查询期间提交的修改比查询结果新，重放一遍
+                    for device_id, point in self._replay:
+                        self._put(device_id, point)
+                except Exception:
+                    self._devices, self._levels, self._leaves = live
+                    raise
+            finally:
+                self._replay = None
+            self._ready = True
+            self.metrics["resyncs"] += 1
+            self.metrics["last_resync_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    # ---------- 查询 ----------
+
+    def _cells_in(self, cells: Dict[Tuple[int, int], Any], level: int, bounds: Tuple[float, float, float, float]):
+        """视口内的网格（视口覆盖的网格数多于已有网格时改为遍历已有网格）"""
+        min_lat, min_lng, max_lat, max_lng = bounds
+        low_row, low_col = cell_of(level, min_lat, min_lng)
+        high_row, high_col = cell_of(level, max_lat, max_lng)
+        if (high_row - low_row + 1) * (high_col - low_col + 1) <= len(cells):
+            for row in range(low_row, high_row + 1):
+                for col in range(low_col, high_col + 1):
+                    value = cells.get((row, col))
+                    if value is not None:
+                        yield (row, col), value
+        else:
+            for (row, col), value in cells.items():
+                if low_row <= row <= high_row and low_col <= col <= high_col:
+                    yield (row, col), value
+
+    async def query(self, zoom: int, bounds: Tuple[float, float, float, float]) -> dict:
+        """
+        视口内的聚合
+
+        Args:
+            zoom: 地图缩放级别
+            bounds: (最小纬度, 最小经度, 最大纬度, 最大经度)
+        """
+        if not self._ready:
+            await self.resync(if_not_ready=True)
+        # 心跳到期转离线通过订阅回调更新聚合
+        fleet_state.expire()
+        self.metrics["queries"] += 1
+        level = level_for_zoom(zoom)
+
+        clusters = []
+        total = 0
+        for (row, col), bucket in self._cells_in(self._levels[level], level, bounds):
+            count = int(bucket[_COUNT])
+            total += count
+            clusters.append({
+                "cell": f"{level}/{row}/{col}",
+                "latitude": round(bucket[_LAT] / count, 6),
+                "longitude": round(bucket[_LNG] / count, 6),
+                "count": count,
+                "alarm": int(bucket[_ALARM]),
+                "full": int(bucket[_FULL]),
+                "offline": int(bucket[_OFFLINE]),
+            })
+
+        if total > self.point_limit and level < MAX_LEVEL:
+            return {"level": level, "mode": "clusters", "total": total, "clusters": clusters}
+
+        min_lat, min_lng, max_lat, max_lng = bounds
+        points = []
+        for _, members in self._cells_in(self._leaves, MAX_LEVEL, bounds):
+            for device_id in members:
+                latitude, longitude, (alarm, full, offline) = self._devices[device_id]
+                if min_lat <= latitude <= max_lat and min_lng <= longitude <= max_lng:
+                    points.append({
+                        "device_id": device_id,
+                        "latitude": latitude,
+                        "longitude": longitude,
+                        "alarm": int(alarm),
+                        "full": int(full),
+                        "offline": int(offline),
+                    })
+        return {"level": level, "mode": "points", "total": len(points), "points": points}
+
+
+# 全局实例
+device_cluster_index = DeviceClusterIndex(
+    resync_interval=settings.DEVICE_CLUSTER_RESYNC_SECONDS,
+    point_limit=settings.DEVICE_CLUSTER_POINT_LIMIT,
+)
+
+add_move_observer(device_cluster_index.apply)
@@ -0,0 +1,289 @@
+"""
+附近设备空间索引 - 小程序 /device/nearby
+
+原实现每次打开地图都读出全部有坐标的设备，逐台用纯 Python 计算球面距离，耗时随设备数线性增长。
+这里先按范围取候选设备，再用 NumPy 向量化计算候选设备的距离：
+
+    memory  进程内网格索引（默认）。按 DEVICE_GEO_CELL_DEGREES 把经纬度划分为网格，只取查询范围
+            覆盖的网格内的设备；任何会话提交的坐标修改在提交后增量更新，
+            后台任务每 DEVICE_GEO_RESYNC_SECONDS 全量重建一次，覆盖其他进程的修改
+    sql     按 (latitude, longitude) 索引做外接矩形预筛选（迁移 v0013 创建索引）
+
+支持只返回最近的 k 台，以及按设备状态排除（满箱、离线，状态来自 fleet_state）。
+"""
+import asyncio
+import math
+import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from loguru import logger
+
+from app.config import settings
+from app.db.database import AsyncSessionLocal
+from app.models.device import Device
+from app.services.device_moves import add_move_observer
+from app.services.fleet_state import fleet_state
+from app.utils.geo import haversine
+
+METERS_PER_DEGREE = 111320.0
+
+# 可排除的设备状态（fleet_state 条件）
+EXCLUDABLE = ("offline", "full", "smoke_alert", "using")
+
+# (device_id, 距离米)
+NearbyHit = Tuple[str, int]
+
+
+def bounding_box(latitude: float, longitude: float, radius: float) -> Tuple[float, float, float, float]:
+    """以 (latitude, longitude) 为中心、radius 米为半径的外接矩形 (最小纬度, 最大纬度, 最小经度, 最大经度)"""
+    delta_lat = radius / METERS_PER_DEGREE
+    cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+    delta_lng = min(radius / (METERS_PER_DEGREE * cos_lat), 180.0)
+    return latitude - delta_lat, latitude + delta_lat, longitude - delta_lng, longitude + delta_lng
+
+
+def rank_candidates(
+    latitude: float,
+    longitude: float,
+    radius: float,
+    candidates: List[Tuple[str, float, float]],
+    limit: Optional[int],
+) -> List[NearbyHit]:
+    """计算候选设备距离，保留半径内的设备，按距离排序取前 limit 台"""
+    if not candidates:
+        return []
+    ids = [item[0] for item in candidates]
+    lats = np.fromiter((item[1] for item in candidates), dtype=np.float64, count=len(candidates))
+    lngs = np.fromiter((item[2] for item in candidates), dtype=np.float64, count=len(candidates))
+    distances = haversine(latitude, longitude, lats, lngs)
+    inside = np.flatnonzero(distances <= radius)
+    if limit is not None and len(inside) > limit:
+        # 只对最近的 limit 台排序
+        inside = inside[np.argpartition(distances[inside], limit - 1)[:limit]]
+    inside = inside[np.argsort(distances[inside], kind="stable")]
+    return [(ids[i], int(distances[i])) for i in inside]
+
+
+async def excluded_devices(exclude: Iterable[str]) -> Set[str]:
+    """按状态排除的设备 ID"""
+    exclude = [name for name in exclude if name in EXCLUDABLE]
+    if not exclude:
+        return set()
+    await fleet_state.ensure_ready()
+    result: Set[str] = set()
+    for name in exclude:
+        result |= fleet_state.device_ids(name)
+    return result
+
+
+class GridGeoIndex:
+    """进程内网格索引"""
+
+    name = "memory"
+
+    def __init__(self, cell_degrees: float, resync_interval: float):
+        self.cell_degrees = cell_degrees
+        self.resync_interval = resync_interval
+        self._points: Dict[str, Tuple[float, float]] = {}
+        self._cells: Dict[Tuple[int, int], Set[str]] = {}
+        self._replay: Optional[List[Tuple[str, Optional[Tuple[float, float]]]]] = None
+        self._ready = False
+        self._sync_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.metrics = {"queries": 0, "candidates": 0, "updates": 0, "resyncs": 0, "last_resync_ms": None}
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"附近设备空间索引已启动 (网格: {self.cell_degrees}°, 校正间隔: {self.resync_interval}秒)")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.resync()
+            except Exception as e:
+                logger.error(f"附近设备空间索引重建失败: {e}", exc_info=True)
+            await asyncio.sleep(self.resync_interval)
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "running": self._task is not None,
+            "ready": self._ready,
+            "devices": len(self._points),
+            "cells": len(self._cells),
+            **self.metrics,
+        }
+
+    # ---------- 维护 ----------
+
+    def _cell(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        return int(math.floor(latitude / self.cell_degrees)), int(math.floor(longitude / self.cell_degrees))
+
+    def _put(self, device_id: str, point: Optional[Tuple[float, float]]) -> None:
+        old = self._points.pop(device_id, None)
+        if old is not None:
+            cell = self._cell(*old)
+            members = self._cells.get(cell)
+            if members is not None:
+                members.discard(device_id)
+                if not members:
+                    del self._cells[cell]
+        if point is None:
+            return
+        self._points[device_id] = point
+        self._cells.setdefault(self._cell(*point), set()).add(device_id)
+
+    def apply(self, device_id: str, point: Optional[Tuple[float, float]]) -> None:
+        """应用一台设备已提交的坐标，None 表示设备已删除或没有坐标"""
+        if self._replay is not None:
+            self._replay.append((device_id, point))
+        self._put(device_id, point)
+        self.metrics["updates"] += 1
+
+    async def resync(self, if_not_ready: bool = False) -> None:
+        """从数据库全量重建"""
+        async with self._sync_lock:
+            if if_not_ready and self._ready:
+                return
+            started = time.perf_counter()
+            self._replay = []
+            try:
+                async with AsyncSessionLocal() as db:
+                    rows = (await db.execute(
+                        select(Device.device_id, Device.latitude, Device.longitude).where(
+                            Device.latitude.isnot(None),
+                            Device.longitude.isnot(None)
+                        )
+                    )).all()
+                live_points, live_cells = self._points, self._cells
+                self._points, self._cells = {}, {}
+                try:
+                    for device_id, latitude, longitude in rows:
+                        self._put(device_id, (latitude, longitude))
+                    # 查询期间提交的修改比查询结果新，重放一遍
+                    for device_id, point in self._replay:
+                        self._put(device_id, point)
+                except Exception:
+                    self._points, self._cells = live_points, live_cells
+                    raise
+            finally:
+                self._replay = None
+            self._ready = True
+            self.metrics["resyncs"] += 1
+            self.metrics["last_resync_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    # ---------- 查询 ----------
+
+    def _candidates(self, latitude: float, longitude: float, radius: float) -> List[Tuple[str, float, float]]:
+        min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius)
+        low_row, low_col = self._cell(min_lat, min_lng)
+        high_row, high_col = self._cell(max_lat, max_lng)
+        cell_count = (high_row - low_row + 1) * (high_col - low_col + 1)
+        if cell_count <= len(self._cells):
+            cells = (
+                self._cells.get((row, col))
+                for row in range(low_row, high_row + 1)
+                for col in range(low_col, high_col + 1)
+            )
+        else:
+            # 查询范围很大时遍历有设备的网格更快
+            cells = (
+                members for (row, col), members in self._cells.items()
+                if low_row <= row <= high_row and low_col <= col <= high_col
+            )
+        candidates = []
+        for members in cells:
+            if members:
+                for device_id in members:
+                    lat, lng = self._points[device_id]
+                    if min_lat <= lat <= max_lat and min_lng <= lng <= max_lng:
+                        candidates.append((device_id, lat, lng))
+        return candidates
+
+    async def nearby(
+        self,
+        latitude: float,
+        longitude: float,
+        radius: float,
+        limit: Optional[int] = None,
+        exclude: Iterable[str] = ()
+    ) -> List[NearbyHit]:
+        if not self._ready:
+            await self.resync(if_not_ready=True)
+        excluded = await excluded_devices(exclude)
+        candidates = self._candidates(latitude, longitude, radius)
+        if excluded:
+            candidates = [item for item in candidates if item[0] not in excluded]
+        self.metrics["queries"] += 1
+        self.metrics["candidates"] += len(candidates)
+        return rank_candidates(latitude, longitude, radius, candidates, limit)
+
+
+class SqlBoundingBoxIndex:
+    """数据库外接矩形预筛选（ix_devices_lat_lng）"""
+
+    name = "sql"
+
+    def __init__(self):
+        self.metrics = {"queries": 0, "candidates": 0}
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    def apply(self, device_id: str, point: Optional[Tuple[float, float]]) -> None:
+        """数据库索引随表更新，无需处理"""
+
+    def stats(self) -> dict:
+        return {"backend": self.name, **self.metrics}
+
+    async def nearby(
+        self,
+        latitude: float,
+        longitude: float,
+        radius: float,
+        limit: Optional[int] = None,
+        exclude: Iterable[str] = ()
+    ) -> List[NearbyHit]:
+        excluded = await excluded_devices(exclude)
+        min_lat, max_lat, min_lng, max_lng = bounding_box(latitude, longitude, radius)
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                select(Device.device_id, Device.latitude, Device.longitude).where(
+                    Device.latitude.between(min_lat, max_lat),
+                    Device.longitude.between(min_lng, max_lng)
+                )
+            )).all()
+        candidates = [tuple(row) for row in rows if row[0] not in excluded]
+        self.metrics["queries"] += 1
+        self.metrics["candidates"] += len(candidates)
+        return rank_candidates(latitude, longitude, radius, candidates, limit)
+
+
+def _create_index():
+    if settings.DEVICE_GEO_BACKEND == "sql":
+        return SqlBoundingBoxIndex()
+    return GridGeoIndex(
+        cell_degrees=settings.DEVICE_GEO_CELL_DEGREES,
+        resync_interval=settings.DEVICE_GEO_RESYNC_SECONDS,
+    )
+
+
+# 全局实例
+device_geo_index = _create_index()
+
+add_move_observer(device_geo_index.apply)
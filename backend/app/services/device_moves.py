@@ -0,0 +1,63 @@
+"""
+设备坐标变化订阅 - 附近设备索引和设备地图聚合共用
+
+任何会话 flush 了 Device 的新增、删除或坐标修改，提交后按提交的坐标通知订阅者，回滚则丢弃。
+心跳、状态上报只改状态列，不会通知。
+"""
+from typing import Callable, List, Optional, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from loguru import logger
+
+from app.models.device import Device
+
+# 会话 info 中记录待通知设备的键
+_PENDING_KEY = "device_moves_pending"
+
+# (纬度, 经度)，设备已删除或没有坐标时为 None
+Point = Optional[Tuple[float, float]]
+
+_observers: List[Callable[[str, Point], None]] = []
+
+
+def add_move_observer(callback: Callable[[str, Point], None]) -> None:
+    """订阅已提交的设备坐标: callback(device_id, 坐标)"""
+    _observers.append(callback)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_moved_devices(session: Session, flush_context) -> None:
+    """flush 时记录设备坐标的新值，提交后再通知"""
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if not isinstance(obj, Device) or not obj.device_id:
+            continue
+        pending = session.info.setdefault(_PENDING_KEY, {})
+        if obj in session.deleted:
+            pending[obj.device_id] = None
+            continue
+        state = inspect(obj)
+        if obj not in session.new and not (
+            state.attrs.latitude.history.has_changes() or state.attrs.longitude.history.has_changes()
+        ):
+            continue
+        latitude, longitude = state.dict.get("latitude"), state.dict.get("longitude")
+        pending[obj.device_id] = None if latitude is None or longitude is None else (latitude, longitude)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_moved_devices(session: Session) -> None:
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    for callback in _observers:
+        try:
+            for device_id, point in pending.items():
+                callback(device_id, point)
+        except Exception as e:
+            logger.error(f"设备坐标订阅者处理失败: {e}", exc_info=True)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_moved_devices(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
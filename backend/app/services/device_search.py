@@ -0,0 +1,342 @@
+"""
+设备搜索 - 小程序 /device/search
+
+原实现 name LIKE '%kw%' OR address LIKE '%kw%'，每次输入都全表扫描。这里按名称和地址的
+字符二元组（bigram，中文不分词也能按子串匹配）建立倒排索引，两种实现同一接口：
+
+    memory    进程内倒排索引（默认）。任何会话提交的设备新增/修改/删除在提交后增量更新，
+              后台任务每 DEVICE_SEARCH_RESYNC_SECONDS 全量重建一次，覆盖其他进程的修改
+    fulltext  MySQL FULLTEXT(name, address) WITH PARSER ngram（迁移 v0011 创建），
+              适合设备数量很大、不希望每个进程常驻索引的部署
+
+排序：名称包含关键词 > 名称部分匹配 > 地址包含关键词 > 地址部分匹配；
+调用方传入经纬度时按距离衰减（DEVICE_SEARCH_DISTANCE_SCALE_METERS 处得分减半）。
+"""
+import asyncio
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import event, inspect, select, text, or_
+from sqlalchemy.orm import Session
+from loguru import logger
+
+from app.config import settings
+from app.db.database import AsyncSessionLocal
+from app.models.device import Device
+from app.utils.geo import calculate_distance
+
+# 会话 info 中记录待更新设备的键
+_PENDING_KEY = "device_search_pending"
+
+# 索引关心的列
+INDEXED_COLUMNS = ("name", "address", "latitude", "longitude")
+
+# 候选集上限（排序前）
+MAX_CANDIDATES = 500
+
+# (device_id, 得分, 距离米)
+SearchHit = Tuple[str, float, Optional[int]]
+
+
+def normalize(value: Optional[str]) -> str:
+    """小写，只保留文字和数字（去掉空格、标点）"""
+    return "".join(ch for ch in (value or "").lower() if ch.isalnum())
+
+
+def grams(value: str) -> Set[str]:
+    """规范化文本的单字和二元组"""
+    return set(value) | {value[i:i + 2] for i in range(len(value) - 1)}
+
+
+def query_grams(value: str) -> Set[str]:
+    """查询用的 n-gram：单字查询用单字，否则只用二元组"""
+    if len(value) < 2:
+        return {value} if value else set()
+    return {value[i:i + 2] for i in range(len(value) - 1)}
+
+
+def score_text(keyword: str, keyword_grams: Set[str], name: str, address: str) -> float:
+    """
+    文本相关度（keyword、name、address 均已规范化）
+
+    子串完全匹配得满分，否则按命中的二元组比例计部分分，名称权重高于地址。
+    """
+    def field_score(value: str, weight: float) -> float:
+        if not value:
+            return 0.0
+        if keyword in value:
+            # 前缀匹配、短文本更相关
+            return weight * (1.5 if value.startswith(keyword) else 1.0) * (1 + len(keyword) / len(value)) / 2
+        if not keyword_grams:
+            return 0.0
+        covered = len(keyword_grams & grams(value)) / len(keyword_grams)
+        return weight * 0.5 * covered if covered >= 0.5 else 0.0
+
+    return max(field_score(name, 10.0), field_score(address, 4.0))
+
+
+def apply_location_bias(
+    hits: List[Tuple[str, float]],
+    coordinates: Dict[str, Tuple[Optional[float], Optional[float]]],
+    latitude: Optional[float],
+    longitude: Optional[float],
+) -> List[SearchHit]:
+    """按距离衰减得分并附上距离，未传位置时距离为 None"""
+    scale = settings.DEVICE_SEARCH_DISTANCE_SCALE_METERS
+    result = []
+    for device_id, score in hits:
+        distance = None
+        lat, lng = coordinates.get(device_id, (None, None))
+        if latitude is not None and longitude is not None and lat is not None and lng is not None:
+            distance = calculate_distance(latitude, longitude, lat, lng)
+            score = score / (1 + distance / scale)
+        result.append((device_id, score, distance))
+    result.sort(key=lambda hit: -hit[1])
+    return result
+
+
+class MemoryNgramIndex:
+    """进程内 bigram 倒排索引"""
+
+    name = "memory"
+
+    def __init__(self, resync_interval: float):
+        self.resync_interval = resync_interval
+        self._docs: Dict[str, Dict[str, Any]] = {}
+        self._postings: Dict[str, Set[str]] = {}
+        self._replay: Optional[List[Tuple[str, Optional[Dict[str, Any]]]]] = None
+        self._ready = False
+        self._sync_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.metrics = {"searches": 0, "updates": 0, "resyncs": 0, "last_resync_ms": None}
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"设备搜索索引已启动 (校正间隔: {self.resync_interval}秒)")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.resync()
+            except Exception as e:
+                logger.error(f"设备搜索索引重建失败: {e}", exc_info=True)
+            await asyncio.sleep(self.resync_interval)
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "running": self._task is not None,
+            "ready": self._ready,
+            "documents": len(self._docs),
+            "terms": len(self._postings),
+            **self.metrics,
+        }
+
+    # ---------- 维护 ----------
+
+    def _remove(self, device_id: str) -> None:
+        doc = self._docs.pop(device_id, None)
+        if doc is None:
+            return
+        for term in doc["grams"]:
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.discard(device_id)
+                if not posting:
+                    del self._postings[term]
+
+    def _put(self, device_id: str, values: Optional[Dict[str, Any]]) -> None:
+        if values is None:
+            self._remove(device_id)
+            return
+        merged = {name: None for name in INDEXED_COLUMNS}
+        if device_id in self._docs:
+            merged.update({name: self._docs[device_id][name] for name in INDEXED_COLUMNS})
+        merged.update(values)
+        self._remove(device_id)
+        merged["norm_name"] = normalize(merged["name"])
+        merged["norm_address"] = normalize(merged["address"])
+        merged["grams"] = grams(merged["norm_name"]) | grams(merged["norm_address"])
+        self._docs[device_id] = merged
+        for term in merged["grams"]:
+            self._postings.setdefault(term, set()).add(device_id)
+
+    def apply(self, device_id: str, values: Optional[Dict[str, Any]]) -> None:
+        """应用一台设备已提交的列值，values 为 None 表示设备已删除"""
+        if self._replay is not None:
+            self._replay.append((device_id, values))
+        self._put(device_id, values)
+        self.metrics["updates"] += 1
+
+    async def resync(self, if_not_ready: bool = False) -> None:
+        """从数据库全量重建"""
+        async with self._sync_lock:
+            if if_not_ready and self._ready:
+                return
+            started = time.perf_counter()
+            self._replay = []
+            try:
+                async with AsyncSessionLocal() as db:
+                    rows = (await db.execute(
+                        select(Device.device_id, *(getattr(Device, name) for name in INDEXED_COLUMNS))
+                    )).all()
+                live_docs, live_postings = self._docs, self._postings
+                self._docs, self._postings = {}, {}
+                try:
+                    for row in rows:
+                        self._put(row[0], dict(zip(INDEXED_COLUMNS, row[1:])))
+                    # 查询期间提交的修改比查询结果新，重放一遍
+                    for device_id, values in self._replay:
+                        self._put(device_id, values)
+                except Exception:
+                    self._docs, self._postings = live_docs, live_postings
+                    raise
+            finally:
+                self._replay = None
+            self._ready = True
+            self.metrics["resyncs"] += 1
+            self.metrics["last_resync_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    # ---------- 查询 ----------
+
+    async def search(
+        self,
+        keyword: str,
+        limit: int,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None
+    ) -> List[SearchHit]:
+        if not self._ready:
+            await self.resync(if_not_ready=True)
+        self.metrics["searches"] += 1
+        norm = normalize(keyword)
+        terms = query_grams(norm)
+        if not terms:
+            return []
+
+        # 命中二元组最多的设备优先进入候选（全部命中的即子串候选）
+        counts: Dict[str, int] = {}
+        for term in terms:
+            for device_id in self._postings.get(term, ()):
+                counts[device_id] = counts.get(device_id, 0) + 1
+        candidates = sorted(counts, key=lambda device_id: -counts[device_id])[:MAX_CANDIDATES]
+
+        hits = []
+        for device_id in candidates:
+            doc = self._docs[device_id]
+            score = score_text(norm, terms, doc["norm_name"], doc["norm_address"])
+            if score > 0:
+                hits.append((device_id, score))
+        coordinates = {device_id: (self._docs[device_id]["latitude"], self._docs[device_id]["longitude"])
+                       for device_id, _ in hits}
+        return apply_location_bias(hits, coordinates, latitude, longitude)[:limit]
+
+
+class FulltextNgramIndex:
+    """MySQL FULLTEXT ngram 索引（ft_devices_name_address）"""
+
+    name = "fulltext"
+
+    def __init__(self):
+        self.metrics = {"searches": 0}
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    def apply(self, device_id: str, values: Optional[Dict[str, Any]]) -> None:
+        """数据库索引随表更新，无需处理"""
+
+    def stats(self) -> dict:
+        return {"backend": self.name, **self.metrics}
+
+    async def search(
+        self,
+        keyword: str,
+        limit: int,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None
+    ) -> List[SearchHit]:
+        self.metrics["searches"] += 1
+        norm = normalize(keyword)
+        if not norm:
+            return []
+        async with AsyncSessionLocal() as db:
+            if len(norm) < 2:
+                # ngram_token_size=2，单字无法走全文索引，退回 LIKE（设备表小，仅单字输入时发生）
+                condition = or_(Device.name.contains(keyword.strip()), Device.address.contains(keyword.strip()))
+            else:
+                # 布尔模式短语查询：全部二元组相邻出现，即子串匹配
+                condition = text("MATCH(name, address) AGAINST(:phrase IN BOOLEAN MODE)").bindparams(
+                    phrase=f'"{norm}"'
+                )
+            rows = (await db.execute(
+                select(Device.device_id, Device.name, Device.address, Device.latitude, Device.longitude)
+                .where(condition)
+                .limit(MAX_CANDIDATES)
+            )).all()
+
+        terms = query_grams(norm)
+        hits = []
+        coordinates = {}
+        for device_id, name, address, lat, lng in rows:
+            score = score_text(norm, terms, normalize(name), normalize(address))
+            if score > 0:
+                hits.append((device_id, score))
+                coordinates[device_id] = (lat, lng)
+        return apply_location_bias(hits, coordinates, latitude, longitude)[:limit]
+
+
+def _create_index():
+    if settings.DEVICE_SEARCH_BACKEND == "fulltext":
+        return FulltextNgramIndex()
+    return MemoryNgramIndex(resync_interval=settings.DEVICE_SEARCH_RESYNC_SECONDS)
+
+
+# 全局实例
+device_search_index = _create_index()
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_devices(session: Session, flush_context) -> None:
+    """flush 时记录设备名称、地址、坐标的新值，提交后再应用"""
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if not isinstance(obj, Device) or not obj.device_id:
+            continue
+        pending = session.info.setdefault(_PENDING_KEY, {})
+        if obj in session.deleted:
+            pending[obj.device_id] = None
+            continue
+        state = inspect(obj)
+        if obj not in session.new and not any(state.attrs[name].history.has_changes() for name in INDEXED_COLUMNS):
+            # 心跳、状态上报只改状态列，不触发索引更新
+            continue
+        loaded = state.dict
+        values = pending.get(obj.device_id) or {}
+        values.update({name: loaded[name] for name in INDEXED_COLUMNS if name in loaded})
+        pending[obj.device_id] = values
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_committed_devices(session: Session) -> None:
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        for device_id, values in pending.items():
+            device_search_index.apply(device_id, values)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_devices(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
@@ -23,6 +23,7 @@ from loguru import logger
 
 from app.models.device import Device
 from app.models.device_camera import DeviceCameraImage
+from app.services.image_variant_service import image_variant_worker
 from app.schemas.device import (
     DeviceStatusReport,
     HeartbeatReport,
@@ -398,9 +399,10 @@ class DeviceService:
             is_using = data.get("is_using", 0)
             device.is_using = is_using
             
-            # 保存摄像头图片数据
+            # 保存摄像头图片数据（烟感告警时的批次标记为告警批次，保留策略不清理）
             camera_data = data.get("camera_data", {})
             saved_images = 0
+            is_alarm = 1 if smoke_sensor_status == 1 else 0
             if camera_data:
                 batch_id = uuid.uuid4().hex[:16]
                 captured_at = datetime.now()
@@ -416,6 +418,7 @@ class DeviceService:
                             image_data=img_base64,
                             batch_id=batch_id,
                             captured_at=captured_at,
+                            is_alarm=is_alarm,
                         )
                         self.db.add(img_record)
                         saved_images += 1
@@ -431,11 +434,15 @@ class DeviceService:
                             image_data=img_base64,
                             batch_id=batch_id,
                             captured_at=captured_at,
+                            is_alarm=is_alarm,
                         )
                         self.db.add(img_record)
                         saved_images += 1
             
             await self.db.commit()
+            if saved_images:
+                # 只唤醒后台 worker，衍生图不在上报请求中生成
+                image_variant_worker.notify()
             
             logger.info(
                 f"设备 {device_id} 状态上报处理成功: "
@@ -0,0 +1,224 @@
+"""
+数据导出 - 订单、钱包记录、用户
+
+按主键顺序从服务端游标流式读取（yield_per），边读边编码为 CSV / JSONL 写给客户端，
+内存占用与导出行数无关。每行带主键 id，中断后用最后收到的 id 作为 after 参数继续导出。
+
+导出会话独立于请求的数据库会话（StreamingResponse 在接口函数返回后才开始读取），使用只读会话
+（配置了从库时读从库），并调大 net_write_timeout，客户端读取慢时 MySQL 不会中断服务端游标。
+
+日期范围先通过 created_at 索引换算成主键区间，再按主键范围扫描，不做排序。
+"""
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, func, text
+from loguru import logger
+
+from app.config import settings
+from app.db.database import engine, read_session
+from app.models.order import DeliveryOrder
+from app.models.user import User
+from app.models.wallet import WalletRecord
+
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson; charset=utf-8",
+}
+
+# 导出数据集: 名称 → (模型, 导出列)
+DATASETS: Dict[str, Tuple[Any, Tuple[str, ...]]] = {
+    "orders": (DeliveryOrder, (
+        "id", "order_id", "device_id", "device_name", "device_address", "user_id",
+        "weight", "unit_price", "amount", "carbon_reduction", "points_earned",
+        "status", "claim_time", "created_at",
+    )),
+    "wallet_records": (WalletRecord, (
+        "id", "record_id", "user_id", "type", "amount", "balance_before", "balance_after",
+        "order_id", "remark", "created_at",
+    )),
+    "users": (User, (
+        "id", "user_id", "nickname", "phone", "is_verified", "balance", "frozen_balance", "points",
+        "total_weight", "total_carbon", "total_count", "status", "created_at", "last_login_at",
+    )),
+}
+
+
+class ExportBusyError(Exception):
+    """同时进行的导出数已达上限"""
+
+
+def _format_value(value):
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+class ExportSlot:
+    """一个导出名额，release() 可重复调用，只归还一次"""
+
+    def __init__(self, service: "ExportService"):
+        self._service = service
+        self._held = True
+
+    def release(self) -> None:
+        if self._held:
+            self._held = False
+            self._service.active -= 1
+
+    def __del__(self):
+        # 响应没有发出、生成器从未启动时，对象回收时归还名额
+        self.release()
+
+
+class ExportService:
+    """流式导出"""
+
+    def __init__(self, max_concurrent: int, batch_size: int):
+        self.max_concurrent = max_concurrent
+        self.batch_size = batch_size
+        self.active = 0
+        self.metrics = {"exports": 0, "rows": 0, "bytes": 0, "failed": 0, "rejected": 0}
+
+    def stats(self) -> dict:
+        return {"active": self.active, "max_concurrent": self.max_concurrent, **self.metrics}
+
+    def reserve(self) -> ExportSlot:
+        """
+        返回响应前占用一个导出名额（每个导出占用一个数据库连接直到结束）
+
+        检查和计数之间没有 await，并发请求不会同时通过检查。名额由 stream() 结束时归还；
+        响应未被读取时调用方负责 release()（见 admin_export）。
+
+        Raises:
+            ExportBusyError: 同时进行的导出数已达上限
+        """
+        if self.active >= self.max_concurrent:
+            self.metrics["rejected"] += 1
+            raise ExportBusyError()
+        self.active += 1
+        return ExportSlot(self)
+
+    async def _id_range(self, db, model, start: Optional[date], end: Optional[date]) -> Tuple[Optional[int], Optional[int]]:
+        """日期范围 [start, end] 换算为主键闭区间，没有数据时返回 (None, None)"""
+        conditions = []
+        if start:
+            conditions.append(model.created_at >= datetime.combine(start, datetime.min.time()))
+        if end:
+            conditions.append(model.created_at < datetime.combine(end + timedelta(days=1), datetime.min.time()))
+        if not conditions:
+            return 0, None
+        low, high = (await db.execute(select(func.min(model.id), func.max(model.id)).where(*conditions))).one()
+        return low, high
+
+    async def stream(
+        self,
+        dataset: str,
+        fmt: str,
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        after: int = 0,
+        filters: Optional[Dict[str, Any]] = None,
+        slot: Optional[ExportSlot] = None,
+    ) -> AsyncIterator[bytes]:
+        """
+        流式生成导出内容
+
+        Args:
+            slot: reserve() 占用的名额，结束时归还；不传则在这里占用（名额已满时抛出 ExportBusyError）
+            dataset: orders / wallet_records / users
+            fmt: csv / jsonl
+            start, end: 创建日期范围（含两端）
+            after: 断点续传，只导出 id 大于此值的记录
+            filters: 列名 → 值的等值筛选
+        """
+        model, columns = DATASETS[dataset]
+        exported = 0
+        sent = 0
+        slot = slot or self.reserve()
+        try:
+            async with read_session() as db:
+                if engine.dialect.name == "mysql":
+                    await db.execute(text(
+                        f"SET SESSION net_write_timeout = {int(settings.EXPORT_NET_WRITE_TIMEOUT_SECONDS)}"
+                    ))
+
+                low, high = await self._id_range(db, model, start, end)
+                if low is None:
+                    rows = None
+                else:
+                    conditions = [model.id > max(after, low - 1)]
+                    if high is not None:
+                        conditions.append(model.id <= high)
+                        # 主键区间内可能夹杂 created_at 超出范围的记录（时间与自增顺序不严格一致）
+                        if start:
+                            conditions.append(model.created_at >= datetime.combine(start, datetime.min.time()))
+                        if end:
+                            conditions.append(
+                                model.created_at < datetime.combine(end + timedelta(days=1), datetime.min.time())
+                            )
+                    for name, value in (filters or {}).items():
+                        if value is not None:
+                            conditions.append(getattr(model, name) == value)
+                    query = (
+                        select(*(getattr(model, name) for name in columns))
+                        .where(*conditions)
+                        .order_by(model.id)
+                        .execution_options(yield_per=self.batch_size)
+                    )
+                    rows = await db.stream(query)
+
+                if fmt == "csv":
+                    header = io.StringIO()
+                    # BOM：Excel 按 UTF-8 打开中文
+                    header.write("\ufeff")
+                    csv.writer(header).writerow(columns)
+                    chunk = header.getvalue().encode("utf-8")
+                    sent += len(chunk)
+                    yield chunk
+
+                if rows is not None:
+                    async for partition in rows.partitions():
+                        chunk = self._encode(partition, columns, fmt)
+                        exported += len(partition)
+                        sent += len(chunk)
+                        yield chunk
+            self.metrics["exports"] += 1
+        except Exception as e:
+            self.metrics["failed"] += 1
+            logger.error(f"导出 {dataset} 失败（已导出 {exported} 行）: {e}", exc_info=True)
+            raise
+        finally:
+            self.metrics["rows"] += exported
+            self.metrics["bytes"] += sent
+            slot.release()
+
+    @staticmethod
+    def _encode(rows: List, columns: Tuple[str, ...], fmt: str) -> bytes:
+        buffer = io.StringIO()
+        if fmt == "csv":
+            writer = csv.writer(buffer)
+            for row in rows:
+                writer.writerow([_format_value(value) for value in row])
+        else:
+            for row in rows:
+                buffer.write(json.dumps(
+                    {name: _format_value(value) for name, value in zip(columns, row)},
+                    ensure_ascii=False
+                ))
+                buffer.write("\n")
+        return buffer.getvalue().encode("utf-8")
+
+
+# 全局实例
+export_service = ExportService(
+    max_concurrent=settings.EXPORT_MAX_CONCURRENT,
+    batch_size=settings.EXPORT_BATCH_SIZE,
+)
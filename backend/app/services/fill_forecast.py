@@ -0,0 +1,241 @@
+"""
+设备满仓预测任务
+
+原来只有设备上报 recycle_bin_full 后才知道需要清运。本任务按 FILL_FORECAST_INTERVAL_SECONDS
+定期为全部设备预测满仓时间，写入 device_fill_forecasts，供工作台告警和收运路线规划使用：
+
+    投递历史  order_daily_device_stats（delivery_orders 在同一事务内累加的设备日汇总）最近
+              FILL_FORECAST_HISTORY_DAYS 天（不含今天）的投递重量，一条查询读出后组成 设备 × 天 矩阵
+    满仓信号  设备上报的当前重量、容量百分比估算仓体容量和剩余容量，仓满的设备直接为 0
+    回归      fill_regression 对全体设备一次向量化加权回归（在线程池中执行）
+
+结果按 FILL_FORECAST_WRITE_CHUNK 条一批 INSERT ... ON DUPLICATE KEY UPDATE，随后删除已不存在的设备。
+多进程部署时通过 MySQL GET_LOCK 保证同一时间只有一个进程在执行，锁持有在连接池之外的
+独立连接上（见 app.db.locks），回归计算期间不占用连接池。
+"""
+import asyncio
+import math
+import time
+from datetime import datetime, timedelta
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from loguru import logger
+
+from app.config import settings
+from app.db.database import AsyncSessionLocal, read_session
+from app.db.locks import job_lock
+from app.models.device import Device
+from app.models.fill_forecast import DeviceFillForecast
+from app.models.order_stats import OrderDailyDeviceStat
+from app.services.fill_regression import forecast
+
+FORECAST_LOCK_NAME = "fill_forecast"
+
+
+class FillForecastJob:
+    """设备满仓预测任务"""
+
+    def __init__(
+        self,
+        interval: float,
+        history_days: int,
+        half_life: float,
+        default_capacity: float,
+        horizon: float,
+        write_chunk: int,
+    ):
+        self.interval = interval
+        self.history_days = history_days
+        self.half_life = half_life
+        self.default_capacity = default_capacity
+        self.horizon = horizon
+        self.write_chunk = write_chunk
+        self._task: Optional[asyncio.Task] = None
+        self.metrics = {
+            "runs": 0,
+            "last_run_at": None,
+            "last_duration_ms": None,
+            "last_fit_ms": None,
+            "devices": 0,
+            "forecast_full": 0,
+        }
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(
+                f"设备满仓预测已启动 (间隔: {self.interval}秒, 历史: {self.history_days}天, "
+                f"半衰期: {self.half_life}天)"
+            )
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {"running": self._task is not None, **self.metrics}
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"设备满仓预测执行异常: {e}", exc_info=True)
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self, dry_run: bool = False) -> Optional[dict]:
+        """
+        执行一轮预测
+
+        Args:
+            dry_run: 只计算不写入
+
+        Returns:
+            {"devices": 设备数, "forecast_full": 预测期内会满的设备数, "fit_ms": 回归耗时}，
+            其他进程正在执行时返回 None
+        """
+        started = time.monotonic()
+        async with job_lock(FORECAST_LOCK_NAME) as locked:
+            if not locked:
+                return None
+            result = await self._forecast_all(dry_run)
+
+        if result is not None and not dry_run:
+            self.metrics["runs"] += 1
+            self.metrics["last_run_at"] = datetime.now().isoformat(timespec="seconds")
+            self.metrics["last_duration_ms"] = round((time.monotonic() - started) * 1000, 1)
+            self.metrics["last_fit_ms"] = result["fit_ms"]
+            self.metrics["devices"] = result["devices"]
+            self.metrics["forecast_full"] = result["forecast_full"]
+            logger.info(
+                f"设备满仓预测: {result['devices']} 台设备, {result['forecast_full']} 台预计"
+                f"{self.horizon:g}天内满仓, 耗时 {self.metrics['last_duration_ms']}ms"
+            )
+        return result
+
+    async def _forecast_all(self, dry_run: bool) -> dict:
+        # DATETIME 列不保存微秒，去掉后才能按 computed_at 区分本轮写入的行
+        now = datetime.now().replace(microsecond=0)
+        today = now.date()
+        start_day = today - timedelta(days=self.history_days)
+
+        async with read_session() as db:
+            devices = (await db.execute(
+                select(Device.device_id, Device.current_weight, Device.capacity_percent, Device.recycle_bin_full)
+            )).all()
+            history_rows = (await db.execute(
+                select(OrderDailyDeviceStat.device_id, OrderDailyDeviceStat.stat_date, OrderDailyDeviceStat.total_weight)
+                .where(OrderDailyDeviceStat.stat_date >= start_day, OrderDailyDeviceStat.stat_date < today)
+            )).all()
+
+        device_ids = [row.device_id for row in devices]
+        if not device_ids:
+            return {"devices": 0, "forecast_full": 0, "fit_ms": 0.0}
+
+        def compute() -> dict:
+            fit_started = time.perf_counter()
+            position = {device_id: i for i, device_id in enumerate(device_ids)}
+            history = np.zeros((len(device_ids), self.history_days), dtype=np.float64)
+            if history_rows:
+                rows = np.fromiter(
+                    (position.get(row[0], -1) for row in history_rows), dtype=np.int64, count=len(history_rows)
+                )
+                cols = np.fromiter(
+                    ((row[1] - start_day).days for row in history_rows), dtype=np.int64, count=len(history_rows)
+                )
+                weights = np.fromiter((row[2] or 0.0 for row in history_rows), dtype=np.float64, count=len(history_rows))
+                known = rows >= 0
+                np.add.at(history, (rows[known], cols[known]), weights[known])
+            # 当前时刻相对昨天中点的天数
+            now_offset = 0.5 + (now - datetime.combine(today, datetime.min.time())).total_seconds() / 86400
+            result = forecast(
+                history,
+                current_weight=np.array([row.current_weight or 0.0 for row in devices], dtype=np.float64),
+                capacity_percent=np.array([row.capacity_percent or 0 for row in devices], dtype=np.float64),
+                bin_full=np.array([row.recycle_bin_full or 0 for row in devices], dtype=np.int64),
+                half_life=self.half_life,
+                default_capacity=self.default_capacity,
+                horizon=self.horizon,
+                now_offset=now_offset,
+            )
+            result["fit_ms"] = round((time.perf_counter() - fit_started) * 1000, 1)
+            return result
+
+        result = await asyncio.get_running_loop().run_in_executor(None, compute)
+        days_to_full = result["days_to_full"]
+        summary = {
+            "devices": len(device_ids),
+            "forecast_full": int(np.count_nonzero(~np.isnan(days_to_full))),
+            "fit_ms": result["fit_ms"],
+        }
+        if not dry_run:
+            await self._write(device_ids, result, now)
+        return summary
+
+    async def _write(self, device_ids, result: dict, now: datetime) -> None:
+        """分批写入预测结果，并删除已不存在设备的旧结果"""
+
+        def value(i: int) -> dict:
+            days = float(result["days_to_full"][i])
+            known = not math.isnan(days)
+            return {
+                "device_id": device_ids[i],
+                "fill_rate": round(float(result["rate"][i]), 4),
+                "trend": round(float(result["trend"][i]), 4),
+                "capacity_kg": round(float(result["capacity"][i]), 3),
+                "remaining_kg": round(float(result["remaining"][i]), 3),
+                "days_to_full": round(days, 3) if known else None,
+                "expected_full_at": now + timedelta(days=days) if known else None,
+                "history_days": int(result["history_days"][i]),
+                "computed_at": now,
+            }
+
+        for offset in range(0, len(device_ids), self.write_chunk):
+            async with AsyncSessionLocal() as db:
+                stmt = mysql_insert(DeviceFillForecast).values(
+                    [value(i) for i in range(offset, min(offset + self.write_chunk, len(device_ids)))]
+                )
+                stmt = stmt.on_duplicate_key_update({
+                    name: stmt.inserted[name]
+                    for name in (
+                        "fill_rate", "trend", "capacity_kg", "remaining_kg",
+                        "days_to_full", "expected_full_at", "history_days", "computed_at",
+                    )
+                })
+                await db.execute(stmt)
+                await db.commit()
+
+        async with AsyncSessionLocal() as db:
+            # 本轮未写入的行属于已删除的设备
+            await db.execute(delete(DeviceFillForecast).where(DeviceFillForecast.computed_at < now))
+            await db.commit()
+
+
+async def devices_full_within(db, hours: float) -> int:
+    """预计 hours 小时内满仓（尚未满）的设备数"""
+    deadline = datetime.now() + timedelta(hours=hours)
+    return int(await db.scalar(
+        select(func.count()).select_from(DeviceFillForecast).where(
+            DeviceFillForecast.expected_full_at <= deadline,
+            DeviceFillForecast.days_to_full > 0
+        )
+    ) or 0)
+
+
+# 全局实例
+fill_forecast_job = FillForecastJob(
+    interval=settings.FILL_FORECAST_INTERVAL_SECONDS,
+    history_days=settings.FILL_FORECAST_HISTORY_DAYS,
+    half_life=settings.FILL_FORECAST_HALF_LIFE_DAYS,
+    default_capacity=settings.FILL_FORECAST_DEFAULT_CAPACITY_KG,
+    horizon=settings.FILL_FORECAST_HORIZON_DAYS,
+    write_chunk=settings.FILL_FORECAST_WRITE_CHUNK,
+)
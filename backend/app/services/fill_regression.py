@@ -0,0 +1,119 @@
+"""
+满仓预测回归（NumPy，不依赖数据库，供 fill_forecast 和基准测试脚本使用）
+
+输入为 设备 × 天 的每日投递重量矩阵（最后一列为昨天），全体设备一次向量化计算：
+
+1. 加权最小二乘拟合每台设备的投递速度直线 rate(t) = a + b·t，权重按天数指数衰减（半衰期 half_life），
+   所有设备共用同一组 t 和权重，闭式解只需要两次矩阵-向量乘法
+2. 趋势 b 限制在 |b| ≤ 加权平均速度 / half_life，避免短期波动外推出过大的加速或减速；当前速度不小于 0
+3. 剩余容量 R 内的满仓天数 τ 满足 rate_now·τ + b·τ²/2 = R，取 τ = 2R / (rate_now + √(rate_now² + 2bR))，
+   判别式为负（速度先降到 0）或超过预测期时视为预测期内不会满（NaN）
+"""
+from typing import Dict
+
+import numpy as np
+
+
+def recency_weights(days: int, half_life: float) -> np.ndarray:
+    """按天的指数衰减权重，最后一天（昨天）为 1"""
+    age = np.arange(days - 1, -1, -1, dtype=np.float64)
+    return np.power(0.5, age / max(half_life, 1e-6))
+
+
+def fit_rates(history: np.ndarray, half_life: float, now_offset: float):
+    """
+    加权最小二乘拟合投递速度
+
+    Args:
+        history: 设备 × 天 的每日投递重量(kg)
+        half_life: 权重半衰期(天)
+        now_offset: 当前时刻相对最后一天中点的天数
+
+    Returns:
+        (当前速度 kg/天, 趋势 kg/天², 加权平均速度 kg/天)
+    """
+    days = history.shape[1]
+    t = np.arange(days, dtype=np.float64)
+    w = recency_weights(days, half_life)
+    sw, st, stt = w.sum(), (w * t).sum(), (w * t * t).sum()
+    sy = history @ w
+    sty = history @ (w * t)
+    det = sw * stt - st * st
+    if days < 2 or det <= 0:
+        slope = np.zeros(len(history))
+    else:
+        slope = (sw * sty - st * sy) / det
+    mean_rate = sy / sw
+    limit = mean_rate / max(half_life, 1.0)
+    slope = np.clip(slope, -limit, limit)
+    # 直线过加权均值点 (st/sw, mean_rate)
+    now_t = days - 1 + now_offset
+    rate = np.maximum(mean_rate + slope * (now_t - st / sw), 0.0)
+    return rate, slope, mean_rate
+
+
+def estimate_capacity(
+    current_weight: np.ndarray,
+    capacity_percent: np.ndarray,
+    default_capacity: float,
+):
+    """
+    按上报的当前重量和容量百分比估算仓体容量和剩余容量(kg)
+
+    容量百分比过低（< 10%）时重量/百分比误差太大，使用默认容量。
+    """
+    percent = np.clip(np.nan_to_num(capacity_percent, nan=0.0), 0.0, 100.0)
+    weight = np.maximum(np.nan_to_num(current_weight, nan=0.0), 0.0)
+    measured = (percent >= 10) & (weight > 0)
+    capacity = np.where(measured, weight * 100.0 / np.maximum(percent, 1e-6), default_capacity)
+    remaining = np.where(
+        percent > 0,
+        capacity * (100.0 - percent) / 100.0,
+        np.maximum(capacity - weight, 0.0),
+    )
+    return capacity, remaining
+
+
+def days_until_full(remaining: np.ndarray, rate: np.ndarray, slope: np.ndarray, horizon: float) -> np.ndarray:
+    """满仓天数，剩余容量为 0 时为 0，预测期内不会满时为 NaN"""
+    disc = rate * rate + 2.0 * slope * remaining
+    denom = rate + np.sqrt(np.maximum(disc, 0.0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tau = np.where((disc >= 0) & (denom > 0), 2.0 * remaining / denom, np.nan)
+    tau = np.where(remaining <= 0, 0.0, tau)
+    return np.where(tau > horizon, np.nan, tau)
+
+
+def forecast(
+    history: np.ndarray,
+    current_weight: np.ndarray,
+    capacity_percent: np.ndarray,
+    bin_full: np.ndarray,
+    half_life: float,
+    default_capacity: float,
+    horizon: float,
+    now_offset: float = 0.5,
+) -> Dict[str, np.ndarray]:
+    """
+    全体设备满仓预测
+
+    Returns:
+        {"rate", "trend", "capacity", "remaining", "days_to_full", "history_days"}，每项按设备对齐；
+        days_to_full 为 NaN 表示预测期内不会满
+    """
+    history = np.asarray(history, dtype=np.float64)
+    rate, slope, _ = fit_rates(history, half_life, now_offset)
+    capacity, remaining = estimate_capacity(
+        np.asarray(current_weight, dtype=np.float64),
+        np.asarray(capacity_percent, dtype=np.float64),
+        default_capacity,
+    )
+    remaining = np.where(np.asarray(bin_full) > 0, 0.0, remaining)
+    return {
+        "rate": rate,
+        "trend": slope,
+        "capacity": capacity,
+        "remaining": remaining,
+        "days_to_full": days_until_full(remaining, rate, slope, horizon),
+        "history_days": np.count_nonzero(history > 0, axis=1),
+    }
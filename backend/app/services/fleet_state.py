@@ -0,0 +1,353 @@
+"""
+设备群状态聚合 - 设备统计概览和工作台告警共用
+
+设备统计原来每次请求对 devices 表执行 7 次 COUNT(*)。这里在进程内维护每台设备的
+状态快照，以及每个统计条件对应的设备 ID 集合，读取时直接取集合大小：
+    online       状态为 online 且 24 小时内有心跳
+    offline      状态为 offline、从未心跳或心跳超过 24 小时（工作台离线告警）
+    smoke_alert  烟感告警
+    full         仓体已满
+    using        使用中
+    low_battery  电量低于 20%
+
+更新：任何会话 flush 了 Device 的新增、修改或删除（状态上报、心跳、WebSocket 上下线、
+后台编辑），提交后按提交的列值更新聚合，回滚则丢弃。心跳超过 24 小时的设备由按到期时间
+排序的小顶堆在读取时转为离线，不需要扫描全部设备。
+
+校正：后台任务每 FLEET_STATE_RESYNC_SECONDS 从数据库全量重建一次。聚合是进程内的，
+多进程部署时其他进程的设备上报最长在一个校正周期后反映到本进程。
+verify() 用原来的 SQL 条件逐项比对 ID 集合，供一致性检查使用。
+"""
+import asyncio
+import heapq
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import event, inspect, select, or_, and_
+from sqlalchemy.orm import Session
+from loguru import logger
+
+from app.config import settings
+from app.db.database import AsyncSessionLocal
+from app.models.device import Device
+
+# 会话 info 中记录待应用设备快照的键
+_PENDING_KEY = "fleet_state_pending"
+
+# 聚合关心的列及新设备的默认值（与模型默认值一致）
+TRACKED_COLUMNS: Dict[str, Any] = {
+    "status": "offline",
+    "last_heartbeat": None,
+    "smoke_sensor_status": 0,
+    "recycle_bin_full": 0,
+    "is_using": 0,
+    "battery_level": None,
+}
+
+CONDITIONS = ("online", "offline", "smoke_alert", "full", "using", "low_battery")
+
+ONLINE_WINDOW = timedelta(hours=24)
+LOW_BATTERY_THRESHOLD = 20
+
+
+def _conditions(state: Dict[str, Any], now: datetime) -> Set[str]:
+    """设备当前满足的统计条件"""
+    heartbeat = state["last_heartbeat"]
+    fresh = heartbeat is not None and heartbeat >= now - ONLINE_WINDOW
+    flags = set()
+    if state["status"] == "online" and fresh:
+        flags.add("online")
+    if state["status"] == "offline" or not fresh:
+        flags.add("offline")
+    if state["smoke_sensor_status"] == 1:
+        flags.add("smoke_alert")
+    if state["recycle_bin_full"] == 1:
+        flags.add("full")
+    if state["is_using"] == 1:
+        flags.add("using")
+    if state["battery_level"] is not None and state["battery_level"] < LOW_BATTERY_THRESHOLD:
+        flags.add("low_battery")
+    return flags
+
+
+def _condition_clauses(now: datetime) -> Dict[str, Any]:
+    """与 _conditions 等价的 SQL 条件（全量校正和一致性检查使用）"""
+    threshold = now - ONLINE_WINDOW
+    return {
+        "online": and_(Device.status == "online", Device.last_heartbeat >= threshold),
+        "offline": or_(
+            Device.status == "offline",
+            Device.last_heartbeat == None,
+            Device.last_heartbeat < threshold
+        ),
+        "smoke_alert": Device.smoke_sensor_status == 1,
+        "full": Device.recycle_bin_full == 1,
+        "using": Device.is_using == 1,
+        "low_battery": and_(Device.battery_level != None, Device.battery_level < LOW_BATTERY_THRESHOLD),
+    }
+
+
+class FleetState:
+    """设备群状态聚合"""
+
+    def __init__(self, resync_interval: float):
+        self.resync_interval = resync_interval
+        self._devices: Dict[str, Dict[str, Any]] = {}
+        self._flags: Dict[str, Set[str]] = {}
+        self._sets: Dict[str, Set[str]] = {name: set() for name in CONDITIONS}
+        # (心跳到期时间, device_id)，到期后重新计算该设备的条件
+        self._expiry: List[Tuple[datetime, str]] = []
+        # 全量重建期间到达的更新，重建完成后重放
+        self._replay: Optional[List[Tuple[str, Optional[Dict[str, Any]]]]] = None
+        self._ready = False
+        self._sync_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        # 设备条件变化的订阅者（设备地图聚合等）
+        self._observers: List[Callable[[str, Set[str]], None]] = []
+        self._notify = True
+        self.metrics = {
+            "resyncs": 0,
+            "last_resync_at": None,
+            "last_resync_ms": None,
+            "last_resync_drift": None,
+            "updates": 0,
+            "expirations": 0,
+        }
+
+    # ---------- 生命周期 ----------
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"设备状态聚合已启动 (校正间隔: {self.resync_interval}秒)")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.resync()
+            except Exception as e:
+                logger.error(f"设备状态聚合校正失败: {e}", exc_info=True)
+            await asyncio.sleep(self.resync_interval)
+
+    async def ensure_ready(self) -> None:
+        """首次读取前确保已从数据库加载"""
+        if not self._ready:
+            await self.resync(if_not_ready=True)
+
+    def add_observer(self, callback: Callable[[str, Set[str]], None]) -> None:
+        """订阅设备条件变化: callback(device_id, 新条件集合)，包括心跳到期和全量校正带来的变化"""
+        self._observers.append(callback)
+
+    def _notify_observers(self, device_id: str, flags: Set[str]) -> None:
+        for callback in self._observers:
+            try:
+                callback(device_id, flags)
+            except Exception as e:
+                logger.error(f"设备状态订阅者处理失败: {e}", exc_info=True)
+
+    # ---------- 更新 ----------
+
+    def _set_flags(self, device_id: str, flags: Set[str]) -> None:
+        old = self._flags.get(device_id, set())
+        for name in old - flags:
+            self._sets[name].discard(device_id)
+        for name in flags - old:
+            self._sets[name].add(device_id)
+        if flags:
+            self._flags[device_id] = flags
+        else:
+            self._flags.pop(device_id, None)
+        if self._notify and flags != old:
+            self._notify_observers(device_id, flags)
+
+    def _push_expiry(self, device_id: str, heartbeat: Optional[datetime]) -> None:
+        if heartbeat is not None:
+            heapq.heappush(self._expiry, (heartbeat + ONLINE_WINDOW, device_id))
+            # 频繁心跳会留下大量过期条目，超过设备数的数倍时重建
+            if len(self._expiry) > 4 * len(self._devices) + 1024:
+                self._expiry = [
+                    (state["last_heartbeat"] + ONLINE_WINDOW, key)
+                    for key, state in self._devices.items()
+                    if state["last_heartbeat"] is not None
+                ]
+                heapq.heapify(self._expiry)
+
+    def apply(self, device_id: str, values: Optional[Dict[str, Any]]) -> None:
+        """应用一台设备已提交的列值，values 为 None 表示设备已删除"""
+        if self._replay is not None:
+            self._replay.append((device_id, values))
+        self._apply(device_id, values, datetime.now())
+        self.metrics["updates"] += 1
+
+    def _apply(self, device_id: str, values: Optional[Dict[str, Any]], now: datetime) -> None:
+        if values is None:
+            self._devices.pop(device_id, None)
+            self._set_flags(device_id, set())
+            return
+        state = self._devices.get(device_id)
+        if state is None:
+            state = self._devices[device_id] = dict(TRACKED_COLUMNS)
+        state.update(values)
+        self._set_flags(device_id, _conditions(state, now))
+        if "last_heartbeat" in values:
+            self._push_expiry(device_id, state["last_heartbeat"])
+
+    def _expire(self, now: datetime) -> None:
+        """心跳到期的设备重新计算条件（在线 → 离线）"""
+        while self._expiry and self._expiry[0][0] < now:
+            _, device_id = heapq.heappop(self._expiry)
+            state = self._devices.get(device_id)
+            if state is not None:
+                self._set_flags(device_id, _conditions(state, now))
+                self.metrics["expirations"] += 1
+
+    async def resync(self, if_not_ready: bool = False) -> None:
+        """从数据库全量重建"""
+        async with self._sync_lock:
+            # 并发的首次读取只需要一个去加载
+            if if_not_ready and self._ready:
+                return
+            started = time.perf_counter()
+            self._replay = []
+            try:
+                async with AsyncSessionLocal() as db:
+                    rows = (await db.execute(
+                        select(Device.device_id, *(getattr(Device, name) for name in TRACKED_COLUMNS))
+                    )).all()
+                now = datetime.now()
+                self._expire(now)
+                before = {name: set(ids) for name, ids in self._sets.items()}
+                old_flags = self._flags
+
+                self._devices = {}
+                self._flags = {}
+                self._sets = {name: set() for name in CONDITIONS}
+                self._expiry = []
+                # 重建过程中不逐台通知，重建完成后只通知有变化的设备
+                self._notify = False
+                try:
+                    for row in rows:
+                        self._apply(row[0], dict(zip(TRACKED_COLUMNS, row[1:])), now)
+                    # 查询期间提交的更新比查询结果新，重放一遍
+                    for device_id, values in self._replay:
+                        self._apply(device_id, values, now)
+                finally:
+                    self._notify = True
+            finally:
+                self._replay = None
+
+            if self._observers:
+                for device_id in old_flags.keys() | self._flags.keys():
+                    flags = self._flags.get(device_id, set())
+                    if old_flags.get(device_id, set()) != flags:
+                        self._notify_observers(device_id, flags)
+
+            drift = sum(len(before[name] ^ self._sets[name]) for name in CONDITIONS) if self._ready else 0
+            if drift:
+                logger.warning(f"设备状态聚合校正: {drift} 处与数据库不一致已修正")
+            self._ready = True
+            self.metrics.update(
+                resyncs=self.metrics["resyncs"] + 1,
+                last_resync_at=now.strftime("%Y-%m-%d %H:%M:%S"),
+                last_resync_ms=round((time.perf_counter() - started) * 1000, 1),
+                last_resync_drift=drift,
+            )
+
+    # ---------- 读取 ----------
+
+    def counts(self) -> Dict[str, int]:
+        """各条件设备数及设备总数"""
+        self._expire(datetime.now())
+        return {"total": len(self._devices), **{name: len(ids) for name, ids in self._sets.items()}}
+
+    def expire(self) -> None:
+        """处理已到期的心跳（订阅者读取自己的聚合前调用，到期变化通过订阅回调送达）"""
+        self._expire(datetime.now())
+
+    def flags(self, device_id: str) -> Set[str]:
+        """设备当前满足的条件（只读）"""
+        self._expire(datetime.now())
+        return self._flags.get(device_id, set())
+
+    def device_ids(self, condition: str) -> Set[str]:
+        """满足某条件的设备 ID（只读）"""
+        self._expire(datetime.now())
+        return self._sets[condition]
+
+    def stats(self) -> dict:
+        return {
+            "running": self._task is not None,
+            "ready": self._ready,
+            "devices": len(self._devices),
+            "expiry_heap": len(self._expiry),
+            **self.metrics,
+        }
+
+    async def verify(self) -> Dict[str, Dict[str, List[str]]]:
+        """
+        与数据库逐条件比对 ID 集合
+
+        Returns:
+            {条件: {"missing": 数据库有而聚合没有, "extra": 聚合有而数据库没有}}，一致时为空
+        """
+        await self.ensure_ready()
+        now = datetime.now()
+        async with AsyncSessionLocal() as db:
+            expected = {
+                name: set((await db.execute(select(Device.device_id).where(clause))).scalars().all())
+                for name, clause in _condition_clauses(now).items()
+            }
+            expected["total"] = set((await db.execute(select(Device.device_id))).scalars().all())
+        self._expire(now)
+        actual = {**self._sets, "total": set(self._devices)}
+
+        mismatches = {}
+        for name, ids in expected.items():
+            missing, extra = ids - actual[name], actual[name] - ids
+            if missing or extra:
+                mismatches[name] = {"missing": sorted(missing), "extra": sorted(extra)}
+        return mismatches
+
+
+# 全局实例
+fleet_state = FleetState(resync_interval=settings.FLEET_STATE_RESYNC_SECONDS)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_devices(session: Session, flush_context) -> None:
+    """flush 时记录设备的新列值，提交后再应用"""
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if not isinstance(obj, Device) or not obj.device_id:
+            continue
+        pending = session.info.setdefault(_PENDING_KEY, {})
+        if obj in session.deleted:
+            pending[obj.device_id] = None
+            continue
+        # 只取已加载的列，未加载的沿用聚合中的旧值
+        loaded = inspect(obj).dict
+        values = pending.get(obj.device_id) or {}
+        values.update({name: loaded[name] for name in TRACKED_COLUMNS if name in loaded})
+        pending[obj.device_id] = values
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_committed_devices(session: Session) -> None:
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        for device_id, values in pending.items():
+            fleet_state.apply(device_id, values)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_devices(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
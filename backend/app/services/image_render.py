@@ -0,0 +1,83 @@
+"""
+摄像头图片衍生图生成（在图片处理子进程中执行）
+
+本模块只依赖 Pillow 和标准库，不导入应用配置和数据库，子进程以 spawn 方式启动时加载很快。
+"""
+import base64
+import io
+from typing import List, Optional, Tuple
+
+# (类型, Content-Type, 宽, 高, 数据)
+Rendition = Tuple[str, str, int, int, bytes]
+
+_MEDIA_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+
+def _encode(image, fmt: str, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    if fmt == "WEBP":
+        image.save(buffer, format="WEBP", quality=quality, method=4)
+    else:
+        image.save(buffer, format="JPEG", quality=quality, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def render_variants(
+    image_data: str,
+    thumb_size: int,
+    thumb_format: str,
+    thumb_quality: int,
+    archive_max_edge: int,
+    archive_format: str,
+    archive_quality: int,
+) -> List[Rendition]:
+    """
+    由 Base64 原图生成缩略图和存档图
+
+    存档图不比原图小时不生成，查看大图时继续使用原图。
+
+    Raises:
+        ValueError / OSError: 原图无法解码
+    """
+    from PIL import Image, ImageOps
+
+    if image_data.startswith("data:"):
+        image_data = image_data.partition(",")[2]
+    original = base64.b64decode(image_data)
+
+    with Image.open(io.BytesIO(original)) as source:
+        image = ImageOps.exif_transpose(source)
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        renditions: List[Rendition] = []
+
+        thumb_format = thumb_format.upper()
+        thumb = image.copy()
+        thumb.thumbnail((thumb_size, thumb_size), Image.LANCZOS)
+        renditions.append((
+            "thumb", _MEDIA_TYPES[thumb_format], thumb.width, thumb.height,
+            _encode(thumb, thumb_format, thumb_quality)
+        ))
+
+        archive_format = archive_format.upper()
+        archive = image
+        if archive_max_edge and max(image.size) > archive_max_edge:
+            archive = image.copy()
+            archive.thumbnail((archive_max_edge, archive_max_edge), Image.LANCZOS)
+        archive_bytes = _encode(archive, archive_format, archive_quality)
+        if len(archive_bytes) < len(original):
+            renditions.append((
+                "archive", _MEDIA_TYPES[archive_format], archive.width, archive.height, archive_bytes
+            ))
+
+    return renditions
+
+
+def pillow_available() -> Optional[str]:
+    """Pillow 版本号，未安装时返回 None"""
+    try:
+        import PIL
+    except ImportError:
+        return None
+    return PIL.__version__
@@ -0,0 +1,308 @@
+"""
+摄像头图片衍生图 worker
+
+设备上报只写入原图（variant_status 默认 pending），上报接口不做任何图片处理；
+本 worker 在后台领取待处理图片，在进程池中生成缩略图和存档图后写入
+device_camera_image_variants：
+
+1. 按 (variant_status, variant_next_attempt_at) 索引领取一批到期的 pending 图片，
+   以及租约过期的 processing 图片（处理进程异常退出），置为 processing 并设置租约
+2. 原图交给 ProcessPoolExecutor 解码、缩放、编码，Pillow 的计算不占用事件循环
+3. 一个事务写入衍生图并置为 done；失败的图片按指数退避重新置为 pending，
+   达到 IMAGE_VARIANT_MAX_ATTEMPTS 后置为 failed（后台继续显示原图）；
+   子进程崩溃（BrokenProcessPool）时逐张重新处理受影响的图片，只有导致崩溃的图片计入尝试次数
+
+领取使用 SKIP LOCKED，多进程同时运行互不重复。
+"""
+import asyncio
+import multiprocessing
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Deque, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update, or_, and_
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from loguru import logger
+
+from app.config import settings
+from app.db.database import AsyncSessionLocal
+from app.models.device_camera import DeviceCameraImage, DeviceCameraImageVariant, ImageVariantStatus
+from app.services.image_render import render_variants, pillow_available
+
+# 吞吐统计窗口（秒）
+THROUGHPUT_WINDOW = 60.0
+
+
+class ImageVariantWorker:
+    """摄像头图片衍生图 worker"""
+
+    def __init__(
+        self,
+        processes: int,
+        batch_size: int,
+        poll_interval: float,
+        max_attempts: int,
+        retry_backoff: float,
+        lease_seconds: float,
+    ):
+        self.processes = processes
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.lease_seconds = lease_seconds
+        self._render = partial(
+            render_variants,
+            thumb_size=settings.IMAGE_THUMBNAIL_SIZE,
+            thumb_format=settings.IMAGE_THUMBNAIL_FORMAT,
+            thumb_quality=settings.IMAGE_THUMBNAIL_QUALITY,
+            archive_max_edge=settings.IMAGE_ARCHIVE_MAX_EDGE,
+            archive_format=settings.IMAGE_ARCHIVE_FORMAT,
+            archive_quality=settings.IMAGE_ARCHIVE_QUALITY,
+        )
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+        self._completed_at: Deque[float] = deque()
+        self.in_flight = 0
+        self.processed = 0
+        self.retried = 0
+        self.failed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.render_ms = 0.0
+
+    def notify(self) -> None:
+        """有新图片时唤醒"""
+        self._wakeup.set()
+
+    async def start(self) -> None:
+        if self._running:
+            return
+        version = pillow_available()
+        if version is None:
+            logger.warning("未安装 Pillow，图片处理 worker 不启动（后台继续显示原图）")
+            return
+        self._running = True
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"图片处理 worker 已启动 (进程数: {self.processes}, 批次: {self.batch_size}, Pillow {version})")
+
+    async def stop(self) -> None:
+        self._running = False
+        self._wakeup.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        logger.info("图片处理 worker 已停止")
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn：不继承主进程的事件循环、数据库连接和线程
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processes,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        while self._completed_at and self._completed_at[0] < now - THROUGHPUT_WINDOW:
+            self._completed_at.popleft()
+        return {
+            "running": self._running,
+            "processes": self.processes,
+            "in_flight": self.in_flight,
+            "processed": self.processed,
+            "retried": self.retried,
+            "failed": self.failed,
+            "images_per_minute": len(self._completed_at),
+            "avg_render_ms": round(self.render_ms / self.processed, 1) if self.processed else None,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "compression_ratio": round(self.bytes_out / self.bytes_in, 3) if self.bytes_in else None,
+        }
+
+    async def _run(self) -> None:
+        while self._running:
+            claimed = 0
+            try:
+                jobs = await self.claim()
+                claimed = len(jobs)
+                if jobs:
+                    await self.process(jobs)
+            except Exception as e:
+                logger.error(f"图片处理 worker 异常: {e}", exc_info=True)
+
+            # 领满一批说明还有积压，立即继续
+            if claimed >= self.batch_size:
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def claim(self) -> List[Tuple[int, int, str]]:
+        """
+        领取一批到期图片并置为 processing
+
+        Returns:
+            [(图片ID, 已处理次数, Base64 原图)]
+        """
+        async with AsyncSessionLocal() as db:
+            now = datetime.now()
+            rows = (await db.execute(
+                select(DeviceCameraImage.id, DeviceCameraImage.variant_attempts, DeviceCameraImage.image_data)
+                .where(or_(
+                    and_(
+                        DeviceCameraImage.variant_status == ImageVariantStatus.PENDING.value,
+                        or_(
+                            DeviceCameraImage.variant_next_attempt_at == None,
+                            DeviceCameraImage.variant_next_attempt_at <= now
+                        )
+                    ),
+                    and_(
+                        DeviceCameraImage.variant_status == ImageVariantStatus.PROCESSING.value,
+                        DeviceCameraImage.variant_next_attempt_at < now
+                    )
+                ))
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )).all()
+            if not rows:
+                return []
+            await db.execute(
+                update(DeviceCameraImage)
+                .where(DeviceCameraImage.id.in_([row[0] for row in rows]))
+                .values(
+                    variant_status=ImageVariantStatus.PROCESSING.value,
+                    variant_next_attempt_at=now + timedelta(seconds=self.lease_seconds)
+                )
+            )
+            await db.commit()
+        return [(row[0], row[1] or 0, row[2]) for row in rows]
+
+    async def _render_one(self, image_id: int, image_data: str):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        self.in_flight += 1
+        try:
+            renditions = await loop.run_in_executor(self.executor, self._render, image_data)
+        except BrokenProcessPool:
+            # 子进程被杀（如内存不足），丢弃进程池，下次使用时重建
+            self._executor = None
+            raise
+        finally:
+            self.in_flight -= 1
+        self.render_ms += (time.perf_counter() - started) * 1000
+        return renditions
+
+    async def process(self, jobs: List[Tuple[int, int, str]]) -> None:
+        """生成一批图片的衍生图并回写"""
+        results = await asyncio.gather(
+            *(self._render_one(image_id, image_data) for image_id, _, image_data in jobs),
+            return_exceptions=True
+        )
+
+        # 子进程崩溃会让进程池内所有在途任务失败，无法区分是哪张图片导致的：
+        # 逐张重新处理这些图片，单独处理仍然崩溃的才计入尝试次数
+        suspects = [i for i, result in enumerate(results) if isinstance(result, BrokenProcessPool)]
+        if len(suspects) > 1:
+            logger.warning(f"图片处理进程池崩溃，逐张重新处理 {len(suspects)} 张图片")
+            for i in suspects:
+                image_id, _, image_data = jobs[i]
+                try:
+                    results[i] = await self._render_one(image_id, image_data)
+                except Exception as e:
+                    results[i] = e
+
+        now = datetime.now()
+        done: List[int] = []
+        variant_rows: List[Dict] = []
+        retry: Dict[int, Tuple[str, int]] = {}
+        for (image_id, attempts, image_data), result in zip(jobs, results):
+            if isinstance(result, BaseException):
+                retry[image_id] = (repr(result), attempts + 1)
+                continue
+            done.append(image_id)
+            self.bytes_in += len(image_data) * 3 // 4
+            for variant, media_type, width, height, data in result:
+                self.bytes_out += len(data)
+                variant_rows.append({
+                    "image_id": image_id,
+                    "variant": variant,
+                    "media_type": media_type,
+                    "width": width,
+                    "height": height,
+                    "size": len(data),
+                    "data": data,
+                })
+
+        async with AsyncSessionLocal() as db:
+            if variant_rows:
+                stmt = mysql_insert(DeviceCameraImageVariant).values(variant_rows)
+                stmt = stmt.on_duplicate_key_update({
+                    name: stmt.inserted[name] for name in ("media_type", "width", "height", "size", "data")
+                })
+                await db.execute(stmt)
+            if done:
+                await db.execute(
+                    update(DeviceCameraImage)
+                    .where(DeviceCameraImage.id.in_(done))
+                    .values(
+                        variant_status=ImageVariantStatus.DONE.value,
+                        variant_attempts=DeviceCameraImage.variant_attempts + 1,
+                        variant_next_attempt_at=None
+                    )
+                )
+            for image_id, (error, attempts) in retry.items():
+                exhausted = attempts >= self.max_attempts
+                await db.execute(
+                    update(DeviceCameraImage)
+                    .where(DeviceCameraImage.id == image_id)
+                    .values(
+                        variant_status=(
+                            ImageVariantStatus.FAILED.value if exhausted else ImageVariantStatus.PENDING.value
+                        ),
+                        variant_attempts=attempts,
+                        variant_next_attempt_at=(
+                            None if exhausted
+                            else now + timedelta(seconds=self.retry_backoff * 2 ** (attempts - 1))
+                        )
+                    )
+                )
+                if exhausted:
+                    self.failed += 1
+                    logger.warning(f"摄像头图片 {image_id} 衍生图生成失败，已放弃: {error}")
+                else:
+                    self.retried += 1
+                    logger.info(f"摄像头图片 {image_id} 衍生图生成失败，第 {attempts} 次，稍后重试: {error}")
+            await db.commit()
+
+        self.processed += len(done)
+        completed_at = time.monotonic()
+        self._completed_at.extend([completed_at] * len(done))
+
+
+# 全局实例
+image_variant_worker = ImageVariantWorker(
+    processes=settings.IMAGE_VARIANT_PROCESSES,
+    batch_size=settings.IMAGE_VARIANT_BATCH_SIZE,
+    poll_interval=settings.IMAGE_VARIANT_POLL_INTERVAL_SECONDS,
+    max_attempts=settings.IMAGE_VARIANT_MAX_ATTEMPTS,
+    retry_backoff=settings.IMAGE_VARIANT_RETRY_BACKOFF_SECONDS,
+    lease_seconds=settings.IMAGE_VARIANT_LEASE_SECONDS,
+)
@@ -0,0 +1,363 @@
+"""
+钱包账本服务 - 复式记账、余额快照与对账
+
+所有金额以整数分记账，避免浮点累计误差。业务代码在修改 User.balance /
+frozen_balance 的同一事务中调用本服务记账，两者由对账任务交叉校验。
+
+同一用户的记账通过对 users 行加锁（SELECT ... FOR UPDATE）串行化，
+保证快照的 last_entry_id 之前不会再出现未提交的分录。
+"""
+import asyncio
+from dataclasses import dataclass, field
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, func, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from loguru import logger
+
+from app.db.database import AsyncSessionLocal
+from app.models.ledger import LedgerEntry, LedgerBalanceSnapshot
+from app.models.user import User
+from app.utils.id_generator import generate_id
+
+# 科目
+ACCOUNT_AVAILABLE = "user_available"
+ACCOUNT_FROZEN = "user_frozen"
+ACCOUNT_OPENING = "platform_opening"      # 账本上线前的期初余额
+ACCOUNT_RECYCLE = "platform_recycle"      # 回收收入来源
+ACCOUNT_PAYOUT = "platform_payout"        # 提现出款
+USER_ACCOUNTS = (ACCOUNT_AVAILABLE, ACCOUNT_FROZEN)
+
+# 某用户自上次快照后累计多少条分录时生成新快照
+SNAPSHOT_INTERVAL = 50
+
+
+def yuan_to_cents(amount: float) -> int:
+    """元转分（四舍五入到分）"""
+    return int((Decimal(str(amount)) * 100).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+
+def cents_to_yuan(cents: int) -> float:
+    """分转元"""
+    return float(Decimal(cents) / 100)
+
+
+@dataclass
+class LedgerBalance:
+    """账本余额（分）"""
+    available_cents: int = 0
+    frozen_cents: int = 0
+    last_entry_id: int = 0
+    entries_since_snapshot: int = 0
+
+    @property
+    def total_cents(self) -> int:
+        return self.available_cents + self.frozen_cents
+
+
+@dataclass
+class ReconcileReport:
+    """对账结果"""
+    checked_users: int = 0
+    mismatches: List[dict] = field(default_factory=list)
+    unbalanced_txns: List[str] = field(default_factory=list)
+
+    @property
+    def ok(self) -> bool:
+        return not self.mismatches and not self.unbalanced_txns
+
+
+class LedgerService:
+    """账本服务"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def lock_user(self, user_id: str) -> Optional[User]:
+        """
+        锁定用户行并刷新内存中的用户对象
+
+        资金操作开始时调用，之后再修改 User.balance，避免并发请求基于旧值计算。
+        """
+        result = await self.db.execute(
+            select(User)
+            .where(User.user_id == user_id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+        return result.scalar_one_or_none()
+
+    async def post(
+        self,
+        txn_type: str,
+        user_id: str,
+        legs: List[Tuple[str, int]],
+        ref_id: Optional[str] = None
+    ) -> str:
+        """
+        记一笔交易
+
+        Args:
+            txn_type: 交易类型
+            user_id: 用户ID
+            legs: [(科目, 金额分), ...]，金额之和必须为0
+            ref_id: 关联业务单号
+
+        Returns:
+            交易ID
+        """
+        if sum(amount for _, amount in legs) != 0:
+            raise ValueError(f"分录不平衡: {legs}")
+
+        # 串行化同一用户的记账（同一事务内重复加锁无额外开销）
+        await self.db.execute(
+            select(User.id).where(User.user_id == user_id).with_for_update()
+        )
+
+        txn_id = generate_id("TX")
+        for account, amount in legs:
+            if amount == 0:
+                continue
+            self.db.add(LedgerEntry(
+                txn_id=txn_id,
+                txn_type=txn_type,
+                user_id=user_id,
+                account=account,
+                amount_cents=amount,
+                ref_id=ref_id
+            ))
+        await self.db.flush()
+
+        await self.maybe_snapshot(user_id)
+        return txn_id
+
+    async def record_income(self, user_id: str, amount: float, order_id: str) -> str:
+        """回收收入入账: 平台回收科目 → 用户可用"""
+        cents = yuan_to_cents(amount)
+        return await self.post("income", user_id, [
+            (ACCOUNT_RECYCLE, -cents),
+            (ACCOUNT_AVAILABLE, cents),
+        ], ref_id=order_id)
+
+    async def record_freeze(self, user_id: str, amount: float, withdraw_id: str) -> str:
+        """提现冻结: 用户可用 → 用户冻结"""
+        cents = yuan_to_cents(amount)
+        return await self.post("freeze", user_id, [
+            (ACCOUNT_AVAILABLE, -cents),
+            (ACCOUNT_FROZEN, cents),
+        ], ref_id=withdraw_id)
+
+    async def record_unfreeze(self, user_id: str, amount: float, withdraw_id: str) -> str:
+        """提现失败解冻: 用户冻结 → 用户可用"""
+        cents = yuan_to_cents(amount)
+        return await self.post("unfreeze", user_id, [
+            (ACCOUNT_FROZEN, -cents),
+            (ACCOUNT_AVAILABLE, cents),
+        ], ref_id=withdraw_id)
+
+    async def record_withdraw(self, user_id: str, amount: float, withdraw_id: str) -> str:
+        """提现出款: 用户冻结 → 平台出款科目"""
+        cents = yuan_to_cents(amount)
+        return await self.post("withdraw", user_id, [
+            (ACCOUNT_FROZEN, -cents),
+            (ACCOUNT_PAYOUT, cents),
+        ], ref_id=withdraw_id)
+
+    async def get_balance(self, user_id: str) -> LedgerBalance:
+        """重建用户余额: 最近快照 + 快照之后的分录"""
+        snapshot = (await self.db.execute(
+            select(LedgerBalanceSnapshot)
+            .where(LedgerBalanceSnapshot.user_id == user_id)
+            .order_by(LedgerBalanceSnapshot.last_entry_id.desc())
+            .limit(1)
+        )).scalar_one_or_none()
+
+        balance = LedgerBalance()
+        if snapshot:
+            balance.available_cents = snapshot.available_cents
+            balance.frozen_cents = snapshot.frozen_cents
+            balance.last_entry_id = snapshot.last_entry_id
+
+        rows = (await self.db.execute(
+            select(
+                LedgerEntry.account,
+                func.sum(LedgerEntry.amount_cents),
+                func.count(LedgerEntry.id),
+                func.max(LedgerEntry.id)
+            )
+            .where(
+                LedgerEntry.user_id == user_id,
+                LedgerEntry.id > balance.last_entry_id
+            )
+            .group_by(LedgerEntry.account)
+        )).all()
+
+        last_entry_id = balance.last_entry_id
+        for account, amount, count, max_id in rows:
+            balance.entries_since_snapshot += count
+            last_entry_id = max(last_entry_id, max_id)
+            if account == ACCOUNT_AVAILABLE:
+                balance.available_cents += int(amount)
+            elif account == ACCOUNT_FROZEN:
+                balance.frozen_cents += int(amount)
+        balance.last_entry_id = last_entry_id
+        return balance
+
+    async def take_snapshot(self, user_id: str) -> LedgerBalanceSnapshot:
+        """为用户生成余额快照（调用方需持有用户行锁或在对账时离线执行）"""
+        balance = await self.get_balance(user_id)
+        snapshot = LedgerBalanceSnapshot(
+            user_id=user_id,
+            available_cents=balance.available_cents,
+            frozen_cents=balance.frozen_cents,
+            last_entry_id=balance.last_entry_id
+        )
+        self.db.add(snapshot)
+        await self.db.flush()
+        return snapshot
+
+    async def maybe_snapshot(self, user_id: str) -> None:
+        """自上次快照后分录数达到阈值时生成快照"""
+        last_entry_id = (await self.db.execute(
+            select(func.coalesce(func.max(LedgerBalanceSnapshot.last_entry_id), 0))
+            .where(LedgerBalanceSnapshot.user_id == user_id)
+        )).scalar()
+        pending = (await self.db.execute(
+            select(func.count(LedgerEntry.id)).where(
+                LedgerEntry.user_id == user_id,
+                LedgerEntry.id > last_entry_id
+            )
+        )).scalar() or 0
+        if pending >= SNAPSHOT_INTERVAL:
+            await self.take_snapshot(user_id)
+
+
+# ============================================================
+# 批量对账
+# ============================================================
+
+async def _ledger_balances(db: AsyncSession, user_ids: List[str]) -> Dict[str, LedgerBalance]:
+    """批量重建一组用户的账本余额（两次查询）"""
+    latest = (
+        select(
+            LedgerBalanceSnapshot.user_id,
+            func.max(LedgerBalanceSnapshot.last_entry_id).label("last_entry_id")
+        )
+        .where(LedgerBalanceSnapshot.user_id.in_(user_ids))
+        .group_by(LedgerBalanceSnapshot.user_id)
+        .subquery()
+    )
+
+    balances = {uid: LedgerBalance() for uid in user_ids}
+    snapshots = (await db.execute(
+        select(LedgerBalanceSnapshot).join(
+            latest,
+            and_(
+                LedgerBalanceSnapshot.user_id == latest.c.user_id,
+                LedgerBalanceSnapshot.last_entry_id == latest.c.last_entry_id
+            )
+        )
+    )).scalars().all()
+    for snap in snapshots:
+        b = balances[snap.user_id]
+        b.available_cents = snap.available_cents
+        b.frozen_cents = snap.frozen_cents
+        b.last_entry_id = snap.last_entry_id
+
+    rows = (await db.execute(
+        select(
+            LedgerEntry.user_id,
+            LedgerEntry.account,
+            func.sum(LedgerEntry.amount_cents)
+        )
+        .outerjoin(latest, LedgerEntry.user_id == latest.c.user_id)
+        .where(
+            LedgerEntry.user_id.in_(user_ids),
+            LedgerEntry.account.in_(USER_ACCOUNTS),
+            LedgerEntry.id > func.coalesce(latest.c.last_entry_id, 0)
+        )
+        .group_by(LedgerEntry.user_id, LedgerEntry.account)
+    )).all()
+    for user_id, account, amount in rows:
+        if account == ACCOUNT_AVAILABLE:
+            balances[user_id].available_cents += int(amount)
+        else:
+            balances[user_id].frozen_cents += int(amount)
+    return balances
+
+
+async def reconcile_chunk(min_id: int, max_id: int) -> ReconcileReport:
+    """对账 users.id 在 [min_id, max_id) 区间的用户"""
+    report = ReconcileReport()
+    async with AsyncSessionLocal() as db:
+        users = (await db.execute(
+            select(User.user_id, User.balance, User.frozen_balance)
+            .where(User.id >= min_id, User.id < max_id)
+        )).all()
+        if not users:
+            return report
+
+        balances = await _ledger_balances(db, [u.user_id for u in users])
+        for user_id, balance, frozen in users:
+            expected_total = yuan_to_cents(balance or 0)
+            expected_frozen = yuan_to_cents(frozen or 0)
+            ledger = balances[user_id]
+            if ledger.total_cents != expected_total or ledger.frozen_cents != expected_frozen:
+                report.mismatches.append({
+                    "user_id": user_id,
+                    "balance_cents": expected_total,
+                    "frozen_cents": expected_frozen,
+                    "ledger_balance_cents": ledger.total_cents,
+                    "ledger_frozen_cents": ledger.frozen_cents,
+                })
+        report.checked_users = len(users)
+    return report
+
+
+async def find_unbalanced_transactions(limit: int = 100) -> List[str]:
+    """查找分录之和不为0的交易（复式记账不变量）"""
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(
+            select(LedgerEntry.txn_id)
+            .group_by(LedgerEntry.txn_id)
+            .having(func.sum(LedgerEntry.amount_cents) != 0)
+            .limit(limit)
+        )).all()
+    return [row[0] for row in rows]
+
+
+async def reconcile_all(chunk_size: int = 1000, concurrency: int = 4) -> ReconcileReport:
+    """
+    全量对账：按 users.id 分块，多个分块并行校验
+
+    Args:
+        chunk_size: 每块用户数（按主键区间划分）
+        concurrency: 并行分块数（每块占用一个数据库连接）
+    """
+    async with AsyncSessionLocal() as db:
+        min_id, max_id = (await db.execute(select(func.min(User.id), func.max(User.id)))).one()
+
+    report = ReconcileReport()
+    if min_id is None:
+        return report
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(lo: int) -> ReconcileReport:
+        async with semaphore:
+            return await reconcile_chunk(lo, lo + chunk_size)
+
+    chunk_reports = await asyncio.gather(*[
+        run(lo) for lo in range(min_id, max_id + 1, chunk_size)
+    ])
+    for chunk in chunk_reports:
+        report.checked_users += chunk.checked_users
+        report.mismatches.extend(chunk.mismatches)
+
+    report.unbalanced_txns = await find_unbalanced_transactions()
+    logger.info(
+        f"钱包对账完成: 用户={report.checked_users}, "
+        f"余额不一致={len(report.mismatches)}, 不平衡交易={len(report.unbalanced_txns)}"
+    )
+    return report
@@ -0,0 +1,160 @@
+"""
+订单按日汇总服务
+
+写入：订单创建、领取时在同一事务内用 INSERT ... ON DUPLICATE KEY UPDATE 累加汇总行，
+与订单一起提交或回滚，不会出现汇总与明细不一致。
+读取：管理后台列表、详情、工作台图表按设备/日期读取汇总行。
+回填：rebuild_day() 按天从 delivery_orders 重算，供 scripts/backfill_order_stats.py 使用。
+"""
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Tuple
+
+from sqlalchemy import select, delete, func, case
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.order import DeliveryOrder
+from app.models.order_stats import OrderDailyDeviceStat, OrderDailyStat
+
+COUNTER_COLUMNS = ("order_count", "total_weight", "total_amount", "claimed_count", "claimed_amount")
+
+
+async def _increment(db: AsyncSession, device_id: str, stat_date, **deltas) -> None:
+    """累加设备日汇总和全局日汇总"""
+    for model, key in (
+        (OrderDailyDeviceStat, {"device_id": device_id, "stat_date": stat_date}),
+        (OrderDailyStat, {"stat_date": stat_date}),
+    ):
+        stmt = mysql_insert(model).values(**key, **deltas)
+        stmt = stmt.on_duplicate_key_update({
+            name: model.__table__.c[name] + stmt.inserted[name] for name in deltas
+        })
+        await db.execute(stmt)
+
+
+async def record_order_created(db: AsyncSession, order: DeliveryOrder) -> None:
+    """订单创建（与订单插入同一事务）"""
+    # 与 created_at 的 server_default 一样取数据库当前日期，避免应用与数据库时钟不一致
+    await _increment(
+        db, order.device_id, func.curdate(),
+        order_count=1,
+        total_weight=order.weight,
+        total_amount=order.amount
+    )
+
+
+async def record_order_claimed(db: AsyncSession, order: DeliveryOrder) -> None:
+    """订单领取（与领取同一事务），计入订单创建日"""
+    await _increment(
+        db, order.device_id, order.created_at.date(),
+        claimed_count=1,
+        claimed_amount=order.amount
+    )
+
+
+# ============================================================
+# 读取
+# ============================================================
+
+async def device_totals(db: AsyncSession, device_ids: List[str]) -> Dict[str, Tuple[int, float, float]]:
+    """多个设备的累计 (订单数, 重量, 金额)，一条查询"""
+    if not device_ids:
+        return {}
+    result = await db.execute(
+        select(
+            OrderDailyDeviceStat.device_id,
+            func.sum(OrderDailyDeviceStat.order_count),
+            func.sum(OrderDailyDeviceStat.total_weight),
+            func.sum(OrderDailyDeviceStat.total_amount)
+        )
+        .where(OrderDailyDeviceStat.device_id.in_(device_ids))
+        .group_by(OrderDailyDeviceStat.device_id)
+    )
+    return {
+        device_id: (int(count or 0), float(weight or 0), float(amount or 0))
+        for device_id, count, weight, amount in result.all()
+    }
+
+
+def _by_day(rows) -> Dict[date, Tuple[int, float, float]]:
+    return {day: (int(count), float(weight), float(amount)) for day, count, weight, amount in rows}
+
+
+async def device_daily(
+    db: AsyncSession,
+    device_id: str,
+    start: date,
+    end: date
+) -> Dict[date, Tuple[int, float, float]]:
+    """单个设备 [start, end] 每日 (订单数, 重量, 金额)"""
+    result = await db.execute(
+        select(
+            OrderDailyDeviceStat.stat_date,
+            OrderDailyDeviceStat.order_count,
+            OrderDailyDeviceStat.total_weight,
+            OrderDailyDeviceStat.total_amount
+        ).where(
+            OrderDailyDeviceStat.device_id == device_id,
+            OrderDailyDeviceStat.stat_date.between(start, end)
+        )
+    )
+    return _by_day(result.all())
+
+
+async def global_daily(db: AsyncSession, start: date, end: date) -> Dict[date, Tuple[int, float, float]]:
+    """全局 [start, end] 每日 (订单数, 重量, 金额)"""
+    result = await db.execute(
+        select(
+            OrderDailyStat.stat_date,
+            OrderDailyStat.order_count,
+            OrderDailyStat.total_weight,
+            OrderDailyStat.total_amount
+        ).where(OrderDailyStat.stat_date.between(start, end))
+    )
+    return _by_day(result.all())
+
+
+# ============================================================
+# 回填
+# ============================================================
+
+async def rebuild_day(db: AsyncSession, day: date) -> int:
+    """
+    从 delivery_orders 重算某一天的汇总行（调用方负责提交事务）
+
+    用加锁读（FOR SHARE）统计当天订单，提交前当天的新订单和领取会等待，
+    提交后再在重算结果上累加，因此可以在服务运行期间执行。
+
+    Returns:
+        当天有订单的设备数
+    """
+    day_start = datetime.combine(day, datetime.min.time())
+    day_end = day_start + timedelta(days=1)
+    in_day = (DeliveryOrder.created_at >= day_start, DeliveryOrder.created_at < day_end)
+    claimed = DeliveryOrder.status == 1
+
+    # 加锁读锁住当天的订单和区间间隙，随后的一致性读能看到全部已提交订单
+    await db.execute(select(DeliveryOrder.id).where(*in_day).with_for_update(read=True))
+    result = await db.execute(
+        select(
+            DeliveryOrder.device_id,
+            func.count(DeliveryOrder.id),
+            func.coalesce(func.sum(DeliveryOrder.weight), 0),
+            func.coalesce(func.sum(DeliveryOrder.amount), 0),
+            func.count(case((claimed, 1))),
+            func.coalesce(func.sum(case((claimed, DeliveryOrder.amount), else_=0)), 0)
+        )
+        .where(*in_day)
+        .group_by(DeliveryOrder.device_id)
+    )
+    rows = [dict(zip(("device_id",) + COUNTER_COLUMNS, row)) for row in result.all()]
+
+    await db.execute(delete(OrderDailyDeviceStat).where(OrderDailyDeviceStat.stat_date == day))
+    await db.execute(delete(OrderDailyStat).where(OrderDailyStat.stat_date == day))
+    if rows:
+        await db.execute(mysql_insert(OrderDailyDeviceStat).values([{**row, "stat_date": day} for row in rows]))
+        await db.execute(mysql_insert(OrderDailyStat).values(
+            stat_date=day,
+            **{name: sum(row[name] for row in rows) for name in COUNTER_COLUMNS}
+        ))
+    return len(rows)
@@ -0,0 +1,95 @@
+"""
+密码哈希服务
+
+bcrypt 每次哈希/校验耗时数十毫秒，直接在异步接口中调用会阻塞事件循环，
+同一 worker 上的设备 WebSocket 和其他请求都要等待。这里把计算放到有界线程池
+（bcrypt 计算期间释放 GIL），并用信号量限制每个 worker 同时进行的校验数；
+等待队列过长时直接拒绝，撞库式的登录洪峰不会堆积成无限排队。
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from passlib.context import CryptContext
+
+from app.config import settings
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+class PasswordBusyError(Exception):
+    """等待校验的请求过多"""
+
+
+class PasswordHasher:
+    """在线程池中执行 bcrypt 哈希和校验"""
+
+    def __init__(self, threads: int, max_concurrency: int, max_waiting: int):
+        self.threads = threads
+        self.max_concurrency = max_concurrency
+        self.max_waiting = max_waiting
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_ms = 0.0
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="pwd-hash")
+        return self._executor
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def _run(self, func, *args):
+        if self.waiting >= self.max_waiting:
+            self.rejected += 1
+            raise PasswordBusyError("密码校验请求过多")
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self.total_ms += (time.perf_counter() - started) * 1000
+            self._semaphore.release()
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """校验密码"""
+        return await self._run(pwd_context.verify, plain_password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        """生成密码哈希"""
+        return await self._run(pwd_context.hash, password)
+
+    def stats(self) -> dict:
+        return {
+            "threads": self.threads,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "avg_ms": round(self.total_ms / self.completed, 1) if self.completed else None,
+        }
+
+
+# 全局实例
+password_hasher = PasswordHasher(
+    threads=settings.PASSWORD_HASH_THREADS,
+    max_concurrency=settings.PASSWORD_VERIFY_CONCURRENCY,
+    max_waiting=settings.PASSWORD_VERIFY_MAX_WAITING
+)
@@ -0,0 +1,180 @@
+"""
+登录主体缓存 - get_current_user / get_current_admin 共用
+
+每个需要登录的接口都要解析 JWT 并查一次 users / admins 表。这里缓存两层：
+    - Token → 主体标识（user_id / username），有效期不超过 Token 自身的过期时间
+    - 主体标识 → 数据行快照（列值字典），有效期 PRINCIPAL_CACHE_TTL_SECONDS
+
+命中时用快照构造一个已持久化状态的 ORM 对象挂到当前请求的会话上，不查库；
+接口中对它的修改照常 flush 为 UPDATE，加锁读取（lock_user）会用最新数据覆盖快照。
+
+失效：任何会话 flush 了 User / Admin 的修改（状态变更、资料修改、余额变动）
+都会在 flush 和提交后清除对应快照。缓存是进程内的，其他进程最长在 TTL 内看到旧快照。
+"""
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple, Type
+
+from sqlalchemy import event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from app.config import settings
+from app.models.admin import Admin
+from app.models.user import User
+
+# 会话 info 中记录待失效主体的键
+_PENDING_KEY = "principal_cache_invalidate"
+
+
+class TTLCache:
+    """带容量上限的 TTL 缓存（LRU 淘汰）"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._data: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None or item[0] < time.monotonic():
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def set(self, key, value, ttl: float) -> None:
+        if ttl <= 0:
+            return
+        self._data[key] = (time.monotonic() + ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def pop(self, key) -> None:
+        self._data.pop(key, None)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else None,
+        }
+
+
+class PrincipalCache:
+    """登录主体缓存"""
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.tokens = TTLCache(max_size)
+        self.users = TTLCache(max_size)
+        self.admins = TTLCache(max_size)
+        self.invalidations = 0
+
+    # ---------- Token ----------
+
+    def get_token_subject(self, token: str) -> Optional[str]:
+        """取已验证过的 Token 对应的主体标识"""
+        return self.tokens.get(token)
+
+    def set_token_subject(self, token: str, subject: str, expires_at: Optional[float]) -> None:
+        """缓存 Token 验证结果，有效期不超过 Token 的 exp"""
+        ttl = self.ttl
+        if expires_at is not None:
+            ttl = min(ttl, expires_at - time.time())
+        self.tokens.set(token, subject, ttl)
+
+    # ---------- 数据行快照 ----------
+
+    @staticmethod
+    def _snapshot(obj) -> Dict[str, Any]:
+        return {attr.key: getattr(obj, attr.key) for attr in inspect(type(obj)).column_attrs}
+
+    @staticmethod
+    def _restore(model: Type, snapshot: Dict[str, Any], db: AsyncSession):
+        """用快照构造持久化状态的对象并挂到会话上（不查库）"""
+        obj = model(**snapshot)
+        make_transient_to_detached(obj)
+        db.add(obj)
+        return obj
+
+    def get_user(self, user_id: str, db: AsyncSession) -> Optional[User]:
+        snapshot = self.users.get(user_id)
+        return self._restore(User, snapshot, db) if snapshot else None
+
+    def set_user(self, user: User) -> None:
+        self.users.set(user.user_id, self._snapshot(user), self.ttl)
+
+    def get_admin(self, username: str, db: AsyncSession) -> Optional[Admin]:
+        snapshot = self.admins.get(username)
+        return self._restore(Admin, snapshot, db) if snapshot else None
+
+    def set_admin(self, admin: Admin) -> None:
+        self.admins.set(admin.username, self._snapshot(admin), self.ttl)
+
+    # ---------- 失效 ----------
+
+    def invalidate_user(self, user_id: str) -> None:
+        self.users.pop(user_id)
+        self.invalidations += 1
+
+    def invalidate_admin(self, username: str) -> None:
+        self.admins.pop(username)
+        self.invalidations += 1
+
+    def _invalidate(self, keys) -> None:
+        for kind, key in keys:
+            if kind == "user":
+                self.invalidate_user(key)
+            else:
+                self.invalidate_admin(key)
+
+    def stats(self) -> dict:
+        return {
+            "ttl": self.ttl,
+            "tokens": self.tokens.stats(),
+            "users": self.users.stats(),
+            "admins": self.admins.stats(),
+            "invalidations": self.invalidations,
+        }
+
+
+# 全局缓存实例
+principal_cache = PrincipalCache(
+    ttl=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+    max_size=settings.PRINCIPAL_CACHE_MAX_SIZE
+)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_principals(session: Session, flush_context) -> None:
+    """flush 时记录被修改的用户/管理员，并立即清除快照"""
+    keys = set()
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, User) and obj.user_id:
+            keys.add(("user", obj.user_id))
+        elif isinstance(obj, Admin) and obj.username:
+            keys.add(("admin", obj.username))
+    if keys:
+        principal_cache._invalidate(keys)
+        session.info.setdefault(_PENDING_KEY, set()).update(keys)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_principals(session: Session) -> None:
+    """提交后再清除一次，避免 flush 与提交之间其他请求读到旧行并写回缓存"""
+    keys = session.info.pop(_PENDING_KEY, None)
+    if keys:
+        principal_cache._invalidate(keys)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_principals(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,135 @@
+"""
+收运路线规划
+
+选出需要清运的设备（仓满、容量达到 ROUTE_PLAN_CAPACITY_THRESHOLD，或满仓预测在
+ROUTE_PLAN_FORECAST_HOURS 内），按车辆数分组并规划每辆车的
+访问顺序（route_solver：扫描法分组 + 最近邻 + 2-opt）。求解在线程池中执行，不阻塞事件循环；
+单车站点数超过 ROUTE_PLAN_MAX_STOPS_PER_VEHICLE 时优先安排仓满、容量高的设备，其余列为未安排。
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.device import Device
+from app.models.fill_forecast import DeviceFillForecast
+from app.services.route_solver import centroid, solve_routes
+
+
+class RoutePlanner:
+    """收运路线规划"""
+
+    def __init__(self):
+        self.metrics = {"plans": 0, "last_stops": None, "last_solve_ms": None}
+        self._lock = asyncio.Lock()
+
+    def stats(self) -> dict:
+        return dict(self.metrics)
+
+    async def plan(
+        self,
+        db: AsyncSession,
+        vehicles: int,
+        depot: Optional[Tuple[float, float]] = None,
+        threshold: Optional[int] = None,
+        time_budget: Optional[float] = None,
+        forecast_hours: Optional[float] = None,
+    ) -> dict:
+        """
+        规划收运路线
+
+        Args:
+            vehicles: 车辆数
+            depot: 车场 (纬度, 经度)，未传时使用配置，未配置时取站点中心
+            threshold: 容量阈值(%)，未传时使用 ROUTE_PLAN_CAPACITY_THRESHOLD
+            time_budget: 求解时间预算(秒)
+            forecast_hours: 预计此时长内满仓的设备也安排清运，0 表示不使用满仓预测
+        """
+        threshold = settings.ROUTE_PLAN_CAPACITY_THRESHOLD if threshold is None else threshold
+        time_budget = settings.ROUTE_PLAN_TIME_BUDGET_SECONDS if time_budget is None else time_budget
+        forecast_hours = settings.ROUTE_PLAN_FORECAST_HOURS if forecast_hours is None else forecast_hours
+        conditions = [Device.recycle_bin_full == 1, Device.capacity_percent >= threshold]
+        if forecast_hours > 0:
+            conditions.append(DeviceFillForecast.expected_full_at <= datetime.now() + timedelta(hours=forecast_hours))
+        rows = (await db.execute(
+            select(
+                Device.device_id, Device.name, Device.address, Device.latitude, Device.longitude,
+                Device.capacity_percent, Device.recycle_bin_full, DeviceFillForecast.expected_full_at
+            ).outerjoin(
+                DeviceFillForecast, DeviceFillForecast.device_id == Device.device_id
+            ).where(
+                Device.latitude.isnot(None),
+                Device.longitude.isnot(None),
+                or_(*conditions)
+            ).order_by(
+                Device.recycle_bin_full.desc(),
+                Device.capacity_percent.desc(),
+                DeviceFillForecast.expected_full_at.is_(None),
+                DeviceFillForecast.expected_full_at
+            )
+        )).all()
+
+        capacity = vehicles * settings.ROUTE_PLAN_MAX_STOPS_PER_VEHICLE
+        selected, unassigned = rows[:capacity], rows[capacity:]
+        lats = np.array([row.latitude for row in selected], dtype=np.float64)
+        lngs = np.array([row.longitude for row in selected], dtype=np.float64)
+        if depot is None and settings.ROUTE_PLAN_DEPOT_LATITUDE is not None \
+                and settings.ROUTE_PLAN_DEPOT_LONGITUDE is not None:
+            depot = (settings.ROUTE_PLAN_DEPOT_LATITUDE, settings.ROUTE_PLAN_DEPOT_LONGITUDE)
+        depot = depot or centroid(lats, lngs)
+
+        routes = []
+        started = time.perf_counter()
+        if selected:
+            # 同一进程同时只求解一个，避免多个请求争抢 CPU
+            async with self._lock:
+                routes = await asyncio.get_running_loop().run_in_executor(
+                    None,
+                    lambda: solve_routes(
+                        lats, lngs, depot, vehicles, time_budget,
+                        matrix_max_stops=settings.ROUTE_PLAN_MATRIX_MAX_STOPS,
+                        window=settings.ROUTE_PLAN_TWO_OPT_WINDOW,
+                    )
+                )
+        solve_ms = round((time.perf_counter() - started) * 1000, 1)
+        self.metrics.update(plans=self.metrics["plans"] + 1, last_stops=len(selected), last_solve_ms=solve_ms)
+
+        def stop_item(row) -> dict:
+            return {
+                "device_id": row.device_id,
+                "name": row.name,
+                "address": row.address,
+                "latitude": row.latitude,
+                "longitude": row.longitude,
+                "capacity_percent": row.capacity_percent or 0,
+                "recycle_bin_full": row.recycle_bin_full or 0,
+                "expected_full_at": row.expected_full_at.isoformat(timespec="minutes") if row.expected_full_at else None,
+            }
+
+        return {
+            "depot": {"latitude": depot[0], "longitude": depot[1]} if depot else None,
+            "threshold": threshold,
+            "forecast_hours": forecast_hours,
+            "solve_ms": solve_ms,
+            "total_distance_km": round(sum(route["distance"] for route in routes) / 1000, 2),
+            "routes": [
+                {
+                    "vehicle": index + 1,
+                    "stop_count": len(route["stops"]),
+                    "distance_km": round(route["distance"] / 1000, 2),
+                    "initial_distance_km": round(route["initial_distance"] / 1000, 2),
+                    "stops": [stop_item(selected[int(i)]) for i in route["stops"]],
+                }
+                for index, route in enumerate(routes)
+            ],
+            "unassigned": [stop_item(row) for row in unassigned],
+        }
+
+
+# 全局实例
+route_planner = RoutePlanner()
@@ -0,0 +1,166 @@
+"""
+多车收运路线求解（NumPy，不依赖数据库，供 route_planner 和基准测试脚本使用）
+
+1. 扫描法分组：按站点相对车场的方位角排序，从最大的角度空隙处切开，均分给各车辆
+2. 每辆车：最近邻构造初始回路（车场出发并返回车场）
+3. 2-opt 改进：对每条边向量化计算与后续 window 条边交换的收益，取最优交换，直到无改进或时间用完
+
+站点数不超过 matrix_max_stops 时预先计算 float32 距离矩阵，否则按需向量化计算一行距离，
+避免 n² 内存（2 万个站点的完整矩阵约 1.6GB）。
+"""
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.utils.geo import EARTH_RADIUS_METERS, distance_matrix, haversine
+
+
+class _Distances:
+    """一组点（含车场）之间的距离：矩阵或按需计算"""
+
+    def __init__(self, lats: np.ndarray, lngs: np.ndarray, matrix_max_stops: int):
+        self.lats = lats
+        self.lngs = lngs
+        self.matrix = distance_matrix(lats, lngs) if len(lats) <= matrix_max_stops else None
+
+    def row(self, i: int, js: np.ndarray) -> np.ndarray:
+        if self.matrix is not None:
+            return self.matrix[i, js]
+        return haversine(float(self.lats[i]), float(self.lngs[i]), self.lats[js], self.lngs[js])
+
+    def pairs(self, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        """逐对距离 d(a[k], b[k])"""
+        if self.matrix is not None:
+            return self.matrix[a, b]
+        lat1, lat2 = np.radians(self.lats[a]), np.radians(self.lats[b])
+        delta_lng = np.radians(self.lngs[b] - self.lngs[a])
+        h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(delta_lng / 2) ** 2
+        return EARTH_RADIUS_METERS * 2 * np.arctan2(np.sqrt(h), np.sqrt(1 - h))
+
+
+def sweep_groups(lats: np.ndarray, lngs: np.ndarray, depot: Tuple[float, float], vehicles: int) -> List[np.ndarray]:
+    """扫描法：按方位角把站点均分为 vehicles 组，返回各组站点下标"""
+    if len(lats) == 0:
+        return []
+    vehicles = max(1, min(vehicles, len(lats)))
+    angles = np.arctan2(lats - depot[0], (lngs - depot[1]) * math.cos(math.radians(depot[0])))
+    order = np.argsort(angles, kind="stable")
+    if len(order) > 1:
+        # 从最大角度空隙处开始，避免把一片密集区域切给两辆车
+        sorted_angles = angles[order]
+        gaps = np.diff(np.concatenate([sorted_angles, sorted_angles[:1] + 2 * math.pi]))
+        order = np.roll(order, -int((np.argmax(gaps) + 1) % len(order)))
+    return [group for group in np.array_split(order, vehicles) if len(group)]
+
+
+def nearest_neighbour(dist: _Distances, depot: int, nodes: np.ndarray) -> np.ndarray:
+    """最近邻回路：depot → 各站点 → depot"""
+    remaining = nodes.copy()
+    tour = [depot]
+    current = depot
+    while len(remaining):
+        k = int(np.argmin(dist.row(current, remaining)))
+        current = int(remaining[k])
+        tour.append(current)
+        remaining = np.delete(remaining, k)
+    tour.append(depot)
+    return np.array(tour, dtype=np.int64)
+
+
+def two_opt(dist: _Distances, tour: np.ndarray, deadline: float, window: int) -> Tuple[np.ndarray, int]:
+    """
+    2-opt 改进（首尾为车场，不移动）
+
+    Returns:
+        (改进后的回路, 交换次数)
+    """
+    tour = tour.copy()
+    size = len(tour)
+    if size < 5:
+        return tour, 0
+    edges = dist.pairs(tour[:-1], tour[1:]).astype(np.float64)
+    moves = 0
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for i in range(size - 3):
+            if time.perf_counter() >= deadline:
+                break
+            # 边 (a,b)=tour[i..i+1] 与边 (c,d)=tour[j..j+1] 交换为 (a,c)、(b,d)
+            js = np.arange(i + 2, min(size - 1, i + 2 + window))
+            if not len(js):
+                continue
+            a, b = tour[i], tour[i + 1]
+            c, d = tour[js], tour[js + 1]
+            delta = dist.row(a, c) + dist.row(b, d) - edges[i] - edges[js]
+            k = int(np.argmin(delta))
+            if delta[k] < -1e-6:
+                j = int(js[k])
+                tour[i + 1:j + 1] = tour[i + 1:j + 1][::-1]
+                edges[i + 1:j] = edges[i + 1:j][::-1]
+                edges[i] = float(dist.row(a, np.array([c[k]]))[0])
+                edges[j] = float(dist.row(b, np.array([d[k]]))[0])
+                moves += 1
+                improved = True
+    return tour, moves
+
+
+def solve_routes(
+    lats: np.ndarray,
+    lngs: np.ndarray,
+    depot: Tuple[float, float],
+    vehicles: int,
+    time_budget: float,
+    matrix_max_stops: int = 2000,
+    window: int = 1000,
+) -> List[Dict]:
+    """
+    多车收运路线
+
+    Args:
+        lats, lngs: 站点坐标
+        depot: 车场 (纬度, 经度)，各车从车场出发并返回
+        vehicles: 车辆数
+        time_budget: 2-opt 总时间预算（秒），按站点数分给各车
+
+    Returns:
+        [{"stops": 站点下标（按访问顺序）, "distance": 总里程(米), "initial_distance": 最近邻里程(米), "moves": 2-opt 交换次数}]
+    """
+    started = time.perf_counter()
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    groups = sweep_groups(lats, lngs, depot, vehicles)
+    total = sum(len(group) for group in groups)
+
+    routes = []
+    for group in groups:
+        # 组内坐标 + 车场（下标 len(group)）
+        group_lats = np.append(lats[group], depot[0])
+        group_lngs = np.append(lngs[group], depot[1])
+        dist = _Distances(group_lats, group_lngs, matrix_max_stops)
+        depot_index = len(group)
+        tour = nearest_neighbour(dist, depot_index, np.arange(len(group)))
+        initial = float(dist.pairs(tour[:-1], tour[1:]).sum())
+
+        # 剩余时间按站点数比例分给本组
+        remaining = time_budget - (time.perf_counter() - started)
+        deadline = time.perf_counter() + max(0.0, remaining) * len(group) / max(total, 1)
+        tour, moves = two_opt(dist, tour, deadline, window)
+        total -= len(group)
+
+        routes.append({
+            "stops": group[tour[1:-1]],
+            "distance": float(dist.pairs(tour[:-1], tour[1:]).sum()),
+            "initial_distance": initial,
+            "moves": moves,
+        })
+    return routes
+
+
+def centroid(lats: np.ndarray, lngs: np.ndarray) -> Optional[Tuple[float, float]]:
+    """站点平均坐标（未配置车场时作为车场）"""
+    if len(lats) == 0:
+        return None
+    return float(np.mean(lats)), float(np.mean(lngs))
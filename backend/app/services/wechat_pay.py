@@ -1,19 +1,100 @@
 """
 微信支付服务 - 商家转账到零钱
 使用微信支付 API v3
+
+所有请求通过进程内共享的 httpx.AsyncClient 发出（连接池复用、非阻塞），
+不会阻塞事件循环，同一 worker 上的设备 WebSocket 不受微信接口响应速度影响。
+
+- 每次调用有独立的总时限（deadline），超时即失败
+- 幂等的查询接口在网络错误 / 5xx / 429 时按指数退避重试
+- 熔断器：连续失败达到阈值后短路一段时间，期间直接失败，不再占用连接
 """
+import asyncio
 import os
+import random
 import uuid
-import requests
 import json
 import time
-from typing import Optional, Dict
+from typing import Optional, Dict, List
+from urllib.parse import urlsplit
+
+import httpx
 from loguru import logger
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.asymmetric import padding
 from cryptography.hazmat.backends import default_backend
 import base64
 from app.config import settings
+from app.utils.id_generator import generate_id
+
+# 单个转账批次最多明细数（微信限制1000）
+MAX_DETAILS_PER_BATCH = 1000
+# 批次明细查询分页大小（微信限制最大100）
+DETAIL_PAGE_SIZE = 100
+
+
+class WeChatPayError(Exception):
+    """微信支付接口错误"""
+
+    def __init__(self, message: str, code: str = "UNKNOWN_ERROR", status_code: int = 0, retryable: bool = False):
+        super().__init__(message)
+        self.code = code
+        self.status_code = status_code
+        self.retryable = retryable
+
+
+class CircuitOpenError(WeChatPayError):
+    """熔断器打开，请求被短路"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"微信支付接口熔断中，{retry_after:.0f}秒后重试", code="CIRCUIT_OPEN", retryable=True)
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    熔断器
+
+    closed: 正常放行，连续失败达到 failure_threshold 后转为 open
+    open: 直接拒绝，经过 reset_timeout 秒后转为 half_open
+    half_open: 只放行一个探测请求，成功则 closed，失败则重新 open
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    def before_call(self) -> None:
+        """请求前检查，熔断时抛出 CircuitOpenError"""
+        if self.state == "open":
+            elapsed = time.monotonic() - self._opened_at
+            if elapsed < self.reset_timeout:
+                raise CircuitOpenError(self.reset_timeout - elapsed)
+            self.state = "half_open"
+            self._probe_in_flight = False
+
+        if self.state == "half_open":
+            if self._probe_in_flight:
+                raise CircuitOpenError(self.reset_timeout)
+            self._probe_in_flight = True
+
+    def record_success(self) -> None:
+        self.state = "closed"
+        self._failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._probe_in_flight = False
+        if self.state == "half_open" or self._failures >= self.failure_threshold:
+            if self.state != "open":
+                logger.warning(f"微信支付接口连续失败 {self._failures} 次，熔断 {self.reset_timeout} 秒")
+            self.state = "open"
+            self._opened_at = time.monotonic()
 
 
 class WeChatPayService:
@@ -21,6 +102,13 @@ class WeChatPayService:
     
     def __init__(self):
         """初始化微信支付客户端"""
+        self.base_url = settings.WECHAT_PAY_BASE_URL.rstrip("/")
+        self.circuit_breaker = CircuitBreaker(
+            failure_threshold=settings.WECHAT_PAY_CIRCUIT_FAILURE_THRESHOLD,
+            reset_timeout=settings.WECHAT_PAY_CIRCUIT_RESET_SECONDS
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+
         if not all([
             settings.WECHAT_MCH_ID,
             settings.WECHAT_MCH_SERIAL_NO,
@@ -40,6 +128,7 @@ class WeChatPayService:
         if not os.path.exists(private_key_path):
             logger.error(f"商户私钥文件不存在: {private_key_path}")
             self.mch_id = None
+            self.private_key = None
             return
         
         try:
@@ -68,6 +157,30 @@ class WeChatPayService:
         """检查服务是否可用"""
         return self.mch_id is not None and self.private_key is not None
     
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """进程内共享的 HTTP 客户端（首次使用时创建）"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(
+                    settings.WECHAT_PAY_TIMEOUT_SECONDS,
+                    connect=settings.WECHAT_PAY_CONNECT_TIMEOUT_SECONDS
+                ),
+                limits=httpx.Limits(
+                    max_connections=settings.WECHAT_PAY_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.WECHAT_PAY_MAX_CONNECTIONS
+                ),
+                headers={"Accept": "application/json", "User-Agent": "clothing-recycle/1.0"}
+            )
+        return self._client
+
+    async def close(self) -> None:
+        """关闭 HTTP 客户端（服务关闭时调用）"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
     def _sign(self, method: str, url: str, timestamp: str, nonce: str, body: str = "") -> str:
         """生成请求签名"""
         message = f"{method}\n{url}\n{timestamp}\n{nonce}\n{body}\n"
@@ -81,11 +194,18 @@ class WeChatPayService:
         return base64.b64encode(signature).decode('utf-8')
     
     def _get_authorization(self, method: str, url: str, body: str = "") -> str:
-        """获取请求头Authorization"""
+        """
+        获取请求头Authorization
+
+        签名串中的 URL 为去掉域名的绝对路径（含查询参数）
+        """
+        parts = urlsplit(url)
+        canonical_url = parts.path + (f"?{parts.query}" if parts.query else "")
+
         timestamp = str(int(time.time()))
         nonce = uuid.uuid4().hex
         
-        signature = self._sign(method, url, timestamp, nonce, body)
+        signature = self._sign(method, canonical_url, timestamp, nonce, body)
         
         authorization = (
             f'WECHATPAY2-SHA256-RSA2048 '
@@ -97,7 +217,163 @@ class WeChatPayService:
         )
         
         return authorization
+
+    async def _send(self, method: str, path: str, body_str: str = "") -> Dict:
+        """发送单次请求，按结果更新熔断器"""
+        headers = {
+            "Authorization": self._get_authorization(method, path, body_str),
+            "Wechatpay-Serial": self.mch_serial_no
+        }
+        if body_str:
+            headers["Content-Type"] = "application/json"
+
+        self.circuit_breaker.before_call()
+        try:
+            response = await self.client.request(
+                method,
+                path,
+                headers=headers,
+                content=body_str.encode('utf-8') if body_str else None
+            )
+        except httpx.HTTPError as e:
+            self.circuit_breaker.record_failure()
+            raise WeChatPayError(f"请求失败: {e}", code="NETWORK_ERROR", retryable=True)
+        except BaseException:
+            # 被取消（_request 总时限到期、停机）或其他异常：按失败处理，
+            # 否则半开状态的探测标记不会清除，熔断器会一直拒绝请求
+            self.circuit_breaker.record_failure()
+            raise
+
+        if response.status_code >= 500 or response.status_code == 429:
+            self.circuit_breaker.record_failure()
+        else:
+            # 4xx 业务错误说明接口本身可用，不计入熔断
+            self.circuit_breaker.record_success()
+
+        if response.status_code in (200, 202):
+            return response.json() if response.content else {}
+
+        try:
+            error_data = response.json() if response.content else {}
+        except ValueError:
+            error_data = {}
+        raise WeChatPayError(
+            error_data.get('message', f'HTTP {response.status_code}'),
+            code=error_data.get('code', 'UNKNOWN_ERROR'),
+            status_code=response.status_code,
+            retryable=response.status_code >= 500 or response.status_code == 429
+        )
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        body: Optional[dict] = None,
+        retries: int = 0,
+        deadline: Optional[float] = None
+    ) -> Dict:
+        """
+        发送请求
+
+        Args:
+            retries: 可重试错误的最大重试次数（仅用于幂等请求）
+            deadline: 整个调用（含重试）的总时限，秒
+        """
+        body_str = json.dumps(body, ensure_ascii=False) if body is not None else ""
+        deadline = deadline or settings.WECHAT_PAY_DEADLINE_SECONDS
+
+        async def attempt_all() -> Dict:
+            attempt = 0
+            while True:
+                try:
+                    return await self._send(method, path, body_str)
+                except CircuitOpenError:
+                    raise
+                except WeChatPayError as e:
+                    if not e.retryable or attempt >= retries:
+                        raise
+                    # 指数退避 + 抖动
+                    delay = settings.WECHAT_PAY_RETRY_BACKOFF_SECONDS * (2 ** attempt)
+                    delay += random.uniform(0, delay / 2)
+                    attempt += 1
+                    logger.warning(f"微信支付请求失败，{delay:.2f}秒后第{attempt}次重试: {method} {path}: {e}")
+                    await asyncio.sleep(delay)
+
+        try:
+            return await asyncio.wait_for(attempt_all(), timeout=deadline)
+        except asyncio.TimeoutError:
+            raise WeChatPayError(f"请求超过时限 {deadline} 秒", code="DEADLINE_EXCEEDED", retryable=True)
     
+    @staticmethod
+    def _truncate(text: str, limit: int) -> str:
+        return text if len(text) <= limit else text[:limit - 3] + "..."
+
+    async def transfer_batch(
+        self,
+        out_batch_no: str,
+        details: List[Dict],
+        description: str = "回收收益提现"
+    ) -> Dict:
+        """
+        发起一个包含多笔明细的商家转账批次（一次签名、一次请求）
+
+        Args:
+            out_batch_no: 商户批次单号（重试时必须保持不变，微信侧幂等）
+            details: [{"out_detail_no": 商户明细单号, "amount_cents": 金额(分), "openid": OpenID}, ...]
+            description: 批次名称/备注
+
+        Returns:
+            dict: {"batch_id": 微信批次单号, "out_batch_no": 商户批次单号, "batch_status": 批次状态}
+        """
+        if not self.is_available():
+            raise Exception("微信支付服务未配置或不可用")
+        if not details:
+            raise ValueError("转账明细不能为空")
+        if len(details) > MAX_DETAILS_PER_BATCH:
+            raise ValueError(f"单批次最多 {MAX_DETAILS_PER_BATCH} 笔明细")
+        for detail in details:
+            if detail["amount_cents"] < 100:  # 最低1元
+                raise ValueError("提现金额不能少于1元")
+
+        remark = self._truncate(description, 56)
+        data = {
+            "appid": self.appid,
+            "out_batch_no": out_batch_no,
+            "batch_name": self._truncate(description, 32),  # 批次名称，最多32字符
+            "batch_remark": remark,  # 批次备注，最多56字符
+            "total_amount": sum(d["amount_cents"] for d in details),
+            "total_num": len(details),
+            "transfer_detail_list": [
+                {
+                    "out_detail_no": d["out_detail_no"],  # 商户明细单号
+                    "transfer_amount": d["amount_cents"],
+                    "transfer_remark": remark,  # 转账备注
+                    "openid": d["openid"]
+                }
+                for d in details
+            ]
+        }
+
+        logger.info(
+            f"发起微信批量转账: out_batch_no={out_batch_no}, "
+            f"笔数={data['total_num']}, 总金额={data['total_amount']}分"
+        )
+
+        try:
+            # 转账请求不在此处重试：重试由提现流程以相同的 out_batch_no 发起，微信侧幂等
+            result = await self._request("POST", "/v3/transfer/batches", body=data)
+        except WeChatPayError as e:
+            logger.error(f"微信批量转账失败 [{e.code}]: {e}")
+            raise
+
+        logger.info(f"微信批量转账响应: {result}")
+
+        return {
+            "batch_id": result.get("batch_id"),
+            "out_batch_no": result.get("out_batch_no", out_batch_no),
+            "batch_status": result.get("batch_status"),
+        }
+
     async def transfer_to_balance(
         self,
         openid: str,
@@ -106,13 +382,13 @@ class WeChatPayService:
         withdraw_id: str = None
     ) -> Dict:
         """
-        转账到微信零钱 - 使用商家转账到零钱 API v3
+        单笔转账到微信零钱（单明细批次）
         
         Args:
             openid: 用户微信OpenID
             amount: 转账金额（元）
             description: 转账说明
-            withdraw_id: 提现单号（用于关联）
+            withdraw_id: 提现单号（同时作为商户批次单号）
         
         Returns:
             dict: {
@@ -120,95 +396,56 @@ class WeChatPayService:
                 "out_batch_no": "商户批次单号",
                 "status": "success"
             }
+
+        Raises:
+            WeChatPayError: retryable=True 的错误（网络错误、超时、5xx）不能说明微信未受理，
+                调用方不能据此解冻，应使用同一 withdraw_id 重试或按批次单号查询确认
         """
-        if not self.is_available():
-            raise Exception("微信支付服务未配置或不可用")
-        
-        # 金额转换为分（微信支付使用分为单位）
-        amount_cents = int(amount * 100)
-        
-        if amount_cents < 100:  # 最低1元
-            raise ValueError("提现金额不能少于1元")
-        
         # 生成批次单号（需要唯一，最多32个字符）
-        if not withdraw_id:
-            withdraw_id = f"WD{int(time.time())}{uuid.uuid4().hex[:12].upper()}"
-        else:
-            # 确保不超过32个字符
-            withdraw_id = withdraw_id[:32]
-        
-        # 生成明细单号
-        detail_no = f"{withdraw_id}D001"[:32]
-        
-        # 构建转账请求数据
-        data = {
-            "appid": self.appid,
-            "out_batch_no": withdraw_id,  # 商户批次单号
-            "batch_name": description[:32] if len(description) <= 32 else description[:29] + "...",  # 批次名称，最多32字符
-            "batch_remark": description[:56] if len(description) <= 56 else description[:53] + "...",  # 批次备注，最多56字符
-            "total_amount": amount_cents,
-            "total_num": 1,
-            "transfer_detail_list": [
-                {
-                    "out_detail_no": detail_no,  # 商户明细单号
-                    "transfer_amount": amount_cents,
-                    "transfer_remark": description[:56] if len(description) <= 56 else description[:53] + "...",  # 转账备注
-                    "openid": openid
-                }
-            ]
+        withdraw_id = (withdraw_id or generate_id("WD"))[:32]
+
+        result = await self.transfer_batch(
+            out_batch_no=withdraw_id,
+            details=[{
+                "out_detail_no": f"{withdraw_id}D001"[:32],
+                "amount_cents": int(round(amount * 100)),
+                "openid": openid
+            }],
+            description=description
+        )
+        return {
+            "batch_id": result["batch_id"],
+            "out_batch_no": result["out_batch_no"],
+            "status": "success",
+            "message": "转账申请已提交"
         }
+
+    async def query_batch_details(self, out_batch_no: str) -> Dict:
+        """
+        查询批次及全部明细状态（分页拉取，幂等，失败时自动重试）
+
+        Returns:
+            dict: {"batch_status": 批次状态, "details": [{"out_detail_no", "detail_status"}, ...]}
+        """
+        if not self.is_available():
+            raise Exception("微信支付服务未配置或不可用")
         
-        try:
-            logger.info(f"发起微信转账请求: openid={openid}, amount={amount}, withdraw_id={withdraw_id}")
-            
-            # API v3 转账接口URL
-            url = "https://api.mch.weixin.qq.com/v3/transfer/batches"
-            
-            # 请求体
-            body_str = json.dumps(data, ensure_ascii=False)
-            
-            # 获取Authorization
-            authorization = self._get_authorization("POST", url, body_str)
-            
-            # 发送请求
-            headers = {
-                "Content-Type": "application/json",
-                "Accept": "application/json",
-                "Authorization": authorization,
-                "Wechatpay-Serial": self.mch_serial_no
-            }
-            
-            response = requests.post(
-                url,
-                headers=headers,
-                data=body_str.encode('utf-8'),
-                timeout=30
+        details = []
+        batch_status = None
+        offset = 0
+        while True:
+            path = (
+                f"/v3/transfer/batches/out-batch-no/{out_batch_no}"
+                f"?need_query_detail=true&offset={offset}&limit={DETAIL_PAGE_SIZE}"
             )
-            
-            logger.info(f"微信转账响应状态码: {response.status_code}")
-            logger.info(f"微信转账响应内容: {response.text}")
-            
-            # 解析响应
-            if response.status_code == 200:
-                result = response.json()
-                return {
-                    "batch_id": result.get('batch_id'),
-                    "out_batch_no": result.get('out_batch_no'),
-                    "status": "success",
-                    "message": "转账申请已提交"
-                }
-            else:
-                error_data = response.json() if response.text else {}
-                error_msg = error_data.get('message', f'HTTP {response.status_code}')
-                error_code = error_data.get('code', 'UNKNOWN_ERROR')
-                raise Exception(f"转账失败 [{error_code}]: {error_msg}")
-                
-        except requests.exceptions.RequestException as e:
-            logger.error(f"微信转账网络异常: {e}")
-            raise Exception(f"转账请求失败: {str(e)}")
-        except Exception as e:
-            logger.error(f"微信转账异常: {e}")
-            raise Exception(f"转账失败: {str(e)}")
+            result = await self._request("GET", path, retries=settings.WECHAT_PAY_QUERY_RETRIES)
+            batch_status = result.get("transfer_batch", {}).get("batch_status")
+            page = result.get("transfer_detail_list") or []
+            details.extend(page)
+            if len(page) < DETAIL_PAGE_SIZE:
+                break
+            offset += DETAIL_PAGE_SIZE
+        return {"batch_status": batch_status, "details": details}
     
     async def query_transfer_status(
         self,
@@ -216,11 +453,11 @@ class WeChatPayService:
         detail_id: str = None
     ) -> Dict:
         """
-        查询转账状态
+        查询转账状态（幂等，失败时自动重试）
         
         Args:
-            batch_id: 微信批次单号
-            detail_id: 微信明细单号（可选）
+            batch_id: 商户批次单号
+            detail_id: 商户明细单号（可选）
         
         Returns:
             dict: 转账状态信息
@@ -228,34 +465,31 @@ class WeChatPayService:
         if not self.is_available():
             raise Exception("微信支付服务未配置或不可用")
         
+        if detail_id:
+            # 查询明细单
+            path = f"/v3/transfer/batches/out-batch-no/{batch_id}/details/out-detail-no/{detail_id}"
+        else:
+            # 查询批次单
+            path = f"/v3/transfer/batches/out-batch-no/{batch_id}?need_query_detail=false"
+
         try:
-            if detail_id:
-                # 查询明细单
-                url = f"https://api.mch.weixin.qq.com/v3/transfer/batches/out-batch-no/{batch_id}/details/out-detail-no/{detail_id}"
-            else:
-                # 查询批次单
-                url = f"https://api.mch.weixin.qq.com/v3/transfer/batches/out-batch-no/{batch_id}"
-            
-            authorization = self._get_authorization("GET", url, "")
-            
-            headers = {
-                "Accept": "application/json",
-                "Authorization": authorization,
-                "Wechatpay-Serial": self.mch_serial_no
-            }
-            
-            response = requests.get(url, headers=headers, timeout=30)
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                error_data = response.json() if response.text else {}
-                error_msg = error_data.get('message', f'HTTP {response.status_code}')
-                raise Exception(f"查询失败: {error_msg}")
-                
-        except Exception as e:
-            logger.error(f"查询转账状态失败: {e}")
-            raise Exception(f"查询失败: {str(e)}")
+            return await self._request("GET", path, retries=settings.WECHAT_PAY_QUERY_RETRIES)
+        except WeChatPayError as e:
+            logger.error(f"查询转账状态失败 [{e.code}]: {e}")
+            raise
+
+    async def download_certificates(self) -> List[Dict]:
+        """
+        下载微信支付平台证书列表（证书内容为 APIv3 密钥加密的密文）
+
+        Returns:
+            list: [{"serial_no", "effective_time", "expire_time", "encrypt_certificate": {...}}, ...]
+        """
+        if not self.is_available():
+            raise Exception("微信支付服务未配置或不可用")
+
+        result = await self._request("GET", "/v3/certificates", retries=settings.WECHAT_PAY_QUERY_RETRIES)
+        return result.get("data", [])
 
 
 # 全局服务实例
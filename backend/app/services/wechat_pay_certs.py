@@ -0,0 +1,191 @@
+"""
+微信支付平台证书缓存 - 回调验签与解密
+
+平台证书由后台任务定期从 /v3/certificates 下载，解密后按序列号缓存公钥。
+回调处理只在内存中完成验签（RSA 验签）和报文解密（AES-256-GCM），不发起外部请求；
+仅当遇到未知序列号（微信轮换证书）时触发一次限频的即时刷新。
+"""
+import asyncio
+import base64
+import json
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature, InvalidTag
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.asymmetric.rsa import RSAPublicKey
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from loguru import logger
+
+from app.config import settings
+from app.services.wechat_pay import wechat_pay_service
+
+# 未知序列号触发即时刷新的最小间隔（秒），防止伪造请求放大为对微信的请求
+UNKNOWN_SERIAL_REFRESH_INTERVAL = 60.0
+# 刷新失败后的重试间隔（秒）
+REFRESH_RETRY_SECONDS = 60.0
+
+
+class NotifyVerifyError(Exception):
+    """回调验签或解密失败"""
+
+
+def aead_decrypt(api_v3_key: str, nonce: str, ciphertext: str, associated_data: Optional[str]) -> bytes:
+    """AEAD_AES_256_GCM 解密（证书和回调报文共用）"""
+    aesgcm = AESGCM(api_v3_key.encode("utf-8"))
+    return aesgcm.decrypt(
+        nonce.encode("utf-8"),
+        base64.b64decode(ciphertext),
+        associated_data.encode("utf-8") if associated_data else None
+    )
+
+
+class PlatformCertificateStore:
+    """
+    平台证书存储
+
+    _certs: 序列号 -> (公钥, 过期时间)
+    """
+
+    def __init__(self, refresh_interval: float, max_skew: float):
+        self.refresh_interval = refresh_interval
+        self.max_skew = max_skew
+        self._certs: Dict[str, tuple] = {}
+        self._refresh_lock = asyncio.Lock()
+        self._last_refresh = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self.verified = 0
+        self.rejected = 0
+        self.refreshes = 0
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger.error(f"平台证书首次下载失败，将在后台重试: {e}")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "serials": sorted(self._certs),
+            "refreshes": self.refreshes,
+            "last_refresh_age": round(time.monotonic() - self._last_refresh, 1) if self._last_refresh else None,
+            "verified": self.verified,
+            "rejected": self.rejected,
+        }
+
+    async def _run(self) -> None:
+        while True:
+            delay = self.refresh_interval if self._certs else REFRESH_RETRY_SECONDS
+            await asyncio.sleep(delay)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"平台证书刷新失败: {e}")
+
+    async def refresh(self) -> None:
+        """下载并解密平台证书，替换缓存"""
+        async with self._refresh_lock:
+            self._last_refresh = time.monotonic()
+            items = await wechat_pay_service.download_certificates()
+            certs = {}
+            for item in items:
+                encrypted = item["encrypt_certificate"]
+                pem = aead_decrypt(
+                    settings.WECHAT_APIV3_KEY,
+                    encrypted["nonce"],
+                    encrypted["ciphertext"],
+                    encrypted.get("associated_data")
+                )
+                certificate = x509.load_pem_x509_certificate(pem)
+                public_key = certificate.public_key()
+                if not isinstance(public_key, RSAPublicKey):
+                    continue
+                certs[item["serial_no"]] = (public_key, certificate.not_valid_after)
+            if certs:
+                # 保留尚未过期的旧证书，轮换期间两张证书签名的回调都能验证
+                now = datetime.utcnow()
+                for serial, cert in self._certs.items():
+                    if serial not in certs and cert[1] > now:
+                        certs[serial] = cert
+                self._certs = certs
+            self.refreshes += 1
+            logger.info(f"平台证书已刷新: {sorted(self._certs)}")
+
+    async def get_public_key(self, serial: str) -> Optional[RSAPublicKey]:
+        """按序列号取平台公钥，未知序列号时限频刷新一次"""
+        cert = self._certs.get(serial)
+        if cert is None and time.monotonic() - self._last_refresh > UNKNOWN_SERIAL_REFRESH_INTERVAL:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"平台证书刷新失败: {e}")
+            cert = self._certs.get(serial)
+        return cert[0] if cert else None
+
+    async def verify(self, serial: str, signature: str, timestamp: str, nonce: str, body: bytes) -> None:
+        """
+        验证回调签名
+
+        签名串: 应答时间戳\\n应答随机串\\n应答报文主体\\n
+
+        Raises:
+            NotifyVerifyError: 验签失败
+        """
+        try:
+            if not all([serial, signature, timestamp, nonce]):
+                raise NotifyVerifyError("缺少签名头")
+            if abs(time.time() - int(timestamp)) > self.max_skew:
+                raise NotifyVerifyError("回调时间戳超出允许范围")
+
+            public_key = await self.get_public_key(serial)
+            if public_key is None:
+                raise NotifyVerifyError(f"未知的平台证书序列号: {serial}")
+
+            message = timestamp.encode("utf-8") + b"\n" + nonce.encode("utf-8") + b"\n" + body + b"\n"
+            try:
+                public_key.verify(base64.b64decode(signature), message, padding.PKCS1v15(), hashes.SHA256())
+            except (InvalidSignature, ValueError):
+                raise NotifyVerifyError("签名验证失败")
+        except NotifyVerifyError:
+            self.rejected += 1
+            raise
+        except ValueError:
+            self.rejected += 1
+            raise NotifyVerifyError("签名头格式错误")
+        self.verified += 1
+
+    @staticmethod
+    def decrypt_resource(resource: dict) -> dict:
+        """解密回调报文中的 resource"""
+        try:
+            plaintext = aead_decrypt(
+                settings.WECHAT_APIV3_KEY,
+                resource["nonce"],
+                resource["ciphertext"],
+                resource.get("associated_data")
+            )
+            return json.loads(plaintext)
+        except (KeyError, ValueError, InvalidTag) as e:
+            raise NotifyVerifyError(f"回调报文解密失败: {e}")
+
+
+# 全局证书存储实例
+platform_cert_store = PlatformCertificateStore(
+    refresh_interval=settings.WECHAT_PAY_CERT_REFRESH_SECONDS,
+    max_skew=settings.WECHAT_PAY_NOTIFY_MAX_SKEW_SECONDS
+)
@@ -0,0 +1,267 @@
+"""
+提现对账任务
+
+回调可能丢失（网络故障、回调地址变更、服务重启），对应的提现会一直停留在
+PENDING / PROCESSING，冻结金额无法释放。对账任务定期扫描滞留记录，
+主动向微信查询批次结果并回写：
+
+1. 按 (status, updated_at) 索引取出超过 WITHDRAW_RECONCILE_STALE_SECONDS 未更新的记录，按批次去重
+2. 并发查询微信（并发上限 + 匀速限流），期间不持有连接池中的连接
+3. 在一个事务中批量回写：成功扣款、失败解冻；微信查无此批次的 PROCESSING 记录退回 PENDING 重新提交，
+   尝试次数已用完的（worker 提交结果不明时留下的）判定失败并解冻
+4. 未完结的记录统一刷新 updated_at，下一次滞留后才会再次查询
+
+批次级回调（MCHTRANSFER.BATCH.FINISHED）通过 request_reconcile 把批次标记为滞留，由下一轮对账查询回写，
+回调请求内不查询微信。
+
+多进程部署时通过 MySQL GET_LOCK 保证同一时间只有一个进程在对账，锁持有在连接池之外的
+独立连接上（见 app.db.locks）。
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from loguru import logger
+
+from app.config import settings
+from app.db.database import AsyncSessionLocal
+from app.db.locks import job_lock
+from app.models.withdraw import WithdrawRecord, WithdrawStatus
+from app.services.wechat_pay import WeChatPayError
+from app.services.withdraw_service import (
+    FINAL_STATUSES, apply_details_to_records, fetch_batch_results, settle_withdraw_failure
+)
+
+RECONCILE_LOCK_NAME = "withdraw_reconcile"
+OPEN_STATUSES = (WithdrawStatus.PENDING.value, WithdrawStatus.PROCESSING.value)
+
+
+async def request_reconcile(db: AsyncSession, out_batch_no: str) -> int:
+    """
+    让批次在下一轮对账时立即被查询（批次级回调使用，调用方负责提交事务）
+
+    把批次内未完结记录的 updated_at 提前到滞留阈值之前，不发起微信请求。
+
+    Returns:
+        标记的记录数，0 表示批次已全部完结（重复通知）
+    """
+    stale_at = datetime.now() - timedelta(seconds=settings.WITHDRAW_RECONCILE_STALE_SECONDS + 1)
+    result = await db.execute(
+        update(WithdrawRecord)
+        .where(WithdrawRecord.out_batch_no == out_batch_no, WithdrawRecord.status.in_(OPEN_STATUSES))
+        .values(updated_at=stale_at)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+class RateLimiter:
+    """匀速限流：相邻两次 acquire 至少间隔 1/rate 秒"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class WithdrawReconciler:
+    """提现对账任务"""
+
+    def __init__(self, interval: float, stale_seconds: float, scan_limit: int, concurrency: int, rate: float):
+        self.interval = interval
+        self.stale_seconds = stale_seconds
+        self.scan_limit = scan_limit
+        self.concurrency = concurrency
+        self.rate = rate
+        self._task: Optional[asyncio.Task] = None
+        self.metrics = {
+            "runs": 0,
+            "last_run_at": None,
+            "last_duration_ms": None,
+            "batches_checked": 0,
+            "settled_success": 0,
+            "settled_failed": 0,
+            "requeued": 0,
+            "query_errors": 0,
+            "backlog": {},
+        }
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"提现对账任务已启动 (间隔: {self.interval}秒, 并发: {self.concurrency}, 限流: {self.rate}/秒)")
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        return {"running": self._task is not None, **self.metrics}
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"提现对账异常: {e}", exc_info=True)
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> Dict[str, int]:
+        """执行一轮对账"""
+        started = time.monotonic()
+        # 锁连接不占用连接池，查询微信期间不持有连接池中的连接
+        async with job_lock(RECONCILE_LOCK_NAME) as locked:
+            if not locked:
+                return {}
+            self.metrics["backlog"] = await self.backlog()
+            batch_nos = await self.find_stale_batches()
+            counts = await self.reconcile(batch_nos) if batch_nos else {}
+
+        self.metrics["runs"] += 1
+        self.metrics["last_run_at"] = datetime.now().isoformat(timespec="seconds")
+        self.metrics["last_duration_ms"] = round((time.monotonic() - started) * 1000, 1)
+        if counts:
+            logger.info(f"提现对账完成: 批次={len(batch_nos)}, {counts}")
+        return counts
+
+    async def backlog(self) -> Dict[str, dict]:
+        """未完结提现的积压情况：各状态笔数和最早一笔的等待时长"""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(WithdrawRecord.status, func.count(), func.min(WithdrawRecord.created_at))
+                .where(WithdrawRecord.status.in_(OPEN_STATUSES))
+                .group_by(WithdrawRecord.status)
+            )
+            now = datetime.now()
+            return {
+                status: {
+                    "count": count,
+                    "oldest_age_seconds": int((now - oldest).total_seconds()) if oldest else 0,
+                }
+                for status, count, oldest in result.all()
+            }
+
+    async def find_stale_batches(self) -> List[str]:
+        """按 (status, updated_at) 索引取滞留记录，返回去重后的批次单号（最久未更新的在前）"""
+        cutoff = datetime.now() - timedelta(seconds=self.stale_seconds)
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(WithdrawRecord.out_batch_no)
+                .where(
+                    WithdrawRecord.status.in_(OPEN_STATUSES),
+                    WithdrawRecord.updated_at < cutoff,
+                    WithdrawRecord.out_batch_no.isnot(None)  # 尚未组批的记录由转账 worker 负责
+                )
+                .order_by(WithdrawRecord.updated_at)
+                .limit(self.scan_limit)
+            )
+            return list(dict.fromkeys(result.scalars().all()))
+
+    async def _query_all(self, batch_nos: List[str]) -> List[Tuple[str, Optional[dict], Optional[Exception]]]:
+        """并发查询各批次结果（并发上限 + 匀速限流）"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        limiter = RateLimiter(self.rate)
+
+        async def query(out_batch_no: str):
+            async with semaphore:
+                await limiter.acquire()
+                try:
+                    return out_batch_no, await fetch_batch_results(out_batch_no), None
+                except Exception as e:
+                    return out_batch_no, None, e
+
+        return await asyncio.gather(*(query(b) for b in batch_nos))
+
+    async def reconcile(self, batch_nos: List[str]) -> Dict[str, int]:
+        """查询并批量回写一组批次"""
+        results = await self._query_all(batch_nos)
+
+        found: Dict[str, dict] = {}
+        missing: List[str] = []
+        for out_batch_no, batch, error in results:
+            if error is None:
+                found[out_batch_no] = batch
+            elif isinstance(error, WeChatPayError) and error.status_code == 404:
+                missing.append(out_batch_no)
+            else:
+                self.metrics["query_errors"] += 1
+                logger.warning(f"对账查询失败: out_batch_no={out_batch_no}, error={error}")
+
+        counts = {"success": 0, "failed": 0, "pending": 0, "requeued": 0}
+        checked = list(found) + missing
+        if not checked:
+            return counts
+
+        async with AsyncSessionLocal() as db:
+            # 刷新未完结记录的 updated_at，仍未完结的要等到再次滞留才会重新查询
+            await db.execute(
+                update(WithdrawRecord)
+                .where(WithdrawRecord.out_batch_no.in_(checked), WithdrawRecord.status.notin_(FINAL_STATUSES))
+                .values(updated_at=func.now())
+                .execution_options(synchronize_session=False)
+            )
+            result = await db.execute(
+                select(WithdrawRecord)
+                .where(WithdrawRecord.out_batch_no.in_(checked), WithdrawRecord.status.in_(OPEN_STATUSES))
+                .with_for_update()
+            )
+            records = result.scalars().all()
+
+            details = []
+            for out_batch_no, batch in found.items():
+                details.extend(batch["details"])
+            for record in records:
+                if record.out_batch_no in found and record.status == WithdrawStatus.PENDING.value:
+                    # 提交时超时但微信实际已受理的批次，不再重新提交
+                    record.status = WithdrawStatus.PROCESSING.value
+                elif record.out_batch_no in missing and record.status == WithdrawStatus.PROCESSING.value:
+                    if (record.attempts or 0) >= settings.WITHDRAW_MAX_ATTEMPTS:
+                        # 尝试次数已用完且微信确认没有这个批次，没有出款，可以解冻
+                        if await settle_withdraw_failure(
+                            db, record, f"转账失败: {record.error_message or '微信未受理该批次'}", record.error_code
+                        ):
+                            counts["failed"] += 1
+                    else:
+                        # 领取后未成功提交到微信（进程中断、网络错误等），退回 PENDING，由 worker 用原批次单号重新提交
+                        record.status = WithdrawStatus.PENDING.value
+                        record.next_attempt_at = datetime.now()
+                        counts["requeued"] += 1
+
+            applied = await apply_details_to_records(
+                db, [r for r in records if r.out_batch_no in found], details
+            )
+            await db.commit()
+
+        for key, value in applied.items():
+            counts[key] += value
+        self.metrics["batches_checked"] += len(checked)
+        self.metrics["settled_success"] += counts["success"]
+        self.metrics["settled_failed"] += counts["failed"]
+        self.metrics["requeued"] += counts["requeued"]
+        return counts
+
+
+# 全局对账任务实例
+withdraw_reconciler = WithdrawReconciler(
+    interval=settings.WITHDRAW_RECONCILE_INTERVAL_SECONDS,
+    stale_seconds=settings.WITHDRAW_RECONCILE_STALE_SECONDS,
+    scan_limit=settings.WITHDRAW_RECONCILE_SCAN_LIMIT,
+    concurrency=settings.WITHDRAW_RECONCILE_CONCURRENCY,
+    rate=settings.WITHDRAW_RECONCILE_RATE_PER_SECOND
+)
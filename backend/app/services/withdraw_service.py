@@ -0,0 +1,506 @@
+"""
+提现服务 - 异步转账流水线
+
+/wallet/withdraw 只负责校验、冻结金额并写入 PENDING 提现记录，立即返回。
+后台 WithdrawWorker 从 withdraw_records 领取任务，合并为批次调用微信转账：
+
+    PENDING ──凑批领取──▶ PROCESSING ──微信受理──▶ (等待回调/对账) ──▶ SUCCESS / FAILED
+       ▲                     │
+       └───可重试错误,退避───┘      首次提交被微信明确拒绝(4xx) ──▶ FAILED（解冻）
+
+- 网络错误、超时、5xx 无法确定微信是否已受理，只重试、不解冻；用完 WITHDRAW_MAX_ATTEMPTS 次后，
+  或重试时才被拒绝（之前的提交可能已被受理），保持 PROCESSING，交给对账任务按商户批次单号查询：
+  查到则按明细结算，查无此批次才解冻
+
+- 领取使用 SELECT ... FOR UPDATE SKIP LOCKED，多进程部署时不会重复领取
+- 多笔提现合并为一个转账批次，每笔一条明细，按明细单号把结果回写到各自的提现记录
+- 重试始终使用同一个商户批次单号和同样的明细，微信侧幂等，不会重复出款
+- 每个 worker 进程内同时在途的批次数受 WITHDRAW_WORKER_CONCURRENCY 限制
+"""
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import and_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+from loguru import logger
+
+from app.config import settings
+from app.db.database import AsyncSessionLocal
+from app.models.wallet import WalletRecord
+from app.models.withdraw import WithdrawRecord, WithdrawStatus
+from app.services.ledger_service import LedgerService, yuan_to_cents
+from app.services.wechat_pay import wechat_pay_service, WeChatPayError, CircuitOpenError, MAX_DETAILS_PER_BATCH
+from app.utils.id_generator import generate_id
+
+FINAL_STATUSES = (WithdrawStatus.SUCCESS.value, WithdrawStatus.FAILED.value, WithdrawStatus.CANCELLED.value)
+
+
+# ============================================================
+# 提现结算（回调、worker、对账共用，调用方负责提交事务）
+# ============================================================
+
+async def _finalize(db: AsyncSession, record: WithdrawRecord, **values) -> bool:
+    """
+    用一条条件 UPDATE 把提现记录置为终态
+
+    WHERE status 不在终态，影响行数为 0 说明已被回调/worker/对账处理过，调用方直接返回。
+    重复回调只需这一条 UPDATE，不会重复动账。
+    """
+    values.update(completed_at=datetime.now(), next_attempt_at=None)
+    result = await db.execute(
+        update(WithdrawRecord)
+        .where(WithdrawRecord.id == record.id, WithdrawRecord.status.notin_(FINAL_STATUSES))
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        return False
+    # 同步到会话中的对象，避免 flush 时再次写入
+    for key, value in values.items():
+        set_committed_value(record, key, value)
+    return True
+
+
+async def settle_withdraw_success(db: AsyncSession, record: WithdrawRecord) -> bool:
+    """
+    转账成功：扣除余额和冻结金额，记支出流水
+
+    Returns:
+        是否实际执行了结算（记录已是终态时返回 False，保证幂等）
+    """
+    if record.status in FINAL_STATUSES:
+        return False
+    if not await _finalize(db, record, status=WithdrawStatus.SUCCESS.value):
+        return False
+
+    ledger = LedgerService(db)
+    user = await ledger.lock_user(record.user_id)
+    if user is None:
+        raise RuntimeError(f"提现结算失败，用户不存在: withdraw_id={record.withdraw_id}")
+
+    balance_before = user.balance
+    user.balance = balance_before - record.amount
+    user.frozen_balance = (user.frozen_balance or 0) - record.amount
+
+    db.add(WalletRecord(
+        record_id=generate_id("WD"),
+        user_id=user.user_id,
+        type="withdraw",
+        amount=-record.amount,
+        balance_before=balance_before,
+        balance_after=user.balance,
+        remark=f"提现-{record.withdraw_id}"
+    ))
+    await ledger.record_withdraw(user.user_id, record.amount, record.withdraw_id)
+
+    logger.info(f"提现成功: withdraw_id={record.withdraw_id}, amount={record.amount}, user={user.user_id}")
+    return True
+
+
+async def settle_withdraw_failure(
+    db: AsyncSession,
+    record: WithdrawRecord,
+    reason: str,
+    error_code: Optional[str] = None
+) -> bool:
+    """
+    转账失败：解冻金额，记解冻流水
+
+    Returns:
+        是否实际执行了结算（记录已是终态时返回 False，保证幂等）
+    """
+    if record.status in FINAL_STATUSES:
+        return False
+    if not await _finalize(
+        db, record,
+        status=WithdrawStatus.FAILED.value,
+        error_code=(error_code or "")[:32] or None,
+        error_message=(reason or "")[:255]
+    ):
+        return False
+
+    ledger = LedgerService(db)
+    user = await ledger.lock_user(record.user_id)
+    if user is None:
+        raise RuntimeError(f"提现解冻失败，用户不存在: withdraw_id={record.withdraw_id}")
+
+    user.frozen_balance = (user.frozen_balance or 0) - record.amount
+    db.add(WalletRecord(
+        record_id=generate_id("UF"),
+        user_id=user.user_id,
+        type="unfreeze",
+        amount=record.amount,
+        balance_before=user.balance,
+        balance_after=user.balance,
+        remark=f"提现失败解冻-{record.withdraw_id}"
+    ))
+    await ledger.record_unfreeze(user.user_id, record.amount, record.withdraw_id)
+
+    logger.info(f"提现失败已解冻: withdraw_id={record.withdraw_id}, reason={reason}")
+    return True
+
+
+def transfer_outcome(error: Optional[Exception], attempts: int) -> str:
+    """
+    按转账请求的结果决定提现记录的去向
+
+    Returns:
+        accepted   微信已受理
+        rejected   第一次提交即被微信明确拒绝（4xx 业务错误）或被熔断短路，批次从未被受理，可以解冻
+        retry      可重试错误且未用完尝试次数，退回 PENDING 用原批次单号重试
+        unresolved 请求可能已到达微信（网络错误、超时、5xx、未知异常），或重试时才被拒绝/熔断，
+                   不能解冻，保持 PROCESSING 等待对账
+    """
+    if error is None:
+        return "accepted"
+    if isinstance(error, WeChatPayError) and error.retryable and attempts < settings.WITHDRAW_MAX_ATTEMPTS:
+        return "retry"
+    if attempts <= 1 and (
+        isinstance(error, CircuitOpenError)
+        or (isinstance(error, WeChatPayError) and not error.retryable and 400 <= error.status_code < 500)
+    ):
+        # 之后的尝试被拒绝或熔断时，之前结果不明的提交仍可能已被受理，要先由对账确认
+        return "rejected"
+    return "unresolved"
+
+
+# ============================================================
+# 批次明细结果回写
+# ============================================================
+
+def detail_no_of(record: WithdrawRecord) -> str:
+    """
+    提现记录在转账批次中的商户明细单号
+
+    合并批次中明细单号即提现ID；历史单笔批次的批次单号为提现ID，明细单号为 提现ID + "D001"。
+    """
+    if record.out_batch_no == record.withdraw_id:
+        return f"{record.withdraw_id}D001"[:32]
+    return record.withdraw_id
+
+
+def detail_filter(out_batch_no: str, out_detail_no: str):
+    """按 商户批次单号 + 商户明细单号 定位提现记录的查询条件（与 detail_no_of 对应）"""
+    legacy = out_detail_no == f"{out_batch_no}D001"[:32]
+    return and_(
+        WithdrawRecord.out_batch_no == out_batch_no,
+        WithdrawRecord.withdraw_id == (out_batch_no if legacy else out_detail_no)
+    )
+
+
+async def apply_details_to_records(
+    db: AsyncSession,
+    records: List[WithdrawRecord],
+    details: List[Dict]
+) -> Dict[str, int]:
+    """
+    把微信返回的明细状态回写到已加锁的提现记录（调用方负责提交事务）
+
+    Args:
+        records: 同一批次（或多个批次）的提现记录，需已 FOR UPDATE
+        details: [{"out_detail_no", "detail_status", "detail_id", "fail_reason"}, ...]，
+                 多个批次时需带 out_batch_no
+
+    Returns:
+        {"success": 成功结算笔数, "failed": 失败解冻笔数, "pending": 仍在处理中的笔数}
+    """
+    by_detail_no = {(r.out_batch_no, detail_no_of(r)): r for r in records}
+    default_batch = records[0].out_batch_no if records else None
+
+    counts = {"success": 0, "failed": 0, "pending": 0}
+    for detail in details:
+        key = (detail.get("out_batch_no") or default_batch, detail.get("out_detail_no"))
+        record = by_detail_no.get(key)
+        if record is None:
+            logger.warning(f"批次明细找不到提现记录: out_batch_no={key[0]}, out_detail_no={key[1]}")
+            continue
+        if detail.get("detail_id"):
+            record.wechat_detail_id = detail["detail_id"]
+
+        status = detail.get("detail_status")
+        if status == "SUCCESS":
+            if await settle_withdraw_success(db, record):
+                counts["success"] += 1
+        elif status == "FAIL":
+            fail_reason = detail.get("fail_reason") or "UNKNOWN"
+            if await settle_withdraw_failure(db, record, f"转账失败: {fail_reason}", fail_reason):
+                counts["failed"] += 1
+        else:
+            # INIT / WAIT_PAY / PROCESSING，等待下一次回调或对账
+            counts["pending"] += 1
+    return counts
+
+
+async def fetch_batch_results(out_batch_no: str) -> Dict:
+    """
+    向微信查询整个批次的明细结果（不访问数据库）
+
+    Returns:
+        {"batch_status": 批次状态, "details": [{"out_batch_no", "out_detail_no", "detail_status", "fail_reason", ...}]}
+    """
+    batch = await wechat_pay_service.query_batch_details(out_batch_no)
+
+    # 批次明细列表不含失败原因，失败明细单独查询
+    for detail in batch["details"]:
+        detail["out_batch_no"] = out_batch_no
+        if detail.get("detail_status") == "FAIL" and not detail.get("fail_reason"):
+            info = await wechat_pay_service.query_transfer_status(out_batch_no, detail["out_detail_no"])
+            detail["fail_reason"] = info.get("fail_reason")
+    return batch
+
+
+# ============================================================
+# 后台转账 worker
+# ============================================================
+
+class WithdrawWorker:
+    """
+    提现转账 worker 池
+
+    一个调度协程负责轮询领取任务，把到期的提现合并为转账批次，
+    每个批次在独立协程中提交，同时在途的批次数不超过 concurrency。
+    新提现提交后调用 notify() 立即唤醒。
+
+    凑批规则：待处理提现达到 batch_size 笔，或最早一笔已等待 batch_window 秒，
+    即合并为一个批次（一次签名、一次请求）。批次中每条提现一条明细，
+    明细单号为提现ID，结果按明细回写到各自的提现记录。
+    """
+
+    def __init__(self, concurrency: int, poll_interval: float, batch_size: int, batch_window: float):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.batch_size = min(batch_size, MAX_DETAILS_PER_BATCH)
+        self.batch_window = batch_window
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._wakeup = asyncio.Event()
+        self._scheduler: Optional[asyncio.Task] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._running = False
+        self.processed = 0
+        self.failed = 0
+        self.unresolved = 0
+        self.batches = 0
+
+    def notify(self) -> None:
+        """有新任务时唤醒调度协程"""
+        self._wakeup.set()
+
+    async def start(self) -> None:
+        if self._running:
+            return
+        self._running = True
+        self._scheduler = asyncio.create_task(self._run())
+        logger.info(f"提现 worker 已启动 (并发批次上限: {self.concurrency}, 批次大小: {self.batch_size})")
+
+    async def stop(self) -> None:
+        self._running = False
+        self._wakeup.set()
+        if self._scheduler:
+            self._scheduler.cancel()
+            try:
+                await self._scheduler
+            except asyncio.CancelledError:
+                pass
+        # 等待进行中的转账完成，避免请求已发出但结果未落库
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        logger.info("提现 worker 已停止")
+
+    def stats(self) -> dict:
+        return {
+            "running": self._running,
+            "concurrency": self.concurrency,
+            "batch_size": self.batch_size,
+            "batch_window": self.batch_window,
+            "in_flight": len(self._tasks),
+            "batches": self.batches,
+            "processed": self.processed,
+            "failed": self.failed,
+            "unresolved": self.unresolved,
+        }
+
+    async def _run(self) -> None:
+        while self._running:
+            try:
+                while len(self._tasks) < self.concurrency:
+                    out_batch_no = await self.claim_batch()
+                    if out_batch_no is None:
+                        break
+                    task = asyncio.create_task(self._execute(out_batch_no))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._tasks.discard)
+            except Exception as e:
+                logger.error(f"提现 worker 领取任务异常: {e}", exc_info=True)
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def claim_batch(self) -> Optional[str]:
+        """
+        领取一个待提交的批次，批次内到期的 PENDING 记录置为 PROCESSING
+
+        优先领取重试中的批次（沿用原批次单号）；否则把新提现凑成一个新批次。
+
+        Returns:
+            商户批次单号，没有可领取的批次时返回 None
+        """
+        async with AsyncSessionLocal() as db:
+            now = datetime.now()
+
+            # 1. 到期的重试批次
+            head = (await db.execute(
+                select(WithdrawRecord)
+                .where(
+                    WithdrawRecord.status == WithdrawStatus.PENDING.value,
+                    WithdrawRecord.next_attempt_at <= now,
+                    WithdrawRecord.out_batch_no.isnot(None)
+                )
+                .order_by(WithdrawRecord.next_attempt_at)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            )).scalar_one_or_none()
+
+            if head is not None:
+                out_batch_no = head.out_batch_no
+                result = await db.execute(
+                    select(WithdrawRecord)
+                    .where(
+                        WithdrawRecord.out_batch_no == out_batch_no,
+                        WithdrawRecord.status == WithdrawStatus.PENDING.value
+                    )
+                    .with_for_update()
+                )
+                records = result.scalars().all()
+            else:
+                # 2. 新提现凑批
+                result = await db.execute(
+                    select(WithdrawRecord)
+                    .where(
+                        WithdrawRecord.status == WithdrawStatus.PENDING.value,
+                        WithdrawRecord.next_attempt_at <= now,
+                        WithdrawRecord.out_batch_no.is_(None)
+                    )
+                    .order_by(WithdrawRecord.next_attempt_at)
+                    .limit(self.batch_size)
+                    .with_for_update(skip_locked=True)
+                )
+                records = result.scalars().all()
+                if not records:
+                    await db.rollback()
+                    return None
+                oldest_wait = (now - records[0].next_attempt_at).total_seconds()
+                if len(records) < self.batch_size and oldest_wait < self.batch_window:
+                    # 未凑满且未到等待上限，继续等待更多提现
+                    await db.rollback()
+                    return None
+                out_batch_no = generate_id("TB")
+
+            for record in records:
+                record.out_batch_no = out_batch_no
+                record.status = WithdrawStatus.PROCESSING.value
+                record.attempts = (record.attempts or 0) + 1
+            await db.commit()
+            return out_batch_no
+
+    async def _execute(self, out_batch_no: str) -> None:
+        async with self._semaphore:
+            try:
+                await self.process_batch(out_batch_no)
+            except Exception as e:
+                logger.error(f"提现批次执行异常: out_batch_no={out_batch_no}, error={e}", exc_info=True)
+
+    async def process_batch(self, out_batch_no: str) -> None:
+        """提交一个已领取的批次"""
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(WithdrawRecord).where(WithdrawRecord.out_batch_no == out_batch_no)
+            )
+            records = result.scalars().all()
+            if not any(r.status == WithdrawStatus.PROCESSING.value for r in records):
+                return
+            # 重试时明细必须与首次提交完全一致（包括已被回调结算的记录），微信侧才能按批次单号幂等
+            details = [
+                {
+                    "out_detail_no": detail_no_of(r),
+                    "amount_cents": yuan_to_cents(r.amount),
+                    "openid": r.wechat_openid
+                }
+                for r in records
+            ]
+            attempts = max(r.attempts or 0 for r in records if r.status == WithdrawStatus.PROCESSING.value)
+
+        # 调用微信期间不持有数据库连接
+        try:
+            result = await wechat_pay_service.transfer_batch(
+                out_batch_no=out_batch_no,
+                details=details,
+                description="旧衣回收收益提现"
+            )
+            error = None
+        except Exception as e:
+            result, error = None, e
+
+        async with AsyncSessionLocal() as db:
+            records = (await db.execute(
+                select(WithdrawRecord)
+                .where(
+                    WithdrawRecord.out_batch_no == out_batch_no,
+                    WithdrawRecord.status == WithdrawStatus.PROCESSING.value
+                )
+                .with_for_update()
+            )).scalars().all()
+
+            outcome = transfer_outcome(error, attempts)
+            delay = settings.WITHDRAW_RETRY_BACKOFF_SECONDS * (2 ** (attempts - 1))
+            for record in records:
+                if outcome == "accepted":
+                    # 微信已受理，保持 PROCESSING，由回调或对账任务按明细确认最终结果
+                    record.wechat_batch_id = result.get("batch_id")
+                    record.error_code = None
+                    record.error_message = None
+                elif outcome == "rejected":
+                    await settle_withdraw_failure(db, record, f"转账失败: {error}", error.code)
+                else:
+                    code = error.code if isinstance(error, WeChatPayError) else type(error).__name__
+                    record.error_code = code[:32]
+                    record.error_message = str(error)[:255]
+                    if outcome == "retry":
+                        record.status = WithdrawStatus.PENDING.value
+                        record.next_attempt_at = datetime.now() + timedelta(seconds=delay)
+                    else:
+                        # 结果不明：保持 PROCESSING，等对账任务按批次单号确认
+                        record.next_attempt_at = None
+            await db.commit()
+
+        if error is None:
+            self.batches += 1
+            self.processed += len(records)
+            logger.info(
+                f"提现批次已受理: out_batch_no={out_batch_no}, "
+                f"笔数={len(records)}, batch_id={result.get('batch_id')}"
+            )
+        elif outcome == "retry":
+            logger.warning(f"提现批次提交失败，{delay}秒后重试: out_batch_no={out_batch_no}, error={error}")
+        elif outcome == "rejected":
+            self.failed += len(records)
+            logger.error(f"提现批次被拒绝，已解冻: out_batch_no={out_batch_no}, 笔数={len(records)}, error={error}")
+        else:
+            self.unresolved += len(records)
+            logger.error(
+                f"提现批次提交结果不明，等待对账确认: out_batch_no={out_batch_no}, "
+                f"笔数={len(records)}, 尝试={attempts}次, error={error}"
+            )
+
+
+# 全局 worker 实例
+withdraw_worker = WithdrawWorker(
+    concurrency=settings.WITHDRAW_WORKER_CONCURRENCY,
+    poll_interval=settings.WITHDRAW_POLL_INTERVAL_SECONDS,
+    batch_size=settings.WITHDRAW_BATCH_MAX_SIZE,
+    batch_window=settings.WITHDRAW_BATCH_WINDOW_SECONDS
+)
@@ -0,0 +1,42 @@
+"""
+地理距离计算
+"""
+import math
+
+import numpy as np
+
+EARTH_RADIUS_METERS = 6371000
+
+
+def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> int:
+    """计算两点之间的距离(米)"""
+    lat1_rad = math.radians(lat1)
+    lat2_rad = math.radians(lat2)
+    delta_lat = math.radians(lat2 - lat1)
+    delta_lon = math.radians(lon2 - lon1)
+
+    a = math.sin(delta_lat / 2) ** 2 + \
+        math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lon / 2) ** 2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+    return int(EARTH_RADIUS_METERS * c)
+
+
+def haversine(latitude: float, longitude: float, lats: np.ndarray, lngs: np.ndarray) -> np.ndarray:
+    """一点到一组点的球面距离(米)，与 calculate_distance 公式一致（NumPy 向量化）"""
+    lat1 = math.radians(latitude)
+    lat2 = np.radians(lats)
+    delta_lat = lat2 - lat1
+    delta_lng = np.radians(lngs) - math.radians(longitude)
+    a = np.sin(delta_lat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(delta_lng / 2) ** 2
+    return EARTH_RADIUS_METERS * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def distance_matrix(lats: np.ndarray, lngs: np.ndarray, dtype=np.float32) -> np.ndarray:
+    """两两球面距离矩阵(米)，n 个点占用 n² 个 dtype"""
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    lng = np.radians(np.asarray(lngs, dtype=np.float64))
+    delta_lat = lat[:, None] - lat[None, :]
+    delta_lng = lng[:, None] - lng[None, :]
+    a = np.sin(delta_lat / 2) ** 2 + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin(delta_lng / 2) ** 2
+    return (EARTH_RADIUS_METERS * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))).astype(dtype)
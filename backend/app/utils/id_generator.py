@@ -0,0 +1,203 @@
+"""
+时间有序的紧凑ID生成器（Snowflake 风格）
+
+64位整数布局（最高位恒为0）：
+    41位 毫秒时间戳（自 2024-01-01 起，可用约69年）
+    10位 工作进程ID（0-1023）
+    12位 毫秒内序列号（每毫秒4096个）
+
+整数按 Crockford Base32 编码为定长13位字符串，字母表按 ASCII 升序排列，
+因此字符串的字典序与数值顺序一致：同一进程内严格递增，跨进程按时间大致有序。
+相比 uuid4 随机值，新ID总是追加在唯一索引 B+ 树的右侧，避免随机页分裂。
+
+工作进程ID通过 ID_WORKER_ID 配置，配置值是本机的起始ID：单机 N 个 worker 进程
+（DATABASE_WORKERS，未配置时读取 WEB_CONCURRENCY）依次占用 ID_WORKER_ID ~ ID_WORKER_ID+N-1，
+每个进程启动时用文件锁领取其中一个空闲编号，多机部署时各机器的起始ID至少相隔 N。
+未配置时从主机名散列出的起点开始，用同样的文件锁领取本机空闲编号：同一台机器上的进程不会重复，
+不同机器之间不保证唯一，多机部署时应显式配置。
+"""
+import os
+import socket
+import tempfile
+import threading
+import time
+import zlib
+from typing import List, Optional
+
+from app.config import settings
+
+# 自定义纪元: 2024-01-01 00:00:00 UTC
+EPOCH_MS = 1704067200000
+
+WORKER_ID_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_ID_BITS) - 1
+SEQUENCE_MASK = (1 << SEQUENCE_BITS) - 1
+WORKER_ID_SHIFT = SEQUENCE_BITS
+TIMESTAMP_SHIFT = SEQUENCE_BITS + WORKER_ID_BITS
+
+# Crockford Base32（去掉 I L O U，ASCII 升序）
+BASE32_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+ENCODED_LENGTH = 13  # 13 * 5 = 65 位 >= 63 位
+
+
+def encode_base32(value: int) -> str:
+    """将非负整数编码为定长 Base32 字符串"""
+    chars = []
+    for _ in range(ENCODED_LENGTH):
+        chars.append(BASE32_ALPHABET[value & 0x1F])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+def decode_base32(text: str) -> int:
+    """Base32 字符串还原为整数"""
+    value = 0
+    for ch in text:
+        value = (value << 5) | BASE32_ALPHABET.index(ch)
+    return value
+
+
+def worker_count() -> int:
+    """本机 worker 进程数（与连接池预算相同，见 app.db.pool）"""
+    return settings.DATABASE_WORKERS or int(os.environ.get("WEB_CONCURRENCY") or 1)
+
+
+def _lock_worker_slot(worker_id: int) -> bool:
+    """用文件锁占用本机的一个工作进程ID，进程退出时自动释放"""
+    import fcntl
+
+    path = os.path.join(tempfile.gettempdir(), f"clothing-recycle-id-worker-{worker_id}.lock")
+    fd = os.open(path, os.O_CREAT | os.O_RDWR, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return False
+    # 文件描述符保持打开直到进程退出
+    _slot_fds.append(fd)
+    return True
+
+
+def default_worker_id() -> int:
+    """
+    未配置 ID_WORKER_ID 时，从主机名散列出的起点开始领取本机第一个空闲的工作进程ID
+
+    同一台机器上的进程（多个 worker、同时运行的脚本）由文件锁保证互不重复；
+    不同机器只是起点不同，多机部署仍需为每台机器配置 ID_WORKER_ID。
+
+    Raises:
+        RuntimeError: 本机 1024 个编号已被占满，或当前平台不支持文件锁且有多个 worker 进程
+    """
+    start = zlib.crc32(socket.gethostname().encode("utf-8")) & MAX_WORKER_ID
+    try:
+        for offset in range(MAX_WORKER_ID + 1):
+            worker_id = (start + offset) & MAX_WORKER_ID
+            if _lock_worker_slot(worker_id):
+                return worker_id
+    except ImportError:
+        # 没有 fcntl（Windows）时无法在进程间分配编号，只允许单进程运行
+        if worker_count() > 1:
+            raise RuntimeError("当前平台不支持文件锁分配工作进程ID，多 worker 进程部署必须配置 ID_WORKER_ID")
+        return start
+    raise RuntimeError(f"本机工作进程ID 0-{MAX_WORKER_ID} 已被占满")
+
+
+def configured_worker_id(base: int) -> int:
+    """
+    以 ID_WORKER_ID 为本机起始ID，为当前进程领取一个空闲的工作进程ID
+
+    Raises:
+        RuntimeError: 编号超出范围，或本机编号已被其他进程占满（多进程时配置了固定ID）
+    """
+    workers = worker_count()
+    if workers <= 1:
+        return base
+    if base + workers - 1 > MAX_WORKER_ID:
+        raise RuntimeError(f"ID_WORKER_ID={base} 加 {workers} 个 worker 超出范围 0-{MAX_WORKER_ID}")
+    try:
+        for worker_id in range(base, base + workers):
+            if _lock_worker_slot(worker_id):
+                return worker_id
+    except ImportError:
+        # 没有 fcntl（Windows）时无法在进程间分配编号
+        raise RuntimeError("多 worker 进程部署不能使用固定的 ID_WORKER_ID（当前平台不支持文件锁分配）")
+    raise RuntimeError(f"ID_WORKER_ID {base}~{base + workers - 1} 已被本机其他进程占满")
+
+
+class SnowflakeGenerator:
+    """
+    Snowflake ID 生成器（线程安全，进程内单调递增）
+
+    时钟回拨时不等待、不报错：沿用上次的逻辑时间戳继续分配序列号，
+    序列号用尽则逻辑时间戳前进1毫秒，保证ID始终递增。
+    """
+
+    def __init__(self, worker_id: int):
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"worker_id 必须在 0-{MAX_WORKER_ID} 之间")
+        self.worker_id = worker_id
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._sequence = 0
+
+    def next_id(self) -> int:
+        """生成下一个整数ID"""
+        with self._lock:
+            now_ms = int(time.time() * 1000) - EPOCH_MS
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._sequence = 0
+            else:
+                # 同一毫秒内或时钟回拨：在逻辑时间戳上递增序列号
+                self._sequence = (self._sequence + 1) & SEQUENCE_MASK
+                if self._sequence == 0:
+                    self._last_ms += 1
+
+            return (
+                (self._last_ms << TIMESTAMP_SHIFT)
+                | (self.worker_id << WORKER_ID_SHIFT)
+                | self._sequence
+            )
+
+    def next_str(self, prefix: str = "") -> str:
+        """生成带前缀的定长字符串ID"""
+        return f"{prefix}{encode_base32(self.next_id())}"
+
+
+def parse_id(text: str, prefix: str = "") -> dict:
+    """解析ID中的时间戳、工作进程ID和序列号（排查问题用）"""
+    value = decode_base32(text[len(prefix):])
+    timestamp_ms = (value >> TIMESTAMP_SHIFT) + EPOCH_MS
+    return {
+        "timestamp_ms": timestamp_ms,
+        "worker_id": (value >> WORKER_ID_SHIFT) & MAX_WORKER_ID,
+        "sequence": value & SEQUENCE_MASK,
+    }
+
+
+_generator: Optional[SnowflakeGenerator] = None
+_generator_pid: Optional[int] = None
+_slot_fds: List[int] = []
+_init_lock = threading.Lock()
+
+
+def get_generator() -> SnowflakeGenerator:
+    """获取当前进程的生成器（fork 后自动重建）"""
+    global _generator, _generator_pid
+    pid = os.getpid()
+    if _generator is None or _generator_pid != pid:
+        with _init_lock:
+            if _generator is None or _generator_pid != pid:
+                if settings.ID_WORKER_ID is None:
+                    worker_id = default_worker_id()
+                else:
+                    worker_id = configured_worker_id(settings.ID_WORKER_ID)
+                _generator = SnowflakeGenerator(worker_id)
+                _generator_pid = pid
+    return _generator
+
+
+def generate_id(prefix: str = "") -> str:
+    """生成带业务前缀的ID，如 generate_id("ORD") -> ORD0C8Z1W9Q3K2AB"""
+    return get_generator().next_str(prefix)
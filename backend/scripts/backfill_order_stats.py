@@ -0,0 +1,67 @@
+"""
+订单按日汇总回填脚本
+
+按天从 delivery_orders 重算 order_daily_device_stats / order_daily_stats，
+每天一个事务，可在服务运行期间执行（当天的新订单会等待该天重算提交后再累加）。
+执行迁移 v0008 后运行一次，即可把历史订单补进汇总表；之后也可用于修正某段日期。
+
+使用方法:
+    python scripts/backfill_order_stats.py
+    python scripts/backfill_order_stats.py --start 2024-01-01 --end 2024-03-31 --sleep 0.1
+"""
+import argparse
+import asyncio
+import sys
+import time
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Optional
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import select, func
+
+from app.db.database import engine, AsyncSessionLocal
+from app.models.order import DeliveryOrder
+from app.services.order_stats_service import rebuild_day
+
+
+async def main(start: Optional[date], end: Optional[date], sleep: float) -> int:
+    try:
+        if start is None:
+            async with AsyncSessionLocal() as db:
+                earliest = (await db.execute(select(func.min(DeliveryOrder.created_at)))).scalar()
+            if earliest is None:
+                print("没有订单，无需回填")
+                return 0
+            start = earliest.date()
+        end = end or date.today()
+
+        started = time.perf_counter()
+        day = start
+        days = 0
+        while day <= end:
+            async with AsyncSessionLocal() as db:
+                devices = await rebuild_day(db, day)
+                await db.commit()
+            days += 1
+            if devices:
+                print(f"{day}: {devices} 台设备")
+            day += timedelta(days=1)
+            if sleep:
+                await asyncio.sleep(sleep)
+    finally:
+        await engine.dispose()
+
+    print(f"✅ 已回填 {start} ~ {end} 共 {days} 天, 耗时 {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="订单按日汇总回填")
+    parser.add_argument("--start", type=date.fromisoformat, help="起始日期 YYYY-MM-DD，默认最早订单日期")
+    parser.add_argument("--end", type=date.fromisoformat, help="结束日期 YYYY-MM-DD，默认今天")
+    parser.add_argument("--sleep", type=float, default=0.0, help="每天之间暂停秒数，降低对线上库的压力")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.start, args.end, args.sleep)))
@@ -0,0 +1,74 @@
+"""
+满仓预测回归基准测试（不连接数据库）
+
+随机生成设备每日投递重量（基础速度 + 线性趋势 + 周末波动 + 噪声，部分设备长期无投递）和当前容量，
+对每组设备数输出回归耗时，以及按真实速度计算的满仓天数与预测值的中位误差。
+
+使用方法:
+    python scripts/bench_fill_forecast.py                       # 1万 / 5万 / 10万台设备
+    python scripts/bench_fill_forecast.py --devices 50000 --days 28
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+
+from app.services.fill_regression import forecast
+
+CAPACITY_KG = 100.0
+
+
+def generate(devices: int, days: int, seed: int):
+    rng = np.random.default_rng(seed)
+    base = rng.gamma(2.0, 3.0, size=devices)
+    slope = rng.normal(0, 0.05, size=devices) * base
+    t = np.arange(days + 30, dtype=np.float64)
+    weekend = np.where(t % 7 >= 5, 1.3, 1.0)
+    rate = np.maximum(base[:, None] + slope[:, None] * (t - days), 0) * weekend
+    history = np.maximum(rate[:, :days] + rng.normal(0, 1.0, size=(devices, days)), 0)
+    history[rng.random(devices) < 0.05] = 0
+    percent = rng.integers(0, 100, size=devices).astype(np.float64)
+    weight = CAPACITY_KG * percent / 100 * rng.uniform(0.9, 1.1, size=devices)
+    # 按未来真实速度累计到满仓的天数
+    remaining = CAPACITY_KG * (100 - percent) / 100
+    cumulative = np.cumsum(rate[:, days:], axis=1)
+    reached = cumulative >= remaining[:, None]
+    actual = np.where(reached.any(axis=1), reached.argmax(axis=1) + 0.5, np.nan)
+    return history, weight, percent, actual
+
+
+def run_case(devices: int, days: int, half_life: float) -> None:
+    history, weight, percent, actual = generate(devices, days, seed=devices)
+    started = time.perf_counter()
+    result = forecast(
+        history, weight, percent, np.zeros(devices), half_life=half_life,
+        default_capacity=CAPACITY_KG, horizon=30.0,
+    )
+    elapsed = (time.perf_counter() - started) * 1000
+    predicted = result["days_to_full"]
+    both = ~np.isnan(predicted) & ~np.isnan(actual)
+    error = np.median(np.abs(predicted[both] - actual[both])) if both.any() else float("nan")
+    print(
+        f"{devices:>7} 台 × {days} 天 | 回归 {elapsed:7.1f}ms | "
+        f"预计满仓 {int(np.count_nonzero(~np.isnan(predicted))):>6} 台 | 满仓天数中位误差 {error:.2f} 天"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="满仓预测回归基准测试")
+    parser.add_argument("--devices", type=int, nargs="+", default=[10000, 50000, 100000], help="设备数")
+    parser.add_argument("--days", type=int, default=28, help="历史天数")
+    parser.add_argument("--half-life", type=float, default=7.0, help="权重半衰期(天)")
+    args = parser.parse_args()
+
+    for devices in args.devices:
+        run_case(devices, args.days, args.half_life)
+
+
+if __name__ == "__main__":
+    main()
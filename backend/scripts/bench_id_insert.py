@@ -0,0 +1,95 @@
+"""
+ID 生成方式插入吞吐基准测试
+
+在临时表上对比两种ID写入唯一索引的吞吐量：
+  - before: 旧实现（uuid4().hex 片段，随机分布）
+  - after:  Snowflake 时间有序ID（app.utils.id_generator）
+
+临时表结构模拟业务表：自增主键 + VARCHAR(32) 唯一索引。
+测试结束后自动删除临时表。
+
+使用方法:
+    python scripts/bench_id_insert.py                    # 默认各插入 200000 行
+    python scripts/bench_id_insert.py --rows 1000000 --batch 2000
+"""
+import argparse
+import asyncio
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import text
+
+from app.db.database import engine
+from app.utils.id_generator import generate_id
+
+BENCH_TABLE = "bench_id_insert"
+
+
+def legacy_order_id() -> str:
+    """旧版订单ID生成方式"""
+    return f"ORD{datetime.now().strftime('%Y%m%d%H%M%S')}{uuid.uuid4().hex[:6].upper()}"
+
+
+def legacy_freeze_id() -> str:
+    """旧版冻结记录ID生成方式（32位）"""
+    return f"FR{uuid.uuid4().hex[:28].upper()}"
+
+
+async def run_case(name: str, id_factory, rows: int, batch: int) -> float:
+    """向空临时表插入 rows 行，返回每秒插入行数"""
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP TABLE IF EXISTS {BENCH_TABLE}"))
+        await conn.execute(text(
+            f"CREATE TABLE {BENCH_TABLE} ("
+            "  id BIGINT AUTO_INCREMENT PRIMARY KEY,"
+            "  ext_id VARCHAR(32) NOT NULL,"
+            "  payload VARCHAR(64) NULL,"
+            "  UNIQUE KEY uk_ext_id (ext_id)"
+            ") ENGINE=InnoDB"
+        ))
+
+    insert_sql = text(f"INSERT INTO {BENCH_TABLE} (ext_id, payload) VALUES (:ext_id, :payload)")
+    start = time.perf_counter()
+    inserted = 0
+    async with engine.connect() as conn:
+        while inserted < rows:
+            size = min(batch, rows - inserted)
+            params = [{"ext_id": id_factory(), "payload": "x" * 32} for _ in range(size)]
+            await conn.execute(insert_sql, params)
+            await conn.commit()
+            inserted += size
+    elapsed = time.perf_counter() - start
+
+    rate = rows / elapsed
+    print(f"{name:<28} {rows:>9} 行  {elapsed:>8.2f} 秒  {rate:>10.0f} 行/秒")
+    return rate
+
+
+async def main(rows: int, batch: int):
+    print(f"插入 {rows} 行，每批 {batch} 行\n")
+    try:
+        before_order = await run_case("before: ORD+时间+uuid6", legacy_order_id, rows, batch)
+        before_freeze = await run_case("before: FR+uuid28", legacy_freeze_id, rows, batch)
+        after = await run_case("after:  Snowflake", lambda: generate_id("ORD"), rows, batch)
+
+        print()
+        print(f"Snowflake 相对 ORD+uuid 提升: {after / before_order:.2f}x")
+        print(f"Snowflake 相对 FR+uuid28 提升: {after / before_freeze:.2f}x")
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"DROP TABLE IF EXISTS {BENCH_TABLE}"))
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ID 生成方式插入吞吐基准测试")
+    parser.add_argument("--rows", type=int, default=200000, help="每种方式插入的行数")
+    parser.add_argument("--batch", type=int, default=1000, help="每批插入行数")
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.batch))
@@ -0,0 +1,136 @@
+"""
+登录洪峰期间的事件循环延迟基准
+
+本地模式（默认）：在同一个事件循环里一边并发执行 N 次 bcrypt 校验，一边用
+每 5ms 一次的探测协程测量事件循环的调度延迟，对比两种实现：
+    inline  - 直接在协程中调用 pwd_context.verify（改造前的做法）
+    offload - password_hasher.verify（线程池 + 并发上限）
+
+服务模式（--url）：向运行中的服务并发发起 N 次管理员登录，同时每 10ms 请求一次
+/health，统计探测请求的延迟，反映同一 worker 上其他请求受到的影响。
+
+使用方法:
+    python scripts/bench_login_loop_latency.py --logins 50
+    python scripts/bench_login_loop_latency.py --url http://127.0.0.1:8000 --logins 50 \\
+        --username admin --password admin123
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services.password_service import password_hasher, pwd_context, PasswordBusyError
+
+
+def summarize(name: str, samples: List[float], elapsed: float, logins: int, rejected: int = 0) -> None:
+    samples = sorted(samples)
+    p = lambda q: samples[min(len(samples) - 1, int(len(samples) * q))] if samples else 0.0
+    print(
+        f"{name:<8} 登录 {logins} 次 (拒绝 {rejected}) 用时 {elapsed:.2f}s | "
+        f"延迟 p50={p(0.5):.1f}ms p99={p(0.99):.1f}ms max={samples[-1] if samples else 0:.1f}ms "
+        f"mean={statistics.mean(samples) if samples else 0:.1f}ms (样本 {len(samples)})"
+    )
+
+
+async def probe_loop(stop: asyncio.Event, samples: List[float], interval: float = 0.005) -> None:
+    """测量事件循环调度延迟：期望 interval 后醒来，实际多等了多久"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append((time.perf_counter() - started - interval) * 1000)
+
+
+async def run_local(mode: str, logins: int, hashed: str) -> None:
+    samples: List[float] = []
+    stop = asyncio.Event()
+    rejected = 0
+
+    async def login():
+        nonlocal rejected
+        if mode == "inline":
+            pwd_context.verify("wrong-password", hashed)
+        else:
+            try:
+                await password_hasher.verify("wrong-password", hashed)
+            except PasswordBusyError:
+                rejected += 1
+
+    probe = asyncio.create_task(probe_loop(stop, samples))
+    await asyncio.sleep(0.05)
+    started = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe
+    summarize(mode, samples, elapsed, logins, rejected)
+
+
+async def run_remote(url: str, logins: int, username: str, password: str) -> None:
+    import httpx
+
+    samples: List[float] = []
+    stop = asyncio.Event()
+    statuses = {}
+
+    async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+        async def probe():
+            while not stop.is_set():
+                started = time.perf_counter()
+                await client.get("/health")
+                samples.append((time.perf_counter() - started) * 1000)
+                await asyncio.sleep(0.01)
+
+        async def login():
+            response = await client.post(
+                "/api/v1/admin/auth/login",
+                json={"username": username, "password": password}
+            )
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        probe_task = asyncio.create_task(probe())
+        await asyncio.sleep(0.5)
+        baseline = list(samples)
+        started = time.perf_counter()
+        await asyncio.gather(*(login() for _ in range(logins)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await probe_task
+
+    summarize("baseline", baseline, 0.5, 0)
+    summarize("burst", samples[len(baseline):], elapsed, logins, statuses.get(429, 0))
+    print(f"登录响应状态码: {statuses}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="登录洪峰期间的事件循环延迟基准")
+    parser.add_argument("--logins", type=int, default=50, help="并发登录次数")
+    parser.add_argument("--url", help="服务地址，指定时测试运行中的服务")
+    parser.add_argument("--username", default="admin")
+    parser.add_argument("--password", default="admin123")
+    args = parser.parse_args()
+
+    if args.url:
+        asyncio.run(run_remote(args.url, args.logins, args.username, args.password))
+        return
+
+    hashed = pwd_context.hash("benchmark-password")
+    print(f"bcrypt 单次校验耗时约 {timed_verify(hashed):.1f}ms, 线程池: {password_hasher.stats()['threads']}")
+    asyncio.run(run_local("inline", args.logins, hashed))
+    asyncio.run(run_local("offload", args.logins, hashed))
+    password_hasher.shutdown()
+
+
+def timed_verify(hashed: str) -> float:
+    started = time.perf_counter()
+    pwd_context.verify("wrong-password", hashed)
+    return (time.perf_counter() - started) * 1000
+
+
+if __name__ == "__main__":
+    main()
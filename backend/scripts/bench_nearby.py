@@ -0,0 +1,91 @@
+"""
+附近设备查询基准测试（不连接数据库）
+
+在一个城市范围内随机生成设备坐标，对比两种实现的单次查询耗时：
+  - before: 遍历全部设备，逐台用纯 Python 计算距离（原 /device/nearby 实现）
+  - after:  网格索引取候选 + NumPy 向量化距离（app.services.device_geo_index）
+
+使用方法:
+    python scripts/bench_nearby.py                               # 1k / 10k / 100k 台设备
+    python scripts/bench_nearby.py --devices 100000 --radius 3000 --limit 20
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services.device_geo_index import GridGeoIndex, rank_candidates
+from app.utils.geo import calculate_distance
+
+# 城市中心及范围（约 60km × 60km）
+CENTER = (31.23, 121.47)
+SPAN_DEGREES = 0.3
+
+
+def legacy_nearby(points, latitude, longitude, radius):
+    nearby = []
+    for device_id, lat, lng in points:
+        distance = calculate_distance(latitude, longitude, lat, lng)
+        if distance <= radius:
+            nearby.append((device_id, distance))
+    nearby.sort(key=lambda item: item[1])
+    return nearby
+
+
+def timed(func, queries):
+    samples = []
+    for latitude, longitude in queries:
+        started = time.perf_counter()
+        func(latitude, longitude)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def run_case(devices: int, radius: float, limit, queries: int, cell_degrees: float) -> None:
+    rng = random.Random(devices)
+    points = [
+        (f"DEV{i:08d}",
+         CENTER[0] + rng.uniform(-SPAN_DEGREES, SPAN_DEGREES),
+         CENTER[1] + rng.uniform(-SPAN_DEGREES, SPAN_DEGREES))
+        for i in range(devices)
+    ]
+    index = GridGeoIndex(cell_degrees=cell_degrees, resync_interval=0)
+    for device_id, lat, lng in points:
+        index.apply(device_id, (lat, lng))
+    spots = [
+        (CENTER[0] + rng.uniform(-SPAN_DEGREES, SPAN_DEGREES), CENTER[1] + rng.uniform(-SPAN_DEGREES, SPAN_DEGREES))
+        for _ in range(queries)
+    ]
+
+    before = timed(lambda lat, lng: legacy_nearby(points, lat, lng, radius)[:limit], spots)
+    after = timed(
+        lambda lat, lng: rank_candidates(lat, lng, radius, index._candidates(lat, lng, radius), limit),
+        spots
+    )
+    print(
+        f"{devices:>8} 台 | before p50 {before[0]:8.2f}ms p99 {before[1]:8.2f}ms"
+        f" | after p50 {after[0]:6.2f}ms p99 {after[1]:6.2f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="附近设备查询基准测试")
+    parser.add_argument("--devices", type=int, nargs="+", default=[1000, 10000, 100000], help="设备数量")
+    parser.add_argument("--radius", type=float, default=5000, help="搜索半径(米)")
+    parser.add_argument("--limit", type=int, default=None, help="只取最近的 N 台")
+    parser.add_argument("--queries", type=int, default=200, help="每组查询次数")
+    parser.add_argument("--cell", type=float, default=0.01, help="网格边长(度)")
+    args = parser.parse_args()
+
+    for devices in args.devices:
+        run_case(devices, args.radius, args.limit, args.queries, args.cell)
+
+
+if __name__ == "__main__":
+    main()
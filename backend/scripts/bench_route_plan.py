@@ -0,0 +1,70 @@
+"""
+收运路线规划基准测试（不连接数据库）
+
+在一个城市范围内随机生成站点（部分聚集成片区），对每组站点数输出：
+  - 最近邻初始里程、2-opt 后里程及改进比例
+  - 求解耗时（含分组、距离计算、最近邻和 2-opt）
+
+使用方法:
+    python scripts/bench_route_plan.py                                  # 1k / 5k / 20k 个站点
+    python scripts/bench_route_plan.py --stops 5000 --vehicles 20 --budget 5
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import numpy as np
+
+from app.services.route_solver import solve_routes
+
+# 城市中心及范围（约 60km × 60km）
+CENTER = (31.23, 121.47)
+SPAN_DEGREES = 0.3
+
+
+def generate_stops(count: int, seed: int):
+    """一半均匀分布，一半聚集在 20 个片区"""
+    rng = np.random.default_rng(seed)
+    uniform = count // 2
+    hubs = rng.uniform(-SPAN_DEGREES, SPAN_DEGREES, size=(20, 2))
+    clustered = hubs[rng.integers(0, 20, size=count - uniform)] + rng.normal(0, 0.01, size=(count - uniform, 2))
+    points = np.vstack([rng.uniform(-SPAN_DEGREES, SPAN_DEGREES, size=(uniform, 2)), clustered])
+    return CENTER[0] + points[:, 0], CENTER[1] + points[:, 1]
+
+
+def run_case(stops: int, vehicles: int, budget: float, matrix_max: int, window: int) -> None:
+    lats, lngs = generate_stops(stops, seed=stops)
+    started = time.perf_counter()
+    routes = solve_routes(lats, lngs, CENTER, vehicles, budget, matrix_max_stops=matrix_max, window=window)
+    elapsed = time.perf_counter() - started
+
+    initial = sum(route["initial_distance"] for route in routes) / 1000
+    final = sum(route["distance"] for route in routes) / 1000
+    moves = sum(route["moves"] for route in routes)
+    assert sorted(int(i) for route in routes for i in route["stops"]) == list(range(stops))
+    print(
+        f"{stops:>6} 站点 {vehicles:>3} 车 | 最近邻 {initial:9.1f}km → 2-opt {final:9.1f}km "
+        f"({(1 - final / initial) * 100:5.1f}%, {moves} 次交换) | 耗时 {elapsed:6.2f}s"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="收运路线规划基准测试")
+    parser.add_argument("--stops", type=int, nargs="+", default=[1000, 5000, 20000], help="站点数")
+    parser.add_argument("--vehicles", type=int, default=None, help="车辆数，默认每车约 60 个站点")
+    parser.add_argument("--budget", type=float, default=2.0, help="求解时间预算(秒)")
+    parser.add_argument("--matrix-max", type=int, default=2000, help="预先计算距离矩阵的单车站点数上限")
+    parser.add_argument("--window", type=int, default=1000, help="2-opt 窗口")
+    args = parser.parse_args()
+
+    for stops in args.stops:
+        vehicles = args.vehicles or max(1, -(-stops // 60))
+        run_case(stops, vehicles, args.budget, args.matrix_max, args.window)
+
+
+if __name__ == "__main__":
+    main()
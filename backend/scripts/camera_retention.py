@@ -0,0 +1,45 @@
+"""
+摄像头图片保留策略手动执行
+
+按 CAMERA_RETENTION_* 配置清理过期摄像头图片（告警批次永久保留），
+默认同样只在 CAMERA_RETENTION_WINDOW 时段内执行，--force 忽略时段。
+
+使用方法:
+    python scripts/camera_retention.py --dry-run     # 只统计可回收的图片数和字节数
+    python scripts/camera_retention.py --force
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.db.database import engine
+from app.services.camera_retention import camera_retention_job
+
+
+async def main(dry_run: bool, force: bool) -> int:
+    if not force and not camera_retention_job.in_window():
+        print("当前不在 CAMERA_RETENTION_WINDOW 时段内，使用 --force 忽略")
+        return 1
+    try:
+        result = await camera_retention_job.run_once(dry_run=dry_run, respect_window=not force)
+    finally:
+        await engine.dispose()
+
+    prefix = "可回收" if dry_run else "已回收"
+    for camera, item in result.items():
+        print(f"{camera}: {item['images']} 张, {prefix} {item['reclaimed_bytes'] / 1024 / 1024:.1f}MB")
+    if not result:
+        print("没有需要处理的图片（或其他进程正在执行）")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="摄像头图片保留策略")
+    parser.add_argument("--dry-run", action="store_true", help="只统计不删除")
+    parser.add_argument("--force", action="store_true", help="忽略执行时段")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.dry_run, args.force)))
@@ -0,0 +1,43 @@
+"""
+设备状态聚合一致性检查
+
+从数据库加载设备状态聚合（Python 条件），再用原来的 SQL 条件逐项比对设备ID集合，
+检查两套条件定义是否一致。运行中服务的聚合可通过
+GET /api/v1/admin/system/fleet-state/verify 检查（只反映请求落到的那个进程）。
+
+使用方法:
+    python scripts/check_fleet_state.py
+
+存在不一致时以非零状态退出。
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.db.database import engine
+from app.services.fleet_state import fleet_state
+
+
+async def main() -> int:
+    try:
+        await fleet_state.resync()
+        mismatches = await fleet_state.verify()
+        counts = fleet_state.counts()
+    finally:
+        await engine.dispose()
+
+    print("聚合计数: " + ", ".join(f"{name}={count}" for name, count in counts.items()))
+    for name, diff in mismatches.items():
+        print(f"❌ {name}: 缺失 {diff['missing'][:20]} 多出 {diff['extra'][:20]}")
+
+    if not mismatches:
+        print("✅ 设备状态聚合与数据库一致")
+        return 0
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,171 @@
+"""
+热点查询执行计划检查
+
+对每个热点查询执行 EXPLAIN，若目标表出现全表扫描（type=ALL）或未命中
+预期索引则判定失败，以非零状态退出，可作为迁移后的回归检查。
+
+注意：表数据量很小时 MySQL 优化器可能直接选择全表扫描，
+请在接近生产数据量的库上运行。
+
+使用方法:
+    python scripts/check_query_plans.py
+"""
+import asyncio
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import select, func, desc
+
+from app.db.database import engine
+from app.models.order import DeliveryOrder
+from app.models.user import User
+from app.models.wallet import WalletRecord
+from app.models.device_camera import DeviceCameraImage
+from app.models.withdraw import WithdrawRecord
+from app.services.withdraw_reconciler import OPEN_STATUSES
+
+
+async def _sample_value(conn, column, default: str) -> str:
+    """取一条真实数据作为查询参数，使执行计划更贴近线上"""
+    value = (await conn.execute(
+        select(column).where(column.isnot(None)).limit(1)
+    )).scalar()
+    return value or default
+
+
+async def build_hot_queries(conn):
+    """构建热点查询（与接口中的查询保持一致）"""
+    user_id = await _sample_value(conn, DeliveryOrder.user_id, "U00000000000")
+    device_id = await _sample_value(conn, DeliveryOrder.device_id, "DEV001")
+    wallet_user_id = await _sample_value(conn, WalletRecord.user_id, user_id)
+    camera_device_id = await _sample_value(conn, DeviceCameraImage.device_id, device_id)
+    today_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    return [
+        (
+            "用户订单列表 /order/list",
+            "delivery_orders",
+            "ix_delivery_orders_user_created",
+            select(DeliveryOrder)
+            .where(DeliveryOrder.user_id == user_id)
+            .order_by(DeliveryOrder.created_at.desc())
+            .limit(20),
+        ),
+        (
+            "设备今日订单统计 /admin/device/detail",
+            "delivery_orders",
+            "ix_delivery_orders_device_created",
+            select(
+                func.count(DeliveryOrder.id),
+                func.coalesce(func.sum(DeliveryOrder.weight), 0)
+            ).where(
+                DeliveryOrder.device_id == device_id,
+                DeliveryOrder.created_at >= today_start
+            ),
+        ),
+        (
+            "钱包交易记录 /wallet/records",
+            "wallet_records",
+            "ix_wallet_records_user_created",
+            select(WalletRecord)
+            .where(WalletRecord.user_id == wallet_user_id)
+            .order_by(WalletRecord.created_at.desc())
+            .limit(20),
+        ),
+        (
+            "摄像头图片批次 /admin/device/{id}/camera-images",
+            "device_camera_images",
+            "ix_device_camera_images_device_batch_created",
+            select(DeviceCameraImage.batch_id)
+            .where(DeviceCameraImage.device_id == camera_device_id)
+            .group_by(DeviceCameraImage.batch_id)
+            .order_by(desc(func.max(DeviceCameraImage.created_at)))
+            .limit(10),
+        ),
+        (
+            "提现对账滞留扫描（withdraw_reconciler）",
+            "withdraw_records",
+            "ix_withdraw_records_status_updated",
+            select(WithdrawRecord.out_batch_no)
+            .where(
+                WithdrawRecord.status.in_(OPEN_STATUSES),
+                WithdrawRecord.updated_at < datetime.now() - timedelta(minutes=10),
+                WithdrawRecord.out_batch_no.isnot(None)
+            )
+            .order_by(WithdrawRecord.updated_at)
+            .limit(500),
+        ),
+        (
+            "摄像头图片保留策略扫描（camera_retention）",
+            "device_camera_images",
+            "ix_device_camera_images_retention",
+            select(DeviceCameraImage.id, DeviceCameraImage.created_at)
+            .where(
+                DeviceCameraImage.camera_type == 2,
+                DeviceCameraImage.is_alarm == 0,
+                DeviceCameraImage.compacted_at == None,
+                DeviceCameraImage.created_at < datetime.now() - timedelta(days=30)
+            )
+            .order_by(DeviceCameraImage.created_at, DeviceCameraImage.id)
+            .limit(200),
+        ),
+        (
+            "后台用户手机尾号查找 /admin/user/list",
+            "users",
+            "ix_users_phone_reversed",
+            select(User)
+            .where(User.phone_reversed.like("8765%"))
+            .order_by(User.created_at.desc())
+            .limit(20),
+        ),
+    ]
+
+
+async def explain(conn, stmt) -> list:
+    """执行 EXPLAIN 并返回计划行"""
+    compiled = stmt.compile(dialect=conn.dialect)
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    result = await conn.exec_driver_sql(f"EXPLAIN {compiled}", params)
+    return [dict(row) for row in result.mappings().all()]
+
+
+async def main() -> int:
+    failures = 0
+    try:
+        async with engine.connect() as conn:
+            for name, table, expected_index, stmt in await build_hot_queries(conn):
+                plan = await explain(conn, stmt)
+                rows = [r for r in plan if r.get("table") == table]
+                problems = []
+                for row in rows:
+                    if row.get("type") == "ALL":
+                        problems.append("全表扫描")
+                    if row.get("key") != expected_index:
+                        problems.append(f"使用索引 {row.get('key')}，期望 {expected_index}")
+
+                if not rows:
+                    problems.append("执行计划中未找到目标表")
+
+                if problems:
+                    failures += 1
+                    print(f"❌ {name}: {'；'.join(problems)}")
+                    for row in plan:
+                        print(f"     {row}")
+                else:
+                    print(f"✅ {name}: type={rows[0].get('type')}, key={rows[0].get('key')}")
+    finally:
+        await engine.dispose()
+
+    if failures:
+        print(f"\n{failures} 个热点查询执行计划不符合预期")
+        return 1
+    print("\n全部热点查询均命中索引")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -10,7 +10,7 @@ sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from app.db.database import AsyncSessionLocal
 from app.models.admin import Admin
-from app.api.v1.admin import get_password_hash
+from app.services.password_service import password_hasher
 
 
 async def create_admin():
@@ -29,7 +29,7 @@ async def create_admin():
             # 创建默认管理员
             admin = Admin(
                 username="admin",
-                password_hash=get_password_hash("admin123"),
+                password_hash=await password_hasher.hash("admin123"),
                 nickname="系统管理员",
                 role="super_admin",
                 status=1
@@ -46,6 +46,7 @@ async def create_admin():
         # 确保数据库连接关闭
         from app.db.database import engine
         await engine.dispose()
+        password_hasher.shutdown()
 
 
 if __name__ == "__main__":
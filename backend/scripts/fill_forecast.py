@@ -0,0 +1,42 @@
+"""
+设备满仓预测手动执行
+
+按 FILL_FORECAST_* 配置为全部设备预测满仓时间并写入 device_fill_forecasts。
+
+使用方法:
+    python scripts/fill_forecast.py --dry-run     # 只计算不写入
+    python scripts/fill_forecast.py
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.db.database import engine
+from app.services.fill_forecast import fill_forecast_job
+
+
+async def main(dry_run: bool) -> int:
+    try:
+        result = await fill_forecast_job.run_once(dry_run=dry_run)
+    finally:
+        await engine.dispose()
+
+    if result is None:
+        print("其他进程正在执行满仓预测")
+        return 1
+    print(
+        f"设备 {result['devices']} 台, 预计 {fill_forecast_job.horizon:g} 天内满仓 {result['forecast_full']} 台, "
+        f"回归耗时 {result['fit_ms']}ms{'（未写入）' if dry_run else ''}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="设备满仓预测")
+    parser.add_argument("--dry-run", action="store_true", help="只计算不写入")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.dry_run)))
@@ -0,0 +1,53 @@
+"""
+钱包批量对账脚本
+
+按 users.id 主键区间分块、多块并行，将每个用户的账本余额（快照 + 之后的分录）
+与 users.balance / frozen_balance 比对，并检查所有交易分录是否平衡。
+
+使用方法:
+    python scripts/reconcile_wallets.py
+    python scripts/reconcile_wallets.py --chunk-size 2000 --concurrency 8
+
+存在不一致时以非零状态退出。
+"""
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# 添加项目根目录到路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.db.database import engine
+from app.services.ledger_service import reconcile_all
+
+
+async def main(chunk_size: int, concurrency: int) -> int:
+    try:
+        report = await reconcile_all(chunk_size=chunk_size, concurrency=concurrency)
+    finally:
+        await engine.dispose()
+
+    print(f"已校验用户: {report.checked_users}")
+    for item in report.mismatches[:50]:
+        print(
+            f"❌ {item['user_id']}: 余额 {item['balance_cents']} 分 / 账本 {item['ledger_balance_cents']} 分, "
+            f"冻结 {item['frozen_cents']} 分 / 账本 {item['ledger_frozen_cents']} 分"
+        )
+    if len(report.mismatches) > 50:
+        print(f"   ... 共 {len(report.mismatches)} 个用户余额不一致")
+    for txn_id in report.unbalanced_txns:
+        print(f"❌ 交易分录不平衡: {txn_id}")
+
+    if report.ok:
+        print("✅ 对账通过")
+        return 0
+    return 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="钱包批量对账")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="每块用户数")
+    parser.add_argument("--concurrency", type=int, default=4, help="并行分块数")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.chunk_size, args.concurrency)))
@@ -0,0 +1,188 @@
+"""
+微信支付 API v3 本地桩服务（商家转账到零钱）
+
+用于本地联调和测试提现流程，不校验签名，不真实出款。
+可模拟慢响应和服务端错误，验证微信接口变慢时设备通信不受影响。
+
+使用方法:
+    python scripts/wechat_pay_stub.py --port 9000
+    python scripts/wechat_pay_stub.py --port 9000 --delay 20        # 每个请求延迟20秒
+    python scripts/wechat_pay_stub.py --port 9000 --error-rate 0.5  # 50%请求返回500
+
+后端配置:
+    WECHAT_PAY_BASE_URL=http://127.0.0.1:9000
+    （仍需配置商户号、证书序列号、APIv3密钥和一个可用的 RSA 私钥文件，
+      可用 openssl genrsa -out stub_key.pem 2048 生成）
+
+运行中调整参数:
+    curl -X POST http://127.0.0.1:9000/stub/config -H 'Content-Type: application/json' \\
+         -d '{"delay": 0, "error_rate": 0, "detail_fail_rate": 0.1}'
+"""
+import argparse
+import asyncio
+import random
+import uuid
+from datetime import datetime
+from typing import Dict, Optional
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+app = FastAPI(title="WeChat Pay Stub")
+
+# 运行参数
+stub_config = {
+    "delay": 0.0,             # 每个请求的额外延迟（秒）
+    "error_rate": 0.0,        # 返回 500 的概率
+    "detail_fail_rate": 0.0,  # 转账明细最终失败的概率
+}
+
+# 内存中的批次: out_batch_no -> batch
+batches: Dict[str, dict] = {}
+
+
+def _now() -> str:
+    return datetime.now().astimezone().isoformat(timespec="seconds")
+
+
+async def _simulate() -> Optional[JSONResponse]:
+    """按配置模拟延迟和服务端错误"""
+    if stub_config["delay"] > 0:
+        await asyncio.sleep(stub_config["delay"])
+    if random.random() < stub_config["error_rate"]:
+        return JSONResponse(status_code=500, content={"code": "SYSTEM_ERROR", "message": "桩服务模拟系统错误"})
+    return None
+
+
+@app.post("/stub/config")
+async def update_config(request: Request):
+    """调整桩服务参数"""
+    stub_config.update(await request.json())
+    return stub_config
+
+
+@app.post("/v3/transfer/batches")
+async def create_transfer_batch(request: Request):
+    """发起商家转账（按 out_batch_no 幂等）"""
+    error = await _simulate()
+    if error:
+        return error
+
+    data = await request.json()
+    out_batch_no = data["out_batch_no"]
+    details = data.get("transfer_detail_list", [])
+
+    if len(details) != data.get("total_num") or sum(d["transfer_amount"] for d in details) != data.get("total_amount"):
+        return JSONResponse(status_code=400, content={"code": "PARAM_ERROR", "message": "明细笔数或金额与总数不一致"})
+
+    batch = batches.get(out_batch_no)
+    if batch is None:
+        batch = {
+            "out_batch_no": out_batch_no,
+            "batch_id": f"1030000{uuid.uuid4().hex[:20]}",
+            "create_time": _now(),
+            "batch_status": "ACCEPTED",
+            "total_amount": data["total_amount"],
+            "total_num": data["total_num"],
+            "details": {
+                d["out_detail_no"]: {
+                    "out_batch_no": out_batch_no,
+                    "out_detail_no": d["out_detail_no"],
+                    "detail_id": f"1040000{uuid.uuid4().hex[:20]}",
+                    "transfer_amount": d["transfer_amount"],
+                    "openid": d["openid"],
+                    "detail_status": "FAIL" if random.random() < stub_config["detail_fail_rate"] else "SUCCESS",
+                    "fail_reason": None,
+                    "initiate_time": _now(),
+                    "update_time": _now(),
+                }
+                for d in details
+            },
+        }
+        for detail in batch["details"].values():
+            if detail["detail_status"] == "FAIL":
+                detail["fail_reason"] = "ACCOUNT_FROZEN"
+        batches[out_batch_no] = batch
+
+    return {
+        "out_batch_no": batch["out_batch_no"],
+        "batch_id": batch["batch_id"],
+        "create_time": batch["create_time"],
+        "batch_status": batch["batch_status"],
+    }
+
+
+@app.get("/v3/transfer/batches/out-batch-no/{out_batch_no}")
+async def query_transfer_batch(
+    out_batch_no: str,
+    need_query_detail: bool = False,
+    offset: int = 0,
+    limit: int = 20
+):
+    """按商户批次单号查询批次（查询后批次即视为已完成），可分页返回明细列表"""
+    error = await _simulate()
+    if error:
+        return error
+
+    batch = batches.get(out_batch_no)
+    if batch is None:
+        return JSONResponse(status_code=404, content={"code": "NOT_FOUND", "message": "记录不存在"})
+
+    batch["batch_status"] = "FINISHED"
+    details = list(batch["details"].values())
+    response = {
+        "transfer_batch": {
+            "out_batch_no": out_batch_no,
+            "batch_id": batch["batch_id"],
+            "batch_status": batch["batch_status"],
+            "total_amount": batch["total_amount"],
+            "total_num": batch["total_num"],
+            "success_amount": sum(d["transfer_amount"] for d in details if d["detail_status"] == "SUCCESS"),
+            "success_num": sum(1 for d in details if d["detail_status"] == "SUCCESS"),
+            "fail_amount": sum(d["transfer_amount"] for d in details if d["detail_status"] == "FAIL"),
+            "fail_num": sum(1 for d in details if d["detail_status"] == "FAIL"),
+            "create_time": batch["create_time"],
+            "update_time": _now(),
+        }
+    }
+    if need_query_detail:
+        # 与真实接口一致，明细列表只含单号和状态，失败原因需查询明细
+        response["offset"] = offset
+        response["limit"] = limit
+        response["transfer_detail_list"] = [
+            {"detail_id": d["detail_id"], "out_detail_no": d["out_detail_no"], "detail_status": d["detail_status"]}
+            for d in details[offset:offset + limit]
+        ]
+    return response
+
+
+@app.get("/v3/transfer/batches/out-batch-no/{out_batch_no}/details/out-detail-no/{out_detail_no}")
+async def query_transfer_detail(out_batch_no: str, out_detail_no: str):
+    """按商户明细单号查询明细"""
+    error = await _simulate()
+    if error:
+        return error
+
+    batch = batches.get(out_batch_no)
+    detail = batch["details"].get(out_detail_no) if batch else None
+    if detail is None:
+        return JSONResponse(status_code=404, content={"code": "NOT_FOUND", "message": "记录不存在"})
+    return detail
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="微信支付 API v3 本地桩服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--delay", type=float, default=0.0, help="每个请求的额外延迟（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回500的概率")
+    parser.add_argument("--detail-fail-rate", type=float, default=0.0, help="转账明细失败的概率")
+    args = parser.parse_args()
+
+    stub_config.update({
+        "delay": args.delay,
+        "error_rate": args.error_rate,
+        "detail_fail_rate": args.detail_fail_rate,
+    })
+    uvicorn.run(app, host=args.host, port=args.port)